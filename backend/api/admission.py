@@ -0,0 +1,202 @@
+"""
+Admission control for the LLM-backed endpoints.
+
+Each limited route admits at most `max_concurrent` requests at a time. Further requests wait in a
+bounded queue that is served round-robin across users, so one user's burst cannot hold everyone
+else back. A request is rejected immediately instead of timing out when:
+- the queue is full (503),
+- the user already has `max_queued_per_user` requests waiting (429),
+- its estimated wait exceeds its deadline (503),
+and it is rejected when its deadline passes while waiting (503). Rejections carry a Retry-After
+header with the estimated wait. Everything else (e.g. /destinations/) is not limited and keeps
+its threads and connections.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+from fastapi import Depends, HTTPException, Request, status
+from .deps import optional_user_dependency
+from .metrics import Counter, CallbackMetric, Histogram, registry
+
+# Seconds a client may ask to wait at most, via this header (capped by the route's max wait)
+DEADLINE_HEADER = "X-Request-Timeout"
+# Weight of the latest request in the moving average of the service time
+SERVICE_TIME_SMOOTHING = 0.2
+
+ADMITTED = registry.register(Counter(
+    "admission_admitted_total", "Requests admitted by the admission controller.", ("route", "queued")))
+SHED = registry.register(Counter(
+    "admission_shed_total", "Requests rejected by the admission controller.", ("route", "reason")))
+QUEUE_WAIT = registry.register(Histogram(
+    "admission_queue_wait_seconds", "Time admitted requests spent waiting in the queue.", ("route",)))
+
+
+class _Waiter:
+    __slots__ = ("identity", "future", "enqueued")
+
+    def __init__(self, identity: str, future: asyncio.Future):
+        self.identity = identity
+        self.future = future
+        self.enqueued = time.monotonic()
+
+
+class AdmissionLimiter:
+    """Concurrency limit with a bounded, per-user fair wait queue for one route."""
+
+    def __init__(self, route: str, max_concurrent: int, max_queue: int, max_wait: float,
+                 max_queued_per_user: int, initial_service_time: float = 2.0):
+        self.route = route
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_queued_per_user = max_queued_per_user
+        self.service_time = initial_service_time
+        self.active = 0
+        self.queued = 0
+        # identity -> its waiters; the order of the keys is the round-robin order
+        self._queues: OrderedDict[str, deque[_Waiter]] = OrderedDict()
+
+    def estimated_wait(self, ahead: int) -> float:
+        """Seconds until a request with `ahead` requests queued before it is admitted."""
+        return (ahead // self.max_concurrent + 1) * self.service_time
+
+    def _reject(self, reason: str, status_code: int, retry_after: float):
+        SHED.inc((self.route, reason))
+        raise HTTPException(
+            status_code=status_code,
+            detail=f"{self.route} is at capacity ({reason.replace('_', ' ')}), please retry later.",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    async def acquire(self, identity: str, timeout: float) -> float:
+        """Waits for a slot; returns the admission time to pass to `release`."""
+        if self.active < self.max_concurrent and self.queued == 0:
+            self.active += 1
+            ADMITTED.inc((self.route, "false"))
+            return time.monotonic()
+
+        estimate = self.estimated_wait(self.queued)
+        if self.queued >= self.max_queue:
+            self._reject("queue_full", status.HTTP_503_SERVICE_UNAVAILABLE, estimate)
+        user_queue = self._queues.get(identity)
+        if user_queue is not None and len(user_queue) >= self.max_queued_per_user:
+            self._reject("user_limit", status.HTTP_429_TOO_MANY_REQUESTS, estimate)
+        if estimate > timeout:
+            self._reject("deadline", status.HTTP_503_SERVICE_UNAVAILABLE, estimate)
+
+        waiter = _Waiter(identity, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(identity, deque()).append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(waiter.future, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # The slot was handed over just as the wait ended; pass it on
+                self.release(None)
+            else:
+                self._discard(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject("timeout", status.HTTP_503_SERVICE_UNAVAILABLE, self.estimated_wait(self.queued))
+            raise
+        QUEUE_WAIT.observe(time.monotonic() - waiter.enqueued, (self.route,))
+        ADMITTED.inc((self.route, "true"))
+        return time.monotonic()
+
+    def release(self, admitted_at: Optional[float]):
+        """Frees a slot, handing it straight to the next waiter of the next user in turn."""
+        if admitted_at is not None:
+            elapsed = time.monotonic() - admitted_at
+            self.service_time += SERVICE_TIME_SMOOTHING * (elapsed - self.service_time)
+        while self._queues:
+            identity, user_queue = next(iter(self._queues.items()))
+            waiter = user_queue.popleft()
+            self.queued -= 1
+            if user_queue:
+                self._queues.move_to_end(identity)
+            else:
+                del self._queues[identity]
+            if not waiter.future.done():
+                waiter.future.set_result(None)
+                return
+        self.active -= 1
+
+    def _discard(self, waiter: _Waiter):
+        user_queue = self._queues.get(waiter.identity)
+        if user_queue is not None and waiter in user_queue:
+            user_queue.remove(waiter)
+            self.queued -= 1
+            if not user_queue:
+                del self._queues[waiter.identity]
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "queued_users": len(self._queues),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "service_time": round(self.service_time, 3),
+        }
+
+
+def _limiter(route: str, max_concurrent: int, max_queue: int, max_wait: float) -> AdmissionLimiter:
+    prefix = f"ADMISSION_{route.upper()}"
+    return AdmissionLimiter(
+        route,
+        max_concurrent=int(os.getenv(f"{prefix}_CONCURRENCY", str(max_concurrent))),
+        max_queue=int(os.getenv(f"{prefix}_QUEUE", str(max_queue))),
+        max_wait=float(os.getenv(f"{prefix}_MAX_WAIT", str(max_wait))),
+        max_queued_per_user=int(os.getenv("ADMISSION_QUEUE_PER_USER", "4")),
+    )
+
+
+# Each worker limits its own requests; the defaults leave most of the 40 threadpool threads to cheap routes
+limiters = {
+    "chat": _limiter("chat", max_concurrent=16, max_queue=64, max_wait=10.0),
+    "dynamic_filters": _limiter("dynamic_filters", max_concurrent=8, max_queue=32, max_wait=10.0),
+}
+
+
+def request_identity(request: Request, user: Optional[dict]) -> str:
+    """The authenticated user if there is one, otherwise the client address."""
+    if user is not None:
+        return f"user:{user['id']}"
+    return f"client:{request.client.host if request.client else 'unknown'}"
+
+
+def request_timeout(request: Request, max_wait: float) -> float:
+    try:
+        return max(0.0, min(float(request.headers[DEADLINE_HEADER]), max_wait))
+    except (KeyError, ValueError):
+        return max_wait
+
+
+def admission(route: str):
+    """Route dependency that holds one of the route's slots for the duration of the request."""
+    limiter = limiters[route]
+
+    async def admit(request: Request, user: optional_user_dependency):
+        admitted_at = await limiter.acquire(request_identity(request, user),
+                                            request_timeout(request, limiter.max_wait))
+        try:
+            yield
+        finally:
+            limiter.release(admitted_at)
+
+    return Depends(admit)
+
+
+def _queue_samples() -> dict[tuple, float]:
+    samples = {}
+    for route, limiter in limiters.items():
+        samples[(route, "active")] = limiter.active
+        samples[(route, "queued")] = limiter.queued
+    return samples
+
+
+registry.register(CallbackMetric(
+    "admission_requests", "Requests holding a slot (active) or waiting for one (queued), per route.",
+    _queue_samples, ("route", "state")))
@@ -1,21 +1,45 @@
 import os
 import uuid
-import openai
+from itertools import takewhile
 from dotenv import load_dotenv
-from typing import List, Optional
-from langchain_openai.chat_models import ChatOpenAI
-from langchain_postgres import PostgresChatMessageHistory
-from langchain.prompts import ChatPromptTemplate
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
+from typing import List, Optional, Tuple
+from langchain_core.prompts import ChatPromptTemplate
 from fastapi import HTTPException, status
 from langchain_core.messages import AIMessage, HumanMessage, BaseMessage
-import psycopg
-from sqlmodel import Field, Session, SQLModel, create_engine, select 
+from sqlalchemy import bindparam
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlmodel import Field, Session, SQLModel, and_, or_, select, update
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime, timezone
-from psycopg.rows import dict_row
-from supabase import create_client, Client
-import json
+from ..subsystems import subsystems, refresh_vector_store
+from ..metrics import stage, count_db_query
+from .write_behind import WRITE_BEHIND_ENABLED, WriteBehindQueue, WriteQueueFull, message_key, register_metrics
+
+# Number of most recent messages sent verbatim in the prompt; older ones live in the summary
+PROMPT_WINDOW = int(os.getenv("CHAT_PROMPT_WINDOW", "3"))
+SUMMARY_ENABLED = os.getenv("CHAT_SUMMARY_ENABLED", "true").lower() in ("1", "true", "yes")
+# Messages outside the window are folded once at least SUMMARY_MIN_FOLD accumulate (until then
+# they stay in the prompt), at most SUMMARY_FOLD_BATCH per LLM call; the summary is capped in size
+SUMMARY_MIN_FOLD = int(os.getenv("CHAT_SUMMARY_MIN_FOLD", "4"))
+SUMMARY_FOLD_BATCH = int(os.getenv("CHAT_SUMMARY_FOLD_BATCH", "20"))
+SUMMARY_MAX_CHARS = int(os.getenv("CHAT_SUMMARY_MAX_CHARS", "1500"))
+# Documents retrieved per prompt, and the relevance score a document must exceed to be cited as a source
+# (measure changes with backend/benchmarks/retrieval_eval.py)
+RETRIEVAL_K = int(os.getenv("CHAT_RETRIEVAL_K", "3"))
+RELEVANCE_CUTOFF = float(os.getenv("CHAT_RELEVANCE_CUTOFF", "0"))
+
+SUMMARY_PROMPT = """
+You maintain a running summary of a conversation between a traveller and a travel assistant.
+Update the summary with the new messages. Keep the traveller's preferences, constraints, dates,
+budget, destinations already discussed or rejected, and open questions. Drop small talk.
+Answer with the updated summary only, at most {max_words} words.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+"""
 
 
 # --- SQLModel Definitions for Users and Chats ---
@@ -34,6 +58,73 @@ class Chat(SQLModel, table=True):
     user_id: uuid.UUID = Field(foreign_key="users.id", index=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow, sa_column_kwargs={"onupdate": "now()"})
+    # Rolling summary of the messages older than the prompt window, and the last message id it covers
+    summary: Optional[str] = Field(default=None)
+    summary_through: Optional[int] = Field(default=None)
+
+# --- Write-behind persistence (see write_behind.py) ---
+def _insert_messages(records: List[dict]):
+    subsystems.get("supabase").table("messages").insert(records).execute()
+
+
+# Keys per lookup; the keys travel in the URL (about 40 bytes each)
+KEY_LOOKUP_CHUNK = 50
+
+
+def _written_message_keys(keys: List[str]) -> set:
+    """The keys already stored, looked up through the idx_messages_key expression index (see the README)."""
+    written = set()
+    for start in range(0, len(keys), KEY_LOOKUP_CHUNK):
+        response = (
+            subsystems.get("supabase").table("messages")
+            .select("key:message->data->>id")
+            .in_("message->data->>id", keys[start:start + KEY_LOOKUP_CHUNK])
+            .execute()
+        )
+        written.update(row["key"] for row in response.data)
+    return written
+
+
+def _touch_chats(touches: dict):
+    """Sets updated_at of many chats in one executemany UPDATE."""
+    chats = Chat.__table__
+    statement = chats.update().where(chats.c.id == bindparam("chat_id")).values(updated_at=bindparam("at"))
+    with Session(subsystems.get("chat_store")) as session:
+        session.connection().execute(statement, [
+            {"chat_id": uuid.UUID(chat_id), "at": datetime.fromisoformat(at)} for chat_id, at in touches.items()
+        ])
+        session.commit()
+
+
+# SQLSTATE classes that retrying the same rows cannot fix: data exceptions (e.g. "\u0000" in jsonb)
+# and integrity constraint violations (e.g. a message of a chat deleted in the meantime)
+PERMANENT_SQLSTATE_CLASSES = ("22", "23")
+UNIQUE_VIOLATION = "23505"
+# HTTP 4xx that are about the request as a whole (auth, a missing table, rate limits), not its rows
+TRANSIENT_CLIENT_ERRORS = (401, 403, 404, 408, 429)
+
+
+def _classify_write_error(error: Exception) -> str:
+    """"duplicate", "permanent" or "transient" for a failed write to Supabase or the chat store."""
+    # postgrest's APIError carries the SQLSTATE in .code; SQLAlchemy wraps the driver's error in .orig
+    code = getattr(error, "code", None)
+    orig = getattr(error, "orig", None)
+    if orig is not None:
+        code = getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)
+        if code is None and isinstance(error, (DataError, IntegrityError)):
+            return "permanent"  # a driver without SQLSTATEs, e.g. SQLite
+    if code == UNIQUE_VIOLATION:
+        return "duplicate"
+    if isinstance(code, str) and len(code) == 5 and code[:2] in PERMANENT_SQLSTATE_CLASSES:
+        return "permanent"
+    status_code = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status_code, int) and 400 <= status_code < 500 and status_code not in TRANSIENT_CLIENT_ERRORS:
+        return "permanent"
+    return "transient"
+
+
+message_writer = WriteBehindQueue(_insert_messages, _written_message_keys, _touch_chats, _classify_write_error)
+register_metrics(message_writer)
 
 # --- ChatHandler Class ---
 class ChatHandler:
@@ -43,49 +134,29 @@ class ChatHandler:
     """
     def __init__(self):
         load_dotenv()
-        self.load_api_key()
 
-        # Initialize Chroma DB for document retrieval (remains the same)
-        self._embedding = OpenAIEmbeddings(model="text-embedding-3-small")
-        self._db = Chroma(persist_directory="./chat/chroma", embedding_function=self._embedding)
-        self.check_if_db_loaded_successfully()
+    # The clients below are created lazily on first use (see api/subsystems.py),
+    # so importing the routers doesn't require OpenAI, Chroma or Supabase to be reachable.
+    @property
+    def _db(self):
+        """Chroma DB used for document retrieval (swapped when the index builder publishes a new one)."""
+        refresh_vector_store()
+        return subsystems.get("vector_store")
 
-        # Get the Supabase connection string from environment variables
-        self.supabase_connection_string = os.environ.get("SUPABASE_CONNECTION_STRING")
-        if not self.supabase_connection_string:
-            raise ValueError("SUPABASE_CONNECTION_STRING not set in environment.")
-        
-        # Initialize SQLModel engine for 'users' and 'chats' tables
-        self.sqlmodel_engine = create_engine(self.supabase_connection_string)
-        # Create SQLModel-managed tables (users, chats) if they don't exist
-        SQLModel.metadata.create_all(self.sqlmodel_engine)
-        
-        url: str = os.environ.get("SUPABASE_URL")
-        key: str = os.environ.get("SUPABASE_KEY")
-        self.supabase: Client = create_client(url, key)
+    @property
+    def sqlmodel_engine(self):
+        """SQLModel engine for the 'users' and 'chats' tables."""
+        return subsystems.get("chat_store")
+
+    @property
+    def supabase(self):
+        """Supabase client used for the 'messages' table."""
+        return subsystems.get("supabase")
 
     def _get_db_session(self):
         """Helper to get a new SQLModel database session."""
         return Session(self.sqlmodel_engine)
 
-    def check_if_db_loaded_successfully(self):
-        """Validates that the Chroma DB is loaded and contains documents."""
-        try:
-            count = self._db._collection.count()
-            if count > 0:
-                print(f"✅ Chroma DB loaded successfully with {count} documents.")
-            else:
-                print("⚠️ Chroma DB loaded, but is empty. Make sure your data is persisted.")
-        except Exception as e:
-            print(f"❌ Error connecting to Chroma DB. Ensure the path is correct and the database is not corrupted. Error: {e}")
-
-    def load_api_key(self):
-        """Loads the OpenAI API key from environment variables."""
-        api_key = os.environ.get("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY not set")
-        openai.api_key = api_key
-
     # --- Chat Management Methods ---
     async def create_chat(self, user_id: uuid.UUID) -> Chat:
         """Creates a new chat session linked to a user."""
@@ -106,10 +177,23 @@ class ChatHandler:
         with self._get_db_session() as session:
             return session.get(Chat, chat_id)
 
-    async def get_user_chats(self, user_id: uuid.UUID) -> List[Chat]:
-        """Retrieves all chat sessions for a given user."""
+    async def get_user_chats(self, user_id: uuid.UUID, limit: Optional[int] = None,
+                             after: Optional[Tuple[datetime, uuid.UUID]] = None) -> List[Chat]:
+        """
+        Retrieves the chat sessions of a user, most recently updated first.
+        With `limit`, returns one page; `after` is the (updated_at, id) of the last chat of the previous page.
+        """
         with self._get_db_session() as session:
-            chats = session.exec(select(Chat).where(Chat.user_id == user_id).order_by(Chat.updated_at.desc())).all()
+            query = select(Chat).where(Chat.user_id == user_id)
+            if after is not None:
+                updated_at, chat_id = after
+                query = query.where(or_(Chat.updated_at < updated_at,
+                                        and_(Chat.updated_at == updated_at, Chat.id < chat_id)))
+            # id breaks ties so the (updated_at, id) keyset is a total order
+            query = query.order_by(Chat.updated_at.desc(), Chat.id.desc())
+            if limit is not None:
+                query = query.limit(limit)
+            chats = session.exec(query).all()
             return list(chats)
 
     async def get_or_create_chat_session(self, chat_id: Optional[uuid.UUID], user_id: uuid.UUID) -> uuid.UUID:
@@ -130,12 +214,15 @@ class ChatHandler:
 
     def _query_relevant(self, text):
         """Queries the Chroma database for documents similar to the user's prompt."""
-        return self._db.similarity_search_with_relevance_scores(text, k=3)
+        return self._db.similarity_search_with_relevance_scores(text, k=RETRIEVAL_K)
 
-    def _compose_prompt(self, user_prompt, relevant_docs, history: List[BaseMessage]):
+    def _compose_prompt(self, user_prompt, relevant_docs, history: List[BaseMessage], summary: Optional[str] = None):
         """Composes a detailed prompt for the LLM."""
         PROMPT = """
         You are a helpful assistant. Use the conversation history and reference context to answer:
+        Summary of the earlier conversation:
+        {summary}
+
         Conversation History:
         {history}
 
@@ -151,93 +238,167 @@ class ChatHandler:
         )
         context = "\n---\n".join(doc.page_content for doc, _ in relevant_docs)
         template = ChatPromptTemplate.from_template(PROMPT)
-        return template.format(history=history_str, context=context, query=user_prompt)
+        return template.format(summary=summary or "(none)", history=history_str, context=context, query=user_prompt)
 
-    async def _retrieve_sorted_messages(
-        self, chat_id: uuid.UUID
+    def _retrieve_sorted_messages(
+        self, chat_id: uuid.UUID, before: Optional[int] = None, since: Optional[int] = None,
+        limit: Optional[int] = None
     ) -> Optional[List[dict]]:
         """
-        Retrieves messages from the database sorted by created_at ascending.
+        Retrieves messages from the database in chronological order, selecting only the
+        columns needed to rebuild them. The message id (an identity column) is the cursor:
+        - `since`: the messages after that id (oldest first, up to `limit`),
+        - `before` or only `limit`: the latest `limit` messages older than that id.
+        Messages still queued for writing come last, without an id.
         """
         try:
-            response = (
+            query = (
                 self.supabase.table("messages")
-                .select("*")
+                .select("id, message")
                 .eq("session_id", str(chat_id))
-                .order("created_at", desc=False)
-                .execute()
             )
-            return response
+            newest_first = since is None and limit is not None
+            if since is not None:
+                query = query.gt("id", since)
+            if before is not None:
+                query = query.lt("id", before)
+            query = query.order("id", desc=newest_first)
+            if limit is not None:
+                query = query.limit(limit)
+            response = query.execute()
+            count_db_query("supabase")
+            rows = response.data[::-1] if newest_first else response.data
+            # Queued messages are newer than every written one, so pages before a cursor never include them
+            if WRITE_BEHIND_ENABLED and before is None:
+                rows = self._with_queued(chat_id, rows, newest_first, limit)
+            return rows
 
         except Exception as e:
             print(f"❌ Error retrieving messages: {e}")
             return None
 
-    async def retrieve_history(self, chat_id: uuid.UUID) -> Optional[List[BaseMessage]]:
+    @staticmethod
+    def _with_queued(chat_id: uuid.UUID, rows: List[dict], newest_first: bool, limit: Optional[int]) -> List[dict]:
+        """Appends the chat's queued messages to `rows`, so a turn reads the messages it just saved."""
+        queued = message_writer.queued(str(chat_id))
+        if not queued:
+            return rows
+        # A batch being written can show up in both
+        written = {message_key(row) for row in rows}
+        rows = rows + [record for record in queued if message_key(record) not in written]
+        if limit is None:
+            return rows
+        return rows[-limit:] if newest_first else rows[:limit]
+
+    @staticmethod
+    def _to_langchain_message(entry: dict) -> Optional[BaseMessage]:
+        message_data = entry["message"]
+        if not message_data:
+            return None
+
+        content = message_data['data']['content']
+        metadata = message_data['data']['metadata']
+        mtype = message_data['type']
+        # The row id travels on the message so callers can build cursors, and the key so clients can
+        # match messages that have no id yet
+        message_id = str(entry["id"]) if entry.get("id") is not None else None
+        key = message_key(entry)
+
+        if mtype == "ai":
+            return AIMessage(content=content, metadata=metadata, id=message_id, key=key)
+        return HumanMessage(content=content, metadata=metadata, id=message_id, key=key)
+
+    async def retrieve_history(self, chat_id: uuid.UUID, limit: Optional[int] = None) -> Optional[List[BaseMessage]]:
         """
         Public method to fetch chat history as LangChain message objects,
-        ensuring chronological order by created_at.
+        in chronological order. With `limit`, only the latest `limit` messages.
         """
-        messages_db = await self._retrieve_sorted_messages(chat_id)
-        if not messages_db:
-            return None
+        messages, _ = await self.retrieve_history_page(chat_id, limit=limit)
+        return messages or None
 
-        messages: List[BaseMessage] = []
-        
-        json_string = json.dumps(messages_db.data)
-        parsed_data = json.loads(json_string)
-        
-        for entry in parsed_data:
-            message_data = entry["message"]
-            if not message_data:
-                continue
-
-            content = entry['message']['data']['content']
-            metadata = entry['message']['data']['metadata']
-            mtype = entry['message']['type']
-            
-            if mtype == "ai":
-                messages.append(AIMessage(content=content, metadata=metadata))
-            else:  # human
-                messages.append(HumanMessage(content=content, metadata=metadata))
+    async def retrieve_history_page(
+        self, chat_id: uuid.UUID, before: Optional[int] = None, since: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> Tuple[Optional[List[BaseMessage]], bool]:
+        """
+        Fetches one page of history (see `_retrieve_sorted_messages` for the cursors).
+        Returns the messages (None on error) and whether more messages exist beyond the page.
+        """
+        return self._history_page(chat_id, before=before, since=since, limit=limit)
+
+    def _history_page(
+        self, chat_id: uuid.UUID, before: Optional[int] = None, since: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> Tuple[Optional[List[BaseMessage]], bool]:
+        # One extra row tells whether there is another page
+        rows = self._retrieve_sorted_messages(
+            chat_id, before=before, since=since, limit=limit + 1 if limit is not None else None
+        )
+        if rows is None:
+            return None, False
+
+        has_more = limit is not None and len(rows) > limit
+        if has_more:
+            rows = rows[:limit] if since is not None else rows[1:]
 
-        return messages
+        messages = [message for message in map(self._to_langchain_message, rows) if message is not None]
+        return messages, has_more
     
 
     async def generate_chat_response(self, prompt: str, chat_id: uuid.UUID, user_id: uuid.UUID):
         """
         Generates a chat response, storing messages using the save_messages method.
         This version replaces LangChain's internal history management with manual saving.
+        Also returns the keys of the saved user message and reply.
         """
         # Create the user's message object
         user_message = HumanMessage(content=prompt, metadata={"user_id": str(user_id)})
 
         # Manually save the user's message to the database
-        await self.save_messages(chat_id, [user_message])
+        with stage("chat", "save_user_message"):
+            saved_user = await self.save_messages(chat_id, [user_message])
         
-        # Retrieve the full history, including the new user message, for context
-        messages_from_db = await self.retrieve_history(chat_id)
+        with stage("chat", "load_summary"):
+            chat = await self.get_chat(chat_id)
+        summary = chat.summary if chat else None
+        summary_through = (chat.summary_through if chat else None) or 0
+
+        # Retrieve the latest messages, including the new user message, for context
+        with stage("chat", "retrieve_history"):
+            messages_from_db = await self.retrieve_history(chat_id, limit=PROMPT_WINDOW + SUMMARY_MIN_FOLD - 1)
         if not messages_from_db:
             # This case should not be reached if the save was successful
             # but is a good safeguard.
             messages_from_db = [user_message]
             
-        # Use the last 3 messages for the LLM prompt to maintain context
-        messages_for_prompt = messages_from_db[-3:]
+        # The last few messages always go in the prompt, plus any older ones not folded into the
+        # summary yet, so the prompt stays bounded without losing context
+        messages_for_prompt = messages_from_db[-PROMPT_WINDOW:]
+        unsummarized = [m for m in messages_from_db[:-PROMPT_WINDOW] if m.id is None or int(m.id) > summary_through]
+        messages_for_prompt = unsummarized + messages_for_prompt
 
         # Query the Chroma DB for relevant documents based on the prompt
-        relevant = self._query_relevant(prompt)
+        # Embedding the prompt and the LLM call block on the network, so they run off the event loop
+        with stage("chat", "query_relevant"):
+            relevant = await run_in_threadpool(self._query_relevant, prompt)
+        relevant_sources = [doc for doc, score in relevant if score > RELEVANCE_CUTOFF]
         sources = "\n".join(
             f"{doc.metadata.get('source_file', 'N/A')} (id={doc.metadata.get('id', 'N/A')}, city_name={doc.metadata.get('city_name', 'N/A')})"
-            for doc, score in relevant if score > 0
+            for doc in relevant_sources
         )
+        # Destination ids of the sources, in relevance order, for hydrating them in one batch
+        source_ids = list(dict.fromkeys(
+            str(doc.metadata["id"]) for doc in relevant_sources if doc.metadata.get("id") is not None
+        ))
         
         # Compose the full prompt for the LLM
-        full_prompt = self._compose_prompt(prompt, relevant, messages_for_prompt)
+        with stage("chat", "compose_prompt"):
+            full_prompt = self._compose_prompt(prompt, relevant, messages_for_prompt, summary)
 
         # Invoke the LLM to get a response
-        model = ChatOpenAI(model_name="gpt-4o-mini", temperature=0.5)
-        resp = model.invoke(full_prompt)
+        model = subsystems.get("chat_model")
+        with stage("chat", "llm"):
+            resp = await run_in_threadpool(model.invoke, full_prompt)
         assistant_msg_content = resp.content
 
         # Create the AI's message object with sources metadata
@@ -247,24 +408,95 @@ class ChatHandler:
         )
         
         # Manually save the AI's message to the database
-        await self.save_messages(chat_id, [ai_message])
+        with stage("chat", "save_ai_message"):
+            saved_ai = await self.save_messages(chat_id, [ai_message])
 
         # Update the 'updated_at' timestamp for the chat session in the chats table
+        with stage("chat", "bump_updated_at"):
+            await self.touch_chat(chat_id)
+                
+        keys = tuple(message_key(saved[0]) if saved else None for saved in (saved_user, saved_ai))
+        return assistant_msg_content, sources, source_ids, keys
+
+
+    def update_summary(self, chat_id: uuid.UUID):
+        """
+        Folds the messages that fell out of the prompt window into the chat's rolling summary.
+        Meant to run as a background task after the response is sent. It is a plain function, so
+        Starlette runs it in the threadpool: its reads, the LLM call and the write all block.
+        Concurrent updates are resolved by a compare-and-set on summary_through.
+        """
+        if not SUMMARY_ENABLED:
+            return
+        try:
+            while True:
+                with self._get_db_session() as session:
+                    chat = session.get(Chat, chat_id)
+                if chat is None:
+                    return
+                folded_through = chat.summary_through or 0
+
+                # Oldest unsummarized messages first; one extra window tells whether any left the prompt
+                messages, has_more = self._history_page(
+                    chat_id, since=folded_through, limit=SUMMARY_FOLD_BATCH + PROMPT_WINDOW
+                )
+                if not messages:
+                    return
+                to_fold = messages[:SUMMARY_FOLD_BATCH] if has_more else messages[:max(0, len(messages) - PROMPT_WINDOW)]
+                # Queued messages have no id to record in summary_through yet; they are folded once written
+                to_fold = list(takewhile(lambda m: m.id is not None, to_fold))
+                if len(to_fold) < SUMMARY_MIN_FOLD:
+                    return
+
+                with stage("chat_summary", "llm"):
+                    summary = self._summarize(chat.summary, to_fold)
+
+                with stage("chat_summary", "save"), self._get_db_session() as session:
+                    result = session.exec(
+                        update(Chat)
+                        .where(Chat.id == chat_id)
+                        .where(Chat.summary_through == chat.summary_through if chat.summary_through is not None
+                               else Chat.summary_through.is_(None))
+                        # Keep updated_at: folding history is not activity (and skips its onupdate default)
+                        .values(summary=summary, summary_through=int(to_fold[-1].id), updated_at=Chat.updated_at)
+                    )
+                    session.commit()
+                if result.rowcount == 0 or not has_more:
+                    # Another task folded these messages first, or we caught up
+                    return
+        except Exception as e:
+            print(f"❌ Error updating summary of chat {chat_id}: {e}")
+
+    def _summarize(self, summary: Optional[str], messages: List[BaseMessage]) -> str:
+        transcript = "\n".join(
+            f"{'Human' if isinstance(m, HumanMessage) else 'AI'}: {m.content}" for m in messages
+        )
+        prompt = SUMMARY_PROMPT.format(max_words=SUMMARY_MAX_CHARS // 6, summary=summary or "(none)",
+                                       messages=transcript)
+        response = subsystems.get("chat_model").invoke(prompt)
+        return response.content.strip()[:SUMMARY_MAX_CHARS]
+
+
+    async def touch_chat(self, chat_id: uuid.UUID):
+        """Sets the chat's updated_at to now; queued and coalesced with other chats' bumps when write-behind is on."""
+        now = datetime.now(timezone.utc)
+        if WRITE_BEHIND_ENABLED:
+            message_writer.touch(str(chat_id), now.isoformat())
+            return
         with self._get_db_session() as session:
             chat = session.get(Chat, chat_id)
             if chat:
-                chat.updated_at = datetime.now(timezone.utc)
+                chat.updated_at = now
                 session.add(chat)
                 session.commit()
-                
-        return assistant_msg_content, sources
-
 
     async def save_messages(self, chat_id: uuid.UUID, messages_to_save: List[BaseMessage]):
         """
         Stores a list of LangChain BaseMessage objects in the 'messages' table in Supabase.
         Each message will be inserted as a new row. This method replicates the structure
         expected by PostgresChatMessageHistory for consistency.
+        With write-behind on, the messages are spooled and queued, and the records are returned
+        without ids; they are inserted in bulk with other conversations' messages shortly after.
         """
         records_to_insert = []
         current_time_utc = datetime.now(timezone.utc) # Use UTC for consistency
@@ -281,7 +513,8 @@ class ChatHandler:
                 "type": msg_dict["type"],
                 "content": msg_dict["content"],
                 "data": {
-                    "id": None, # Based on your provided example entry
+                    # Unique key, so a bulk insert that is retried or replayed doesn't store the message twice
+                    "id": str(uuid.uuid4()),
                     "name": None, # Based on your provided example entry
                     "type": msg_dict["type"], # Type is often duplicated inside 'data'
                     "content": msg_dict["content"], # Content is often duplicated inside 'data'
@@ -305,9 +538,21 @@ class ChatHandler:
             }
             records_to_insert.append(record)
 
+        if records_to_insert and WRITE_BEHIND_ENABLED:
+            try:
+                message_writer.save(records_to_insert)
+            except WriteQueueFull as e:
+                print(f"❌ Error queueing messages: {e}")
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many messages are waiting to be saved, please retry later.",
+                    headers={"Retry-After": "5"},
+                )
+            return records_to_insert
         if records_to_insert:
             try:
                 response = self.supabase.table("messages").insert(records_to_insert).execute()
+                count_db_query("supabase")
                 return response.data
             except Exception as e:
                 print(f"❌ Error saving messages to Supabase: {e}")
@@ -0,0 +1,120 @@
+"""
+Embedding backends used for retrieval, selected with EMBEDDING_BACKEND:
+
+- `openai` (default): OpenAI's text-embedding-3-small over the network.
+- `onnx`: a local sentence-embedding model (e.g. all-MiniLM-L6-v2 exported to ONNX) run with
+  onnxruntime. ONNX_EMBEDDING_MODEL_DIR must contain `model.onnx` and `tokenizer.json`.
+
+Both implement LangChain's `Embeddings`, so Chroma and the index builder use them the same way.
+The vector index records the model it was built with; switching backends makes the next load of
+the vector store rebuild the index with the new model (see `subsystems.create_vector_store`).
+"""
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+OPENAI_EMBEDDING_MODEL = "text-embedding-3-small"
+
+
+def embedding_model_name(embeddings) -> str:
+    """Identifies the model an index or cached vector was embedded with."""
+    return getattr(embeddings, "model", None) or type(embeddings).__name__
+
+
+def available_cores() -> int:
+    """Cores this process may run on (respects CPU affinity, e.g. a container's cpuset)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _file_digest(path: str) -> str:
+    """Short content hash, so two exports in directories of the same name never share vectors."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Mean-pooled, L2-normalized sentence embeddings from a local ONNX transformer.
+
+    Inputs are tokenized and run in batches of `batch_size` on a pool of `workers` threads; each
+    inference session uses `cores // workers` intra-op threads, so the total never exceeds the
+    cores the process is given.
+    """
+
+    def __init__(self, model_dir: str, batch_size: int = 32, max_length: int = 256,
+                 workers: int = 1, cores: int = None):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        model_path = os.path.join(model_dir, "model.onnx")
+        self.model = f"onnx:{os.path.basename(os.path.normpath(model_dir))}:{_file_digest(model_path)}"
+        self.batch_size = batch_size
+        cores = cores or available_cores()
+        workers = max(1, min(workers, cores))
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = max(1, cores // workers)
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # One session is safe to run from several threads at once
+        self.session = onnxruntime.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="onnx-embeddings")
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        output = self.session.run(None, {name: value for name, value in feeds.items() if name in self.input_names})[0]
+
+        if output.ndim == 3:
+            # Token embeddings: average over the real (non-padding) tokens
+            mask = attention_mask[:, :, None].astype(np.float32)
+            output = (output * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        norms = np.linalg.norm(output, axis=1, keepdims=True)
+        return output / np.maximum(norms, 1e-12)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        return np.vstack(list(self.pool.map(self._embed_batch, batches))).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.pool.submit(self._embed_batch, [text]).result()[0].tolist()
+
+
+def create_embedding_backend(backend: str = None) -> Embeddings:
+    """The given embedding backend, by default the one configured by EMBEDDING_BACKEND."""
+    backend = (backend or os.getenv("EMBEDDING_BACKEND", "openai")).lower()
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        from ..subsystems import require_env
+        return OpenAIEmbeddings(model=OPENAI_EMBEDDING_MODEL, api_key=require_env("OPENAI_API_KEY"))
+    if backend == "onnx":
+        from ..subsystems import require_env
+        return OnnxEmbeddings(
+            require_env("ONNX_EMBEDDING_MODEL_DIR"),
+            batch_size=int(os.getenv("ONNX_EMBEDDING_BATCH_SIZE", "32")),
+            max_length=int(os.getenv("ONNX_EMBEDDING_MAX_LENGTH", "256")),
+            workers=int(os.getenv("ONNX_EMBEDDING_WORKERS", "1")),
+            cores=int(os.getenv("ONNX_EMBEDDING_THREADS", "0")) or None,
+        )
+    raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}' (expected 'openai' or 'onnx').")
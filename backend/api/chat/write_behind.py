@@ -0,0 +1,473 @@
+"""
+Write-behind persistence for chat messages and chat activity.
+
+Every turn used to make three remote writes on the request path: an insert for the user message,
+one for the reply and an UPDATE of the chat's updated_at. Instead, each write is appended to a local
+spool file and queued, and a background thread writes the queue in bulk across all conversations (one
+insert for the messages, one executemany UPDATE for the coalesced updated_at bumps) once FLUSH_BATCH
+writes are queued or the oldest one has waited FLUSH_INTERVAL seconds.
+
+- Durability: a write is accepted once it is in the spool (fsynced unless CHAT_WRITE_FSYNC=false).
+  After each bulk write a mark records how far the queue was written, and the spool is truncated
+  whenever the queue drains. Each worker holds a lock on its own spool; on startup, spools nobody holds
+  (left by a worker that crashed or was stopped during an outage) are replayed in order.
+- Failures: a bulk write that fails transiently stays at the head of the queue and is retried with
+  exponential backoff, so an outage only grows the queue, up to MAX_QUEUED messages. When it fails
+  permanently (the rows themselves are rejected, e.g. a message of a deleted chat), the batch is split
+  in halves until the rejected rows are found; those go to the dead-letter file and the rest is written.
+- Ordering: one thread writes the queue in order, so each chat's messages get ids in the order they
+  were saved.
+- Duplicates: every message carries a key (message.data.id). Before retrying a write that may have
+  succeeded, or writing replayed messages, the keys already stored remotely are skipped.
+- Read-your-writes: `queued(chat_id)` returns the chat's messages that are not written yet, which
+  ChatHandler appends to the history it reads from Supabase. This only covers the worker that saved
+  them; other workers see them once written, so clients match messages by key rather than by id.
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, Callable, Iterable, Optional
+from ..metrics import Counter, CallbackMetric, Histogram, registry
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks to tell live spools from orphaned ones
+    fcntl = None
+
+WRITE_BEHIND_ENABLED = os.getenv("CHAT_WRITE_BEHIND", "true").lower() in ("1", "true", "yes") and fcntl is not None
+SPOOL_DIRECTORY = os.getenv("CHAT_WRITE_SPOOL_DIRECTORY", os.path.join(os.path.dirname(__file__), "spool"))
+FLUSH_BATCH = int(os.getenv("CHAT_WRITE_FLUSH_BATCH", "100"))
+FLUSH_INTERVAL = float(os.getenv("CHAT_WRITE_FLUSH_INTERVAL", "0.1"))
+MAX_QUEUED = int(os.getenv("CHAT_WRITE_MAX_QUEUED", "10000"))
+FSYNC = os.getenv("CHAT_WRITE_FSYNC", "true").lower() in ("1", "true", "yes")
+# Retry delay after a failed bulk write; doubles per failure up to MAX_BACKOFF
+MAX_BACKOFF = 30.0
+# Rows per insert request, to stay well under the API's request size limits
+MAX_INSERT_ROWS = 500
+# A spool that never drains (sustained load or a long outage) is rewritten with only the queued
+# writes once it grows past this
+SPOOL_COMPACT_BYTES = 8 * 1024 * 1024
+SPOOL_SUFFIX = ".spool"
+# Rows rejected permanently, one JSON object per line, kept next to the spools
+DEAD_LETTER_FILE = "dead-letter.jsonl"
+
+FLUSHES = registry.register(Counter(
+    "chat_write_flushes_total", "Bulk writes of the chat write-behind queue.", ("kind", "outcome")))
+FLUSH_ROWS = registry.register(Histogram(
+    "chat_write_flush_rows", "Rows per bulk write of the chat write-behind queue.", ("kind",),
+    (1, 2, 5, 10, 20, 50, 100, 200, 500)))
+DEAD_LETTERS = registry.register(Counter(
+    "chat_write_dead_letters_total", "Chat writes rejected permanently and moved to the dead-letter file.",
+    ("kind",)))
+
+
+class WriteQueueFull(Exception):
+    """Raised when MAX_QUEUED messages are already waiting, e.g. during a long outage."""
+
+
+def message_key(record: dict) -> Optional[str]:
+    """The key a saved message carries in message.data.id (None for messages saved before keys existed)."""
+    return ((record.get("message") or {}).get("data") or {}).get("id")
+
+
+def read_spool(lines: Iterable[str]) -> tuple[list[dict], dict[str, str]]:
+    """The messages (in order) and the latest updated_at per chat that a spool holds but were not written."""
+    messages, touches = [], {}
+    messages_through = touches_through = 0
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            # The last line is torn if the process died while appending it; it was never accepted
+            continue
+        if "messages_through" in entry:
+            messages_through = max(messages_through, entry["messages_through"])
+        elif "touches_through" in entry:
+            touches_through = max(touches_through, entry["touches_through"])
+        elif "message" in entry:
+            messages.append((entry["seq"], entry["message"]))
+        elif "touch" in entry:
+            touches[entry["touch"]] = (entry["seq"], entry["at"])
+    return ([record for seq, record in messages if seq > messages_through],
+            {chat_id: at for chat_id, (seq, at) in touches.items() if seq > touches_through})
+
+
+def _modified_at(path: str) -> float:
+    try:
+        return os.path.getmtime(path)
+    except FileNotFoundError:
+        return 0.0
+
+
+def _is_linked(f, path: str) -> bool:
+    """Whether `path` still names the open file `f`."""
+    try:
+        return os.stat(path).st_ino == os.fstat(f.fileno()).st_ino
+    except FileNotFoundError:
+        return False
+
+
+class WriteBehindQueue:
+    """
+    Durable queue of message inserts and updated_at bumps, written in bulk by a background thread.
+
+    `insert_messages(records)` and `touch_chats({chat_id: iso timestamp})` do the remote writes;
+    `written_keys(keys)` returns which message keys are already stored. `classify_error(error)` tells
+    whether a failed write is "transient" (retried), "permanent" (the rows are rejected) or "duplicate"
+    (the rows are already stored).
+    """
+
+    def __init__(self, insert_messages: Callable[[list[dict]], None],
+                 written_keys: Callable[[list[str]], set[str]],
+                 touch_chats: Callable[[dict[str, str]], None],
+                 classify_error: Callable[[Exception], str] = lambda error: "transient",
+                 directory: str = SPOOL_DIRECTORY):
+        self.insert_messages = insert_messages
+        self.written_keys = written_keys
+        self.touch_chats = touch_chats
+        self.classify_error = classify_error
+        self.directory = directory
+        self._condition = threading.Condition()
+        # Only one bulk write at a time, from the background thread or flush()
+        self._flush_lock = threading.Lock()
+        self._messages: deque[tuple[int, dict]] = deque()
+        self._by_chat: dict[str, deque[dict]] = {}
+        # chat_id -> (seq, latest updated_at) of the bumps not written yet
+        self._touches: dict[str, tuple[int, str]] = {}
+        self._seq = 0
+        # Queued messages up to this seq may already be stored (replayed, or sent by a failed request)
+        self._verify_through = 0
+        self._oldest: Optional[float] = None
+        self._spool = None
+        self._spool_path: Optional[str] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._backoff = 0.0
+        self.flushed = {"messages": 0, "touches": 0}
+        self.failures = 0
+        self.replayed = 0
+        self.dead_letters = 0
+
+    # --- Accepting writes ---
+
+    def save(self, records: list[dict]):
+        """Spools and queues message records (each with a message_key); raises WriteQueueFull when full."""
+        self.start()
+        with self._condition:
+            if len(self._messages) + len(records) > MAX_QUEUED:
+                raise WriteQueueFull(f"{len(self._messages)} chat messages are waiting to be written")
+            for record in records:
+                self._add_message(record)
+            self._sync()
+            self._condition.notify()
+
+    def touch(self, chat_id: str, at: str):
+        """Spools and queues an updated_at bump; bumps of the same chat are coalesced into the latest."""
+        self.start()
+        with self._condition:
+            self._add_touch(chat_id, at)
+            self._sync()
+            self._condition.notify()
+
+    def queued(self, chat_id: str) -> list[dict]:
+        """The chat's message records that are not written yet, oldest first."""
+        with self._condition:
+            return list(self._by_chat.get(chat_id, ()))
+
+    def _add_message(self, record: dict):
+        self._seq += 1
+        self._append({"seq": self._seq, "message": record})
+        self._messages.append((self._seq, record))
+        self._by_chat.setdefault(record["session_id"], deque()).append(record)
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+
+    def _add_touch(self, chat_id: str, at: str):
+        self._seq += 1
+        self._append({"seq": self._seq, "touch": chat_id, "at": at})
+        previous = self._touches.get(chat_id)
+        self._touches[chat_id] = (self._seq, max(at, previous[1]) if previous else at)
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+
+    def _append(self, entry: dict):
+        self._spool.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def _sync(self):
+        self._spool.flush()
+        if FSYNC:
+            os.fsync(self._spool.fileno())
+
+    # --- Lifecycle ---
+
+    def start(self):
+        """Opens this worker's spool, replays orphaned spools and starts the writer thread (once)."""
+        if self._thread is not None:
+            return
+        with self._condition:
+            if self._thread is not None:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self._spool_path = os.path.join(self.directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}{SPOOL_SUFFIX}")
+            # Created and locked under a name other workers don't replay, so no worker starting at the
+            # same time can take the new spool for an orphan before it is locked
+            self._spool = open(self._spool_path + ".new", "a", encoding="utf-8")
+            fcntl.flock(self._spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            os.rename(self._spool_path + ".new", self._spool_path)
+            self._replay_orphans()
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="chat-write-behind", daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def _replay_orphans(self):
+        spools = [path for path in glob.glob(os.path.join(self.directory, f"*{SPOOL_SUFFIX}"))
+                  if path != self._spool_path]
+        for path in sorted(spools, key=_modified_at):
+            try:
+                f = open(path, "r", encoding="utf-8")
+            except FileNotFoundError:
+                continue  # replayed by another worker in the meantime
+            with f:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # a running worker's spool
+                if not _is_linked(f, path):
+                    continue  # replayed and removed by another worker while we waited for the lock
+                messages, touches = read_spool(f)
+                for record in messages:
+                    self._add_message(record)
+                for chat_id, at in touches.items():
+                    self._add_touch(chat_id, at)
+                self._sync()
+                # Removed while still locked, so no other worker replays it as well
+                os.remove(path)
+            if messages or touches:
+                self._verify_through = self._seq
+                self.replayed += len(messages)
+                print(f"⚠️ Replaying {len(messages)} chat messages and {len(touches)} chat updates "
+                      f"spooled by a stopped worker ({os.path.basename(path)})")
+
+    def close(self):
+        """Stops the writer thread and writes what is queued; anything left is replayed by the next start."""
+        with self._condition:
+            thread = self._thread
+            if thread is None:
+                return
+            self._stopping = True
+            self._condition.notify_all()
+        thread.join()
+        self.flush()
+        with self._condition:
+            drained = not self._messages and not self._touches
+            self._spool.close()
+            if drained:
+                os.remove(self._spool_path)
+            else:
+                print(f"⚠️ {len(self._messages)} chat messages stay spooled in {self._spool_path}")
+            self._messages.clear()
+            self._by_chat.clear()
+            self._touches.clear()
+            self._oldest = None
+            self._thread = None
+
+    def flush(self) -> bool:
+        """Writes everything queued now; returns False if a bulk write failed (it stays queued)."""
+        while self._messages or self._touches:
+            if not self._flush_once():
+                return False
+        return True
+
+    # --- Writing ---
+
+    def _due_in(self) -> Optional[float]:
+        """Seconds until the next bulk write is due, or None while nothing is queued."""
+        if self._oldest is None:
+            return None
+        if len(self._messages) + len(self._touches) >= FLUSH_BATCH:
+            return 0.0
+        return self._oldest + FLUSH_INTERVAL - time.monotonic()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopping:
+                    wait = self._due_in()
+                    if wait is not None and wait <= 0:
+                        break
+                    self._condition.wait(wait)
+                if self._stopping:
+                    return
+            if not self._flush_once():
+                self._backoff = min(MAX_BACKOFF, self._backoff * 2 or FLUSH_INTERVAL)
+                with self._condition:
+                    self._condition.wait_for(lambda: self._stopping, self._backoff)
+
+    def _flush_once(self) -> bool:
+        with self._flush_lock:
+            with self._condition:
+                messages = list(islice(self._messages, MAX_INSERT_ROWS))
+                # In seq order, so the touches written are always the ones up to some seq
+                touches = sorted(self._touches.items(), key=lambda item: item[1][0])
+                verify = bool(messages) and messages[0][0] <= self._verify_through
+            ok = True
+            if messages:
+                ok = self._write_messages(messages, verify)
+            if touches:
+                ok = self._write_touches(touches) and ok
+            with self._condition:
+                if not self._messages and not self._touches:
+                    self._oldest = None
+                    self._spool.truncate(0)
+                elif ok:
+                    self._oldest = time.monotonic() if self._messages or self._touches else None
+                    if self._spool.tell() > SPOOL_COMPACT_BYTES:
+                        self._rewrite_spool()
+            if ok:
+                self._backoff = 0.0
+            return ok
+
+    def _write_messages(self, messages: list[tuple[int, dict]], verify: bool) -> bool:
+        try:
+            written = self.written_keys([message_key(record) for _, record in messages]) if verify else set()
+        except Exception as e:
+            self._failed("messages", len(messages), e)
+            return False
+
+        def insert(batch: list[tuple[int, dict]]):
+            records = [record for _, record in batch if message_key(record) not in written]
+            if records:
+                self.insert_messages(records)
+                FLUSHES.inc(("messages", "ok"))
+                FLUSH_ROWS.observe(len(records), ("messages",))
+                self.flushed["messages"] += len(records)
+
+        done, error = self._write_bisecting("messages", messages, insert, lambda item: item[1])
+        if done:
+            with self._condition:
+                # Only this method removes messages, so the handled ones are still at the head
+                for _ in range(done):
+                    _, record = self._messages.popleft()
+                    queued = self._by_chat[record["session_id"]]
+                    queued.popleft()
+                    if not queued:
+                        del self._by_chat[record["session_id"]]
+                self._append({"messages_through": messages[done - 1][0]})
+                self._spool.flush()
+        if error is not None:
+            self._failed("messages", len(messages) - done, error)
+            with self._condition:
+                # The insert may have gone through before the error, so check the keys on retry
+                self._verify_through = max(self._verify_through, messages[-1][0])
+            return False
+        return True
+
+    def _write_touches(self, touches: list[tuple[str, tuple[int, str]]]) -> bool:
+        def update(batch: list[tuple[str, tuple[int, str]]]):
+            self.touch_chats({chat_id: at for chat_id, (_, at) in batch})
+            FLUSHES.inc(("touches", "ok"))
+            FLUSH_ROWS.observe(len(batch), ("touches",))
+            self.flushed["touches"] += len(batch)
+
+        done, error = self._write_bisecting("touches", touches, update,
+                                            lambda item: {"chat_id": item[0], "at": item[1][1]})
+        if done:
+            with self._condition:
+                for chat_id, (seq, _) in touches[:done]:
+                    # Bumped again while writing: keep the newer one queued
+                    if self._touches.get(chat_id, (None,))[0] == seq:
+                        del self._touches[chat_id]
+                self._append({"touches_through": touches[done - 1][1][0]})
+                self._spool.flush()
+        if error is not None:
+            self._failed("touches", len(touches) - done, error)
+            return False
+        return True
+
+    def _write_bisecting(self, kind: str, items: list, write: Callable[[list], None],
+                         record_of: Callable[[Any], dict]) -> tuple[int, Optional[Exception]]:
+        """
+        Writes `items` in order, halving a batch that fails permanently until the rejected items are
+        isolated and dead-lettered. Returns how many leading items were handled (written, already
+        stored or dead-lettered) and the transient error that stopped the rest, if any.
+        """
+        try:
+            write(items)
+            return len(items), None
+        except Exception as e:
+            outcome = self.classify_error(e)
+            if outcome == "transient":
+                return 0, e
+            if len(items) == 1:
+                if outcome != "duplicate":
+                    self._dead_letter(kind, record_of(items[0]), e)
+                return 1, None
+        middle = len(items) // 2
+        done, error = self._write_bisecting(kind, items[:middle], write, record_of)
+        if done < middle:
+            return done, error
+        rest, error = self._write_bisecting(kind, items[middle:], write, record_of)
+        return middle + rest, error
+
+    def _dead_letter(self, kind: str, record: dict, error: Exception):
+        entry = {"kind": kind, "failed_at": datetime.now(timezone.utc).isoformat(),
+                 "error": f"{type(error).__name__}: {error}", "write": record}
+        with open(os.path.join(self.directory, DEAD_LETTER_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        DEAD_LETTERS.inc((kind,))
+        self.dead_letters += 1
+        print(f"❌ A queued chat write was rejected and moved to {DEAD_LETTER_FILE}: {error}")
+
+    def _failed(self, kind: str, rows: int, error: Exception):
+        FLUSHES.inc((kind, "failed"))
+        self.failures += 1
+        # Once per outage rather than on every retry
+        if self._backoff == 0:
+            print(f"⚠️ Writing {rows} queued chat {kind} failed, retrying with backoff: {error}")
+
+    def _rewrite_spool(self):
+        """Replaces the spool with one holding only the queued writes (called with the condition held)."""
+        path = self._spool_path + ".tmp"
+        spool = open(path, "w", encoding="utf-8")
+        fcntl.flock(spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        previous, self._spool = self._spool, spool
+        for seq, record in self._messages:
+            self._append({"seq": seq, "message": record})
+        for chat_id, (seq, at) in self._touches.items():
+            self._append({"seq": seq, "touch": chat_id, "at": at})
+        spool.flush()
+        os.fsync(spool.fileno())
+        os.replace(path, self._spool_path)
+        previous.close()
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "queued_messages": len(self._messages),
+                "queued_touches": len(self._touches),
+                "flushed": dict(self.flushed),
+                "failures": self.failures,
+                "replayed": self.replayed,
+                "dead_letters": self.dead_letters,
+            }
+
+
+def _queue_samples(queue: WriteBehindQueue) -> dict[tuple, float]:
+    stats = queue.stats()
+    return {("messages",): stats["queued_messages"], ("touches",): stats["queued_touches"]}
+
+
+def register_metrics(queue: WriteBehindQueue):
+    registry.register(CallbackMetric(
+        "chat_write_queued", "Chat writes accepted but not written to the remote stores yet.",
+        lambda: _queue_samples(queue), ("kind",)))
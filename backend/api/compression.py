@@ -0,0 +1,213 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional - fall back to gzip only
+    zstandard = None
+
+
+COMPRESSIBLE_CONTENT_TYPES = ("application/json", "text/")
+
+# Bodies above this size are compressed in a worker thread instead of on the event loop
+OFFLOAD_THRESHOLD = 64 * 1024
+
+
+def parse_accept_encoding(header_value: str) -> dict[str, float]:
+    """Parses an Accept-Encoding header into {coding: q-value}."""
+    codings = {}
+    for item in header_value.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings[coding] = q
+    return codings
+
+
+def negotiate_encoding(header_value: str, supported: tuple[str, ...]) -> Optional[str]:
+    """
+    Picks the supported coding with the highest q-value.
+    Ties are broken by the order of `supported`, so the server's preference wins.
+    """
+    codings = parse_accept_encoding(header_value)
+    wildcard = codings.get("*", 0.0)
+    best, best_q = None, 0.0
+    for coding in supported:
+        q = codings.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class CompressedBodyCache:
+    """
+    Bounded LRU of compressed bodies keyed on (digest of the uncompressed body, coding).
+
+    Cacheable responses that repeat (e.g. the same filter result served from the result cache)
+    are compressed once; later requests only pay for hashing the body.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple[bytes, str], bytes] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(body: bytes) -> bytes:
+        return hashlib.blake2b(body, digest_size=16).digest()
+
+    def get(self, key: tuple[bytes, str]) -> Optional[bytes]:
+        with self._lock:
+            compressed = self._entries.get(key)
+            if compressed is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return compressed
+
+    def put(self, key: tuple[bytes, str], compressed: bytes):
+        if len(compressed) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = compressed
+            self._size += len(compressed)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class CompressionMiddleware:
+    """
+    Negotiated zstd/gzip compression for large, non-streaming responses.
+
+    Only complete bodies of at least `minimum_size` bytes with a compressible content type
+    are compressed; streaming responses and already-encoded bodies pass through untouched.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6,
+                 zstd_level: int = 3, cache: Optional[CompressedBodyCache] = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+        self.cache = cache if cache is not None else CompressedBodyCache()
+        self.supported = ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        coding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""), self.supported)
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, send, coding, cacheable_request=scope["method"] in ("GET", "HEAD"))
+        await self.app(scope, receive, responder.send)
+
+    def compress(self, body: bytes, coding: str) -> bytes:
+        if coding == "zstd":
+            return zstandard.ZstdCompressor(level=self.zstd_level).compress(body)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+
+class _CompressionResponder:
+    """Buffers the response start message until the first body chunk shows whether to compress."""
+
+    def __init__(self, middleware: CompressionMiddleware, send: Send, coding: str, cacheable_request: bool):
+        self.middleware = middleware
+        self.downstream_send = send
+        self.coding = coding
+        self.cacheable_request = cacheable_request
+        self.start_message: Optional[Message] = None
+        self.passthrough = False
+
+    async def send(self, message: Message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough or self.start_message is None:
+            await self.downstream_send(message)
+            return
+
+        start_message, self.start_message = self.start_message, None
+        headers = Headers(raw=start_message["headers"])
+        body = message.get("body", b"")
+
+        if message.get("more_body", False) or not self._should_compress(headers, body):
+            # Streaming or small/incompressible body - forward as-is
+            self.passthrough = True
+            await self.downstream_send(start_message)
+            await self.downstream_send(message)
+            return
+
+        compressed = await self._compress(headers, start_message["status"], body)
+
+        mutable_headers = MutableHeaders(raw=start_message["headers"])
+        mutable_headers["Content-Encoding"] = self.coding
+        mutable_headers["Content-Length"] = str(len(compressed))
+        mutable_headers.add_vary_header("Accept-Encoding")
+        await self.downstream_send(start_message)
+        await self.downstream_send({"type": "http.response.body", "body": compressed})
+
+    def _should_compress(self, headers: Headers, body: bytes) -> bool:
+        if "content-encoding" in headers or len(body) < self.middleware.minimum_size:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE_CONTENT_TYPES)
+
+    async def _compress(self, headers: Headers, status_code: int, body: bytes) -> bytes:
+        cacheable = (
+            self.cacheable_request
+            and status_code == 200
+            and "no-store" not in headers.get("cache-control", "")
+        )
+        key = (self.middleware.cache.digest(body), self.coding) if cacheable else None
+        if key is not None:
+            compressed = self.middleware.cache.get(key)
+            if compressed is not None:
+                return compressed
+
+        if len(body) >= OFFLOAD_THRESHOLD:
+            compressed = await anyio.to_thread.run_sync(self.middleware.compress, body, self.coding)
+        else:
+            compressed = self.middleware.compress(body, self.coding)
+
+        if key is not None:
+            self.middleware.cache.put(key, compressed)
+        return compressed
@@ -0,0 +1,32 @@
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .models import DatasetVersion
+
+# The catalogue has a single version row so every worker (and the data loader script)
+# agrees on which snapshot of the destinations a cached result belongs to.
+DATASET_VERSION_ROW_ID = 1
+
+
+def get_dataset_version(db: Session) -> int:
+    """Returns the current version of the destination catalogue (0 if it was never bumped)."""
+    row = db.get(DatasetVersion, DATASET_VERSION_ROW_ID)
+    return row.version if row else 0
+
+
+def bump_dataset_version(db: Session) -> int:
+    """
+    Increments the catalogue version inside the caller's transaction and returns the new version.
+    The increment happens in the database, so concurrent bumps from several workers never yield the
+    same version. The caller is responsible for committing.
+    """
+    table = DatasetVersion.__table__
+    increment = update(table).where(table.c.id == DATASET_VERSION_ROW_ID).values(version=table.c.version + 1)
+    if db.execute(increment).rowcount == 0:
+        try:
+            with db.begin_nested():
+                db.execute(insert(table).values(id=DATASET_VERSION_ROW_ID, version=1))
+        except IntegrityError:
+            # Another worker created the row first
+            db.execute(increment)
+    return db.execute(select(table.c.version).where(table.c.id == DATASET_VERSION_ROW_ID)).scalar_one()
@@ -1,4 +1,5 @@
-from typing import Annotated
+from contextlib import contextmanager
+from typing import Annotated, Optional
 from sqlalchemy.orm import Session
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -7,6 +8,7 @@ from jose import jwt, JWTError
 from dotenv import load_dotenv
 import os
 from .database import SessionLocal
+from .subsystems import subsystems
 
 load_dotenv()
 
@@ -14,7 +16,11 @@ SECRET_KEY = os.getenv('AUTH_SECRET_KEY')
 ALGORITHM = os.getenv('AUTH_ALGORITHM')
 
 
-def get_db():
+@contextmanager
+def db_session():
+    """A session on the destinations database, for code that only needs one some of the time."""
+    # Creates the tables on first use if the lifespan warm-up didn't
+    subsystems.get("database")
     db = SessionLocal()
     try:
         yield db
@@ -22,6 +28,11 @@ def get_db():
         db.close()
 
 
+def get_db():
+    with db_session() as db:
+        yield db
+
+
 db_dependency = Annotated[Session, Depends(get_db)]
 
 bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
@@ -45,3 +56,19 @@ async def get_current_user(token: oauth2_bearer_dependency):
 
 
 user_dependency = Annotated[dict, Depends(get_current_user)]
+
+
+optional_oauth2_bearer = OAuth2PasswordBearer(tokenUrl='auth/token', auto_error=False)
+
+
+# Like get_current_user, but None for anonymous or invalid tokens (e.g. to key per-user limits)
+async def get_optional_user(token: Annotated[Optional[str], Depends(optional_oauth2_bearer)]):
+    if not token:
+        return None
+    try:
+        return await get_current_user(token)
+    except HTTPException:
+        return None
+
+
+optional_user_dependency = Annotated[Optional[dict], Depends(get_optional_user)]
@@ -1,20 +1,14 @@
 import json
-import os
 import pandas as pd
-from dotenv import load_dotenv
-import openai
-from openai import OpenAI
 from pydantic import BaseModel
 from typing import List, Literal, Optional
 from sqlalchemy import inspect
 from ..models import Destination
+from ..subsystems import subsystems
+from ..metrics import stage
 import numpy as np
 from math import e
 
-load_dotenv('..')
-openai.api_key = os.environ['OPENAI_API_KEY']
-client = OpenAI()
-
 
 class DynamicFilter(BaseModel):
     question: str
@@ -94,7 +88,7 @@ class DynamicFilterGenerator:
             },
         ]
 
-        response = client.responses.parse(
+        response = subsystems.get("openai").responses.parse(
             model="gpt-4o-mini",
             temperature=0.8,
             input=messages,
@@ -132,12 +126,61 @@ class DynamicFilterGenerator:
         return df
 
     def generate_dynamic_filters(self, selected_destinations):
-        selected_destinations = self.convert_data_into_dataframe(selected_destinations)
-        sorted_entropies = self.calculate_column_entropies(selected_destinations)
-        dynamic_filters = self.generate_filters_via_openai(sorted_entropies)
+        if hasattr(selected_destinations, 'all'):
+            with stage("dynamic_filters", "query"):
+                selected_destinations = selected_destinations.all()
+        with stage("dynamic_filters", "facets"):
+            selected_destinations = self.convert_data_into_dataframe(selected_destinations)
+        with stage("dynamic_filters", "entropy"):
+            sorted_entropies = self.calculate_column_entropies(selected_destinations)
+        with stage("dynamic_filters", "llm"):
+            dynamic_filters = self.generate_filters_via_openai(sorted_entropies)
+
+        return dynamic_filters
+
+    def generate_dynamic_filters_from_snapshot(self, snapshot, rows):
+        """Same as `generate_dynamic_filters`, computed on the given rows of the memory-mapped snapshot."""
+        with stage("dynamic_filters", "entropy"):
+            sorted_entropies = self.calculate_snapshot_entropies(snapshot, rows)
+        with stage("dynamic_filters", "llm"):
+            dynamic_filters = self.generate_filters_via_openai(sorted_entropies)
 
         return dynamic_filters
 
+    def calculate_snapshot_entropies(self, snapshot, rows, base=None):
+        """
+        Entropies and unique values of the analysed columns from snapshot codes (missing values ignored,
+        like `value_counts`), without materializing the rows as objects.
+        """
+        columns = {"region": snapshot.column("region")[rows], "budget_level": snapshot.column("budget_level")[rows]}
+        scores = snapshot.column("scores")[rows]
+        trips = snapshot.column("trips")[rows]
+        columns.update({name: scores[:, i] for i, name in enumerate(snapshot.manifest["score_columns"])})
+        columns.update({name: trips[:, i] for i, name in enumerate(snapshot.manifest["trip_columns"])})
+
+        base = e if base is None else base
+        entropies, unique_values = {}, {}
+        # Same column order as the DataFrame path, so ties are ordered identically
+        for col in [c.name for c in inspect(Destination).columns if c.name in columns]:
+            codes = columns[col].astype(np.int64)
+            counts = np.bincount(codes[codes >= 0])
+            present = np.flatnonzero(counts)
+            p = counts[present] / counts.sum() if len(present) else np.zeros(0)
+            entropies[col] = float(-(p * np.log(p) / np.log(base)).sum())
+            if col in snapshot.dictionaries:
+                unique_values[col] = sorted(snapshot.dictionaries[col][code] for code in present)
+            elif col in snapshot.manifest["trip_columns"]:
+                unique_values[col] = [bool(code) for code in present]
+            else:
+                unique_values[col] = present.tolist()
+
+        result_df = pd.DataFrame({
+            "entropy": entropies,
+            "unique_values": unique_values
+        })
+
+        return result_df.sort_values(by="entropy", ascending=False).head(self.top_n_features)
+
     def pandas_entropy(self, column, base=None):
         vc = pd.Series(column).value_counts(normalize=True, sort=False)
         base = e if base is None else base
@@ -145,14 +188,16 @@ class DynamicFilterGenerator:
 
     def calculate_column_entropies(self, df, base=None):
         df_to_analyse = df.copy()
+        # trip_types packs the trip flags into a bitmask the frontend can't filter on; the flags are analysed instead
         columns_to_remove = [
             "id", "short_description", "city", "country",
-            "longitude", "latitude", "avg_temp_monthly"
+            "longitude", "latitude", "avg_temp_monthly", "trip_types"
         ]
         df_to_analyse.drop(columns_to_remove, axis='columns', inplace=True, errors='ignore')
 
         entropies = {col: self.pandas_entropy(df_to_analyse[col], base=base) for col in df_to_analyse.columns}
-        unique_values = {col: sorted(df_to_analyse[col].unique().tolist()) for col in df_to_analyse.columns}
+        # Missing values are ignored, as in the entropies and the snapshot path
+        unique_values = {col: sorted(df_to_analyse[col].dropna().unique().tolist()) for col in df_to_analyse.columns}
 
         result_df = pd.DataFrame({
             "entropy": entropies,
@@ -0,0 +1,147 @@
+import os
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Hashable, Optional
+from fastapi_filter.contrib.sqlalchemy import Filter
+
+
+def canonical_filter_key(filters: Optional[Filter]) -> tuple:
+    """
+    Normalizes a filter instance into a stable, hashable key.
+
+    Two filters that select the same destinations should produce the same key, so:
+    - None values are dropped,
+    - `__in` lists are de-duplicated and sorted,
+    - a `__in` list with a single value becomes an exact match,
+    - ranges made redundant by an exact match or an `__in` list are collapsed,
+    - a range whose bounds are equal becomes an exact match.
+    """
+    if filters is None:
+        return ()
+
+    fields = dict(filters.filtering_fields)
+
+    # Group the lookups by the model attribute they apply to (e.g. culture, culture__gte, ...)
+    grouped: dict[str, dict[str, Any]] = defaultdict(dict)
+    for name, value in fields.items():
+        attribute, _, operator = name.partition("__")
+        if isinstance(value, (list, tuple, set)):
+            value = tuple(sorted(set(value)))
+        grouped[attribute][operator or "eq"] = value
+
+    canonical = []
+    for attribute, lookups in grouped.items():
+        for operator, value in _collapse_lookups(lookups).items():
+            name = attribute if operator == "eq" else f"{attribute}__{operator}"
+            canonical.append((name, value))
+
+    return tuple(sorted(canonical))
+
+
+def _collapse_lookups(lookups: dict[str, Any]) -> dict[str, Any]:
+    """Removes lookups implied by stronger ones on the same attribute."""
+    lookups = dict(lookups)
+    gte, lte = lookups.get("gte"), lookups.get("lte")
+
+    def in_range(value):
+        return (gte is None or value >= gte) and (lte is None or value <= lte)
+
+    if "eq" not in lookups and gte is not None and gte == lte:
+        lookups["eq"] = gte
+
+    if "in" in lookups and (gte is not None or lte is not None):
+        lookups["in"] = tuple(v for v in lookups["in"] if in_range(v))
+        lookups.pop("gte", None)
+        lookups.pop("lte", None)
+
+    if "eq" not in lookups and len(lookups.get("in", ())) == 1:
+        lookups["eq"] = lookups.pop("in")[0]
+
+    if "eq" in lookups:
+        exact = lookups["eq"]
+        # A contradicting range or list is kept so the key still describes an empty selection
+        if in_range(exact):
+            lookups.pop("gte", None)
+            lookups.pop("lte", None)
+        if exact in lookups.get("in", (exact,)):
+            lookups.pop("in", None)
+
+    return lookups
+
+
+class FilterResultCache:
+    """
+    Bounded LRU cache for results computed from a filtered destination query.
+
+    Entries are keyed on (namespace, canonical filter, dataset version), so a catalogue change
+    never serves a stale result; entries of older versions are dropped as soon as a newer one is seen.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.Lock()
+        self._latest_version = None
+        self._hits: dict[str, int] = defaultdict(int)
+        self._misses: dict[str, int] = defaultdict(int)
+        self._evictions = 0
+
+    def get_or_compute(self, namespace: str, filters: Optional[Filter], version: int,
+                       compute: Callable[[], Any]) -> Any:
+        key = (namespace, canonical_filter_key(filters), version)
+
+        with self._lock:
+            if self._latest_version is None or version > self._latest_version:
+                self._drop_older_versions(version)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._hits[namespace] += 1
+                return self._entries[key]
+            self._misses[namespace] += 1
+
+        # Compute outside the lock so a slow pipeline doesn't block cache hits
+        value = compute()
+
+        with self._lock:
+            if self._latest_version is None or version >= self._latest_version:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self._evictions += 1
+        return value
+
+    def _drop_older_versions(self, version: int):
+        self._latest_version = version
+        for key in [key for key in self._entries if key[2] < version]:
+            del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters overall and per namespace."""
+        with self._lock:
+            namespaces = sorted(set(self._hits) | set(self._misses))
+            per_namespace = {
+                namespace: _ratio_stats(self._hits[namespace], self._misses[namespace])
+                for namespace in namespaces
+            }
+            return {
+                **_ratio_stats(sum(self._hits.values()), sum(self._misses.values())),
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "evictions": self._evictions,
+                "dataset_version": self._latest_version,
+                "namespaces": per_namespace,
+            }
+
+
+def _ratio_stats(hits: int, misses: int) -> dict:
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_ratio": hits / total if total else 0.0}
+
+
+# Shared by the destinations and dynamic filters routers
+filter_result_cache = FilterResultCache(maxsize=int(os.getenv("FILTER_CACHE_SIZE", "256")))
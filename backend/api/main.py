@@ -1,9 +1,39 @@
-from fastapi import FastAPI
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, status
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .database import Base, engine
-from .routers import auth, destinations, dynamic_filters, chat
+from .subsystems import subsystems, warmup_subsystem_names
+from .routers import auth, destinations, dynamic_filters, chat, profiles
+from .filters.filter_cache import filter_result_cache
+from .similarity.knn_index import similarity_index
+from .snapshot import destination_snapshot
+from .compression import CompressionMiddleware, CompressedBodyCache
+from .metrics import MetricsMiddleware, CallbackMetric, registry as metrics_registry
+from .profiling import ProfilingMiddleware, profiling_enabled, start_continuous_sampler
+from .chat.chat_utils import message_writer
+from .chat.write_behind import WRITE_BEHIND_ENABLED
 
-app = FastAPI()
+WARMUP_SUBSYSTEMS = warmup_subsystem_names()
+SUBSYSTEM_INIT_TIMEOUT = float(os.getenv("SUBSYSTEM_INIT_TIMEOUT", "10"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Only the configured subsystems are built at startup; everything else initializes on first use
+    await subsystems.warm_up(WARMUP_SUBSYSTEMS, timeout=SUBSYSTEM_INIT_TIMEOUT)
+    if profiling_enabled():
+        start_continuous_sampler()
+    if WRITE_BEHIND_ENABLED:
+        # Replays chat writes spooled by workers that stopped before writing them
+        message_writer.start()
+    yield
+    if WRITE_BEHIND_ENABLED:
+        await asyncio.to_thread(message_writer.close)
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -11,10 +41,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Negotiated zstd/gzip compression for large JSON bodies (e.g. the full destinations list)
+compressed_body_cache = CompressedBodyCache(max_bytes=int(os.getenv("COMPRESSION_CACHE_BYTES", str(32 * 1024 * 1024))))
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")),
+    gzip_level=int(os.getenv("COMPRESSION_GZIP_LEVEL", "6")),
+    zstd_level=int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3")),
+    cache=compressed_body_cache,
+)
+
+# Only installed when a profiling token is configured, so it costs nothing otherwise
+if profiling_enabled():
+    app.add_middleware(ProfilingMiddleware)
 
-Base.metadata.create_all(bind=engine)
+# Outermost, so the measured latency and Server-Timing cover compression as well
+app.add_middleware(MetricsMiddleware)
 
 
 @app.get("/health_check/")
@@ -22,7 +67,52 @@ def health_check():
     return "Health check complete - the app is working!"
 
 
+@app.get("/ready")
+def ready():
+    """Per-subsystem readiness; 503 while a warm-up subsystem is missing or any subsystem is failing."""
+    is_ready, report = subsystems.readiness(required=WARMUP_SUBSYSTEMS)
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if is_ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"ready": is_ready, "subsystems": report},
+    )
+
+
+@app.get("/cache_stats/")
+def cache_stats():
+    return {
+        "filter_results": filter_result_cache.stats(),
+        "compressed_bodies": compressed_body_cache.stats(),
+        "similarity_index": similarity_index.stats(),
+        "snapshot": destination_snapshot.stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text exposition of request, pipeline stage and cache metrics."""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+
+def _cache_samples():
+    filter_stats, body_stats = filter_result_cache.stats(), compressed_body_cache.stats()
+    samples = {
+        ("compressed_bodies", "all", "hits"): body_stats["hits"],
+        ("compressed_bodies", "all", "misses"): body_stats["misses"],
+    }
+    for namespace, stats in filter_stats["namespaces"].items():
+        samples[("filter_results", namespace, "hits")] = stats["hits"]
+        samples[("filter_results", namespace, "misses")] = stats["misses"]
+    return samples
+
+
+metrics_registry.register(CallbackMetric(
+    "cache_lookups_total", "Cache lookups by cache, namespace and outcome.", _cache_samples,
+    ("cache", "namespace", "outcome"), metric_type="counter"))
+
+
 app.include_router(auth.router)
 app.include_router(destinations.router)
 app.include_router(dynamic_filters.router)
 app.include_router(chat.router)
+if profiling_enabled():
+    app.include_router(profiles.router)
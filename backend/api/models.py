@@ -1,30 +1,73 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, SmallInteger, Float, String, ForeignKey, Boolean, Index, text
 from sqlalchemy.orm import relationship
+from sqlalchemy.types import TypeDecorator
 from .database import Base
 
+# Stored as their position in these tuples: only ever append, or existing rows change meaning
+REGIONS = ("europe", "north_america", "asia", "africa", "south_america", "oceania", "middle_east")
+BUDGET_LEVELS = ("Budget", "Mid-range", "Luxury")
+THEMES = ("culture", "adventure", "nature", "beaches", "nightlife", "cuisine", "wellness", "urban", "seclusion")
+# Bit i of Destination.trip_types is set when the destination suits TRIP_TYPES[i]
+TRIP_TYPES = ("day_trip", "long_trip", "one_week", "short_trip", "weekend")
+
+
+class CodedEnum(TypeDecorator):
+    """A string from a fixed list of values, stored as its small-integer code."""
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, name: str, values: tuple[str, ...]):
+        super().__init__()
+        self.name = name
+        self.values = values
+        self.codes = {value: code for code, value in enumerate(values)}
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        try:
+            return self.codes[value]
+        except KeyError:
+            raise ValueError(f"Unknown {self.name} '{value}' (expected one of {', '.join(self.values)})") from None
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else self.values[value]
+
+
+def trip_mask(flags: dict) -> int:
+    """Packs the trip-duration flags of a destination into its trip_types bitmask."""
+    return sum(1 << bit for bit, trip_type in enumerate(TRIP_TYPES) if flags.get(trip_type))
+
+
+def trip_type_masks(trip_types: list[str]) -> list[int]:
+    """Every trip_types value suiting at least one of `trip_types`, so the match is an indexed IN (...)."""
+    wanted = trip_mask(dict.fromkeys(trip_types, True))
+    return [mask for mask in range(1 << len(TRIP_TYPES)) if mask & wanted]
+
+
 class Destination(Base):
     __tablename__ = "destinations"
 
-    id = Column(String, primary_key=True, index=True)  # UUID from CSV
+    id = Column(String, primary_key=True)  # UUID from CSV
     city = Column(String, nullable=False)
     country = Column(String, nullable=False)
-    region = Column(String, nullable=False)
+    region = Column(CodedEnum("region", REGIONS), nullable=False)
     short_description = Column(String, nullable=True)
-    latitude = Column(String, nullable=True)
-    longitude = Column(String, nullable=True)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
     avg_temp_monthly = Column(String, nullable=True)  # Stored as JSON string
-    budget_level = Column(String, nullable=True)
-    
+    budget_level = Column(CodedEnum("budget_level", BUDGET_LEVELS), nullable=True)
+
     # Scores from 1 to 5 for various themes
-    culture = Column(Integer)
-    adventure = Column(Integer)
-    nature = Column(Integer)
-    beaches = Column(Integer)
-    nightlife = Column(Integer)
-    cuisine = Column(Integer)
-    wellness = Column(Integer)
-    urban = Column(Integer)
-    seclusion = Column(Integer)
+    culture = Column(SmallInteger)
+    adventure = Column(SmallInteger)
+    nature = Column(SmallInteger)
+    beaches = Column(SmallInteger)
+    nightlife = Column(SmallInteger)
+    cuisine = Column(SmallInteger)
+    wellness = Column(SmallInteger)
+    urban = Column(SmallInteger)
+    seclusion = Column(SmallInteger)
 
     # Boolean flags (0/1) for trip durations
     day_trip = Column(Boolean)
@@ -32,6 +75,24 @@ class Destination(Base):
     one_week = Column(Boolean)
     short_trip = Column(Boolean)
     weekend = Column(Boolean)
+    # The same flags packed into one column, for the `trip_type__in` filter
+    trip_types = Column(SmallInteger, nullable=False,
+                        default=lambda context: trip_mask(context.get_current_parameters()))
+
+    # Chosen from the filters the frontend and the benchmarks send (schema_migration.COMMON_FILTERS
+    # lists them, and `python -m backend.api.schema_migration --check` verifies each one uses an index)
+    __table_args__ = (
+        Index("ix_destinations_region_budget_level", "region", "budget_level"),
+        Index("ix_destinations_budget_level", "budget_level"),
+        Index("ix_destinations_country", "country"),
+        Index("ix_destinations_city", "city"),
+        Index("ix_destinations_trip_types", "trip_types"),
+        *(Index(f"ix_destinations_{theme}", theme) for theme in THEMES),
+        # Few destinations suit day trips or long trips, so only those rows are indexed
+        *(Index(f"ix_destinations_{trip_type}", "region",
+                sqlite_where=text(f"{trip_type} = 1"), postgresql_where=text(trip_type))
+          for trip_type in ("day_trip", "long_trip")),
+    )
 
 
 class User(Base):
@@ -54,3 +115,11 @@ class Chat(Base):
     response = Column(String)  # bot response
 
     user = relationship("User", back_populates="chats")
+
+
+class DatasetVersion(Base):
+    __tablename__ = "dataset_version"
+
+    # Single-row table; bumped whenever the destination catalogue changes
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,284 @@
+"""
+On-demand profiling of single requests, plus an optional low-rate continuous sampler.
+
+Profiling is off unless PROFILING_TOKEN is set; the middleware and the /profiles endpoints are
+then not even installed. With it set, a request carrying the token in the `X-Profile` header or
+the `profile` query parameter is profiled:
+
+- `sample` (default): a sampling profiler records the Python stacks of every thread (event loop
+  and threadpool workers) every PROFILE_SAMPLE_INTERVAL seconds while the request runs, stored
+  as collapsed stacks (`<id>.folded`) for flamegraph.pl, speedscope or inferno. It is a wall-clock
+  view: waiting threads are kept, and requests running concurrently show up in the samples too.
+- `cprofile`: deterministic cProfile, stored as `<id>.pstats` for pstats/snakeviz. Before Python
+  3.12 cProfile only sees the event loop thread, not sync endpoints running in the threadpool.
+
+Choose the mode with the `X-Profile-Mode` header or `profile_mode` query parameter. One request
+is profiled at a time; others pass through with `X-Profile-Status: busy`. The response carries
+`X-Profile-Id`, which is the id to fetch from /profiles/{id}.
+
+With PROFILE_CONTINUOUS_INTERVAL set (seconds, e.g. 0.05), a background thread also samples all
+threads at that rate and aggregates the busy stacks over time (GET /profiles/continuous).
+"""
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Optional
+from urllib.parse import parse_qs
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+PROFILE_DIRECTORY = os.getenv("PROFILE_DIRECTORY", os.path.join(tempfile.gettempdir(), "travel-profiles"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+PROFILE_CONTINUOUS_INTERVAL = float(os.getenv("PROFILE_CONTINUOUS_INTERVAL", "0"))
+# Distinct stacks kept by the continuous sampler; the rarest are dropped beyond this
+CONTINUOUS_MAX_STACKS = 10_000
+
+MODES = ("sample", "cprofile")
+# Leaf frames of threads that are waiting rather than running (event loop select, idle workers)
+IDLE_FRAMES = {("selectors.py", "select"), ("threading.py", "wait"), ("queue.py", "get"),
+               ("thread.py", "_worker"), ("_base.py", "wait")}
+
+
+def profiling_enabled() -> bool:
+    return bool(PROFILING_TOKEN)
+
+
+def valid_token(token: Optional[str]) -> bool:
+    return bool(PROFILING_TOKEN) and token is not None and hmac.compare_digest(token, PROFILING_TOKEN)
+
+
+# --- Stack sampling ---
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _folded_stack(frame, thread_name: str, skip_idle: bool) -> Optional[str]:
+    code = frame.f_code
+    if skip_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+        return None
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """Samples the stacks of all other threads every `interval` seconds into folded-stack counts."""
+
+    # Sampler threads never sample each other
+    _sampler_threads: set[int] = set()
+
+    def __init__(self, interval: float, skip_idle: bool = False, max_stacks: Optional[int] = None):
+        self.interval = interval
+        self.skip_idle = skip_idle
+        self.max_stacks = max_stacks
+        self.counts: Counter[str] = Counter()
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        StackSampler._sampler_threads.add(threading.get_ident())
+        try:
+            while not self._stopped.wait(self.interval):
+                self.sample()
+        finally:
+            StackSampler._sampler_threads.discard(threading.get_ident())
+
+    def sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident in StackSampler._sampler_threads:
+                continue
+            stack = _folded_stack(frame, names.get(ident, str(ident)), self.skip_idle)
+            if stack is not None:
+                stacks.append(stack)
+        with self._lock:
+            self.samples += 1
+            self.counts.update(stacks)
+            if self.max_stacks and len(self.counts) > self.max_stacks:
+                self.counts = Counter(dict(self.counts.most_common(self.max_stacks // 2)))
+
+    def folded(self) -> str:
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+    def reset(self):
+        with self._lock:
+            self.counts.clear()
+            self.samples = 0
+
+
+def top_frames(folded: str, limit: int = 30) -> list[tuple[str, int]]:
+    """Functions by the number of samples in which they were running (the leaf of the stack)."""
+    leaves: Counter[str] = Counter()
+    for line in folded.splitlines():
+        stack, _, count = line.rpartition(" ")
+        leaves[stack.rsplit(";", 1)[-1]] += int(count)
+    return leaves.most_common(limit)
+
+
+# --- Artifacts ---
+
+class ProfileStore:
+    """Profiles on disk: `<id>.pstats` or `<id>.folded`, each with a `<id>.json` description."""
+
+    def __init__(self, directory: str = PROFILE_DIRECTORY, keep: int = PROFILE_KEEP):
+        self.directory = directory
+        self.keep = keep
+
+    def artifact_path(self, profile_id: str, mode: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}.{'pstats' if mode == 'cprofile' else 'folded'}")
+
+    def save(self, profile_id: str, mode: str, metadata: dict, profile):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.artifact_path(profile_id, mode)
+        if mode == "cprofile":
+            profile.dump_stats(path)
+        else:
+            with open(path, "w") as f:
+                f.write(profile.folded())
+        with open(os.path.join(self.directory, f"{profile_id}.json"), "w") as f:
+            json.dump({"id": profile_id, "mode": mode, **metadata}, f)
+        self._cleanup()
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        # Ids are generated hex strings; anything else never names a file we wrote
+        if not profile_id.isalnum():
+            return None
+        try:
+            with open(os.path.join(self.directory, f"{profile_id}.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def list(self) -> list[dict]:
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = [self.get(name[:-5]) for name in os.listdir(self.directory) if name.endswith(".json")]
+        return sorted((p for p in profiles if p), key=lambda p: p["created_at"], reverse=True)
+
+    def summary(self, profile: dict, limit: int = 40) -> str:
+        path = self.artifact_path(profile["id"], profile["mode"])
+        if profile["mode"] == "cprofile":
+            stream = io.StringIO()
+            pstats.Stats(path, stream=stream).sort_stats("cumulative").print_stats(limit)
+            return stream.getvalue()
+        with open(path) as f:
+            folded = f.read()
+        return "\n".join(f"{count:>8}  {frame}" for frame, count in top_frames(folded, limit)) + "\n"
+
+    def _cleanup(self):
+        for profile in self.list()[self.keep:]:
+            for suffix in (".json", ".pstats", ".folded"):
+                try:
+                    os.remove(os.path.join(self.directory, profile["id"] + suffix))
+                except FileNotFoundError:
+                    pass
+
+
+profile_store = ProfileStore()
+continuous_sampler: Optional[StackSampler] = None
+
+
+def start_continuous_sampler():
+    """Starts the low-rate sampler if PROFILE_CONTINUOUS_INTERVAL is set (idempotent)."""
+    global continuous_sampler
+    if PROFILE_CONTINUOUS_INTERVAL > 0 and continuous_sampler is None:
+        continuous_sampler = StackSampler(PROFILE_CONTINUOUS_INTERVAL, skip_idle=True,
+                                          max_stacks=CONTINUOUS_MAX_STACKS).start()
+
+
+# --- Middleware ---
+
+class ProfilingMiddleware:
+    """Profiles requests that carry the profiling token (see module docstring)."""
+
+    def __init__(self, app: ASGIApp, store: ProfileStore = profile_store):
+        self.app = app
+        self.store = store
+        # cProfile (and sampling, to keep profiles readable) allow one profiled request at a time
+        self._busy = threading.Lock()
+
+    @staticmethod
+    def _requested_mode(scope: Scope) -> Optional[str]:
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        token = headers.get("x-profile") or (query.get("profile") or [None])[0]
+        if not valid_token(token):
+            return None
+        mode = headers.get("x-profile-mode") or (query.get("profile_mode") or ["sample"])[0]
+        return mode if mode in MODES else "sample"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        mode = self._requested_mode(scope) if scope["type"] == "http" else None
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, _with_headers(send, {"X-Profile-Status": "busy"}))
+            return
+
+        profile_id = uuid.uuid4().hex
+        started_at, started = time.time(), time.perf_counter()
+        if mode == "cprofile":
+            profile = cProfile.Profile()
+            profile.enable()
+        else:
+            profile = StackSampler(PROFILE_SAMPLE_INTERVAL).start()
+        try:
+            await self.app(scope, receive, _with_headers(send, {"X-Profile-Id": profile_id}))
+        finally:
+            if mode == "cprofile":
+                profile.disable()
+            else:
+                profile.stop()
+            try:
+                self.store.save(profile_id, mode, {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": getattr(scope.get("route"), "path", None),
+                    "created_at": started_at,
+                    "duration_seconds": time.perf_counter() - started,
+                }, profile)
+            except OSError as e:
+                print(f"⚠️ Could not store profile {profile_id}: {e}")
+            finally:
+                self._busy.release()
+
+
+def _with_headers(send: Send, extra: dict[str, str]) -> Send:
+    async def send_with_headers(message: Message):
+        if message["type"] == "http.response.start":
+            headers = MutableHeaders(scope=message)
+            for name, value in extra.items():
+                headers.append(name, value)
+        await send(message)
+    return send_with_headers
@@ -1,6 +1,7 @@
 from datetime import timedelta, datetime, timezone
 from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException, status
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from fastapi.security import OAuth2PasswordRequestFormStrict
 from jose import jwt
@@ -8,15 +9,12 @@ from dotenv import load_dotenv
 import os
 from ..models import User
 from ..deps import db_dependency, bcrypt_context
-from supabase import create_client, Client
+from ..subsystems import subsystems
+from ..metrics import count_db_query
 
 
 load_dotenv()
 
-supabase_url: str = os.environ.get("SUPABASE_URL")
-supabase_key: str = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(supabase_url, supabase_key)
-
 router = APIRouter(
     prefix='/auth',
     tags=['auth']
@@ -40,7 +38,8 @@ class Token(BaseModel):
 # New code with Supabase:
 def authenticate_user(username: str, password: str):
     # Retrieve the user by username
-    response = supabase.table("users").select("*").eq("username", username).limit(1).execute()
+    response = subsystems.get("supabase").table("users").select("*").eq("username", username).limit(1).execute()
+    count_db_query("supabase")
     
     # Supabase returns the data in a `response.data` list
     user_data = response.data
@@ -68,11 +67,13 @@ def create_access_token(username: str, user_id: int, expires_delta: timedelta):
 async def create_user(create_user_request: UserCreateRequest):
     new_user = {
         "username": create_user_request.username,
-        "hashed_password": bcrypt_context.hash(create_user_request.password)
+        # bcrypt is deliberately slow; hashing on the event loop would stall every other request
+        "hashed_password": await run_in_threadpool(bcrypt_context.hash, create_user_request.password)
     }
     
     try:
-        response = supabase.table("users").insert(new_user).execute()
+        response = subsystems.get("supabase").table("users").insert(new_user).execute()
+        count_db_query("supabase")
         if not response.data:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Failed to create user.")
     except Exception as e:
@@ -81,7 +82,7 @@ async def create_user(create_user_request: UserCreateRequest):
 
 @router.post("/token", response_model=Token)
 async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestFormStrict, Depends()]):
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await run_in_threadpool(authenticate_user, form_data.username, form_data.password)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate user")
 
@@ -1,7 +1,11 @@
 from typing import List, Optional
 from ..chat.chat_utils import ChatHandler
-from fastapi import APIRouter, HTTPException, status
+from ..deps import db_session
+from ..admission import admission
+from .destinations import DestinationRetrieve, fetch_destinations_in_order
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query, Response, status
 from pydantic import BaseModel
+import base64
 import uuid
 from datetime import datetime
 import operator
@@ -21,13 +25,21 @@ class ChatRequest(BaseModel):
     prompt: str
     chat_id: Optional[uuid.UUID] = None
     user_id: uuid.UUID 
+    include_destinations: bool = False
 
 class ChatMessageResponse(BaseModel): 
     message: str
     sources: str
     chat_id: uuid.UUID 
+    destinations: Optional[List[DestinationRetrieve]] = None
+    # Keys of the saved prompt and reply, matching MessageEntry.key once they show up in the history
+    user_message_key: Optional[str] = None
+    message_key: Optional[str] = None
 
 class MessageEntry(BaseModel):
+    id: Optional[int] = None
+    # Set on save, before the message has an id (see Chat write-behind in the README)
+    key: Optional[str] = None
     role: str
     content: str
     user_id: Optional[uuid.UUID] = None
@@ -36,6 +48,10 @@ class MessageEntry(BaseModel):
 class ConversationRetrieve(BaseModel):
     chat_id: uuid.UUID
     history: List[MessageEntry]
+    # Pass as `before` to load older messages; None when the start of the chat is reached
+    next_cursor: Optional[int] = None
+    # Pass as `since` to poll for new messages
+    latest_cursor: Optional[int] = None
 
 # --- FastAPI Router and Handler Initialization ---
 router = APIRouter(prefix="/chat", tags=["chat"])
@@ -52,41 +68,83 @@ async def create_new_chat(chat_req: ChatCreateRequest):
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
+def _encode_chat_cursor(chat) -> str:
+    return base64.urlsafe_b64encode(f"{chat.updated_at.isoformat()}|{chat.id}".encode()).decode()
+
+
+def _decode_chat_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    try:
+        updated_at, chat_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(updated_at), uuid.UUID(chat_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+
+
 @router.get("/users/{user_id}/chats/", response_model=List[ChatResponseModel])
-async def get_user_chat_sessions(user_id: uuid.UUID):
-    """Retrieves all chat sessions for a given user."""
-    chats = await handler.get_user_chats(user_id)
+async def get_user_chat_sessions(user_id: uuid.UUID, response: Response,
+                                 limit: Optional[int] = Query(None, ge=1, le=100),
+                                 cursor: Optional[str] = None):
+    """
+    Retrieves the chat sessions of a user, most recently updated first.
+    With `limit`, one page is returned and the X-Next-Cursor header holds the `cursor` of the next page.
+    """
+    after = _decode_chat_cursor(cursor) if cursor else None
+    chats = await handler.get_user_chats(user_id, limit=limit + 1 if limit else None, after=after)
+    if limit and len(chats) > limit:
+        chats = chats[:limit]
+        response.headers["X-Next-Cursor"] = _encode_chat_cursor(chats[-1])
     return chats
 
-@router.post("/", response_model=ChatMessageResponse)
-async def chat_endpoint(req: ChatRequest):
+@router.post("/", response_model=ChatMessageResponse, dependencies=[admission("chat")])
+async def chat_endpoint(req: ChatRequest, background_tasks: BackgroundTasks):
     """
     Handles a new chat message. It either uses an existing chat session or creates a new one.
     Requires a user_id for every interaction.
+    With include_destinations, the source destinations are returned as well, fetched in one query.
+    The chat's rolling summary is updated after the response is sent.
+    Concurrent requests are limited; excess ones queue fairly per user or get 429/503 with Retry-After.
     """
     # Get or create a chat session based on provided chat_id and user_id
     chat_id = await handler.get_or_create_chat_session(req.chat_id, req.user_id)
 
     try:
-        message, sources = await handler.generate_chat_response(
+        message, sources, source_ids, (user_message_key, message_key) = await handler.generate_chat_response(
             req.prompt, chat_id=chat_id, user_id=req.user_id
         )
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+    background_tasks.add_task(handler.update_summary, chat_id)
     
-    return ChatMessageResponse(message=message, sources=sources, chat_id=chat_id)
+    destinations = None
+    if req.include_destinations:
+        # Only these requests need the destinations database
+        with db_session() as db:
+            destinations = [DestinationRetrieve.model_validate(d) for d in fetch_destinations_in_order(db, source_ids)]
+
+    return ChatMessageResponse(message=message, sources=sources, chat_id=chat_id, destinations=destinations,
+                               user_message_key=user_message_key, message_key=message_key)
 
 
 @router.get("/{chat_id}", response_model=ConversationRetrieve)
-async def get_conversation(chat_id: uuid.UUID):
+async def get_conversation(chat_id: uuid.UUID,
+                           before: Optional[int] = Query(None, description="Only messages older than this cursor"),
+                           since: Optional[int] = Query(None, description="Only messages newer than this cursor"),
+                           limit: Optional[int] = Query(None, ge=1, le=200)):
     """
     Retrieves the conversation history for a specific chat ID,
     assigning the message role based on the message type.
+    Without parameters the whole conversation is returned; `limit` returns the latest page,
+    `before` pages backwards and `since` returns only the messages after a cursor.
     """
-    msgs = await handler.retrieve_history(chat_id)
-    if not msgs:
+    if before is not None and since is not None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Use either 'before' or 'since'.")
+
+    msgs, has_more = await handler.retrieve_history_page(chat_id, before=before, since=since, limit=limit)
+    paginated = before is not None or since is not None
+    if msgs is None or (not msgs and not paginated):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, 
             detail="Chat session not found or has no messages."
@@ -97,11 +155,15 @@ async def get_conversation(chat_id: uuid.UUID):
     for m in msgs:
         # Use the `m.type` attribute to determine the role
         role = m.type
+        message_id = int(m.id) if m.id is not None else None
+        key = getattr(m, "key", None)
         
         # Extract the metadata if available
         if role == "human":
             user_id = m.metadata.get("user_id")
             entry = {
+                "id": message_id,
+                "key": key,
                 "role": role, 
                 "content": m.content,
                 "user_id": user_id 
@@ -109,12 +171,22 @@ async def get_conversation(chat_id: uuid.UUID):
         else:
             sources = m.metadata.get("sources")
             entry = {
+                "id": message_id,
+                "key": key,
                 "role": role, 
                 "content": m.content,
                 "sources": sources 
             }
         history.append(entry)
-    
-    return ConversationRetrieve(chat_id=chat_id, history=history)
-
 
+    # Messages still queued for writing have no id yet; the cursors skip them, so the next `since`
+    # poll returns them again with their ids
+    ids = [entry["id"] for entry in history if entry["id"] is not None]
+    first_id = ids[0] if ids else None
+    last_id = ids[-1] if ids else None
+    # Polling with `since` only moves forward, so older pages are never offered from it
+    next_cursor = first_id if has_more and since is None else None
+    latest_cursor = last_id if last_id is not None else since
+    
+    return ConversationRetrieve(chat_id=chat_id, history=history,
+                                next_cursor=next_cursor, latest_cursor=latest_cursor)
@@ -1,11 +1,18 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, Field, field_validator
+from typing import Optional, List, Dict, Any, Literal
 import uuid
-from fastapi import APIRouter, status
+from fastapi import APIRouter, HTTPException, Query, status
 from fastapi_filter import FilterDepends
 from fastapi_filter.contrib.sqlalchemy import Filter
-from ..models import Destination
+from sqlalchemy.orm import Session
+from ..models import Destination, REGIONS, BUDGET_LEVELS, TRIP_TYPES, trip_type_masks
 from ..deps import db_dependency, user_dependency
+from ..dataset_version import get_dataset_version, bump_dataset_version
+from ..filters.filter_cache import filter_result_cache
+from ..similarity.knn_index import similarity_index
+from ..similarity.ranking import rank_destinations
+from ..search.full_text import search_destination_ids
+from ..search.autocomplete import autocomplete
 
 router = APIRouter(
     prefix='/destinations',
@@ -17,22 +24,33 @@ class DestinationBase(BaseModel):
     city: str
     country: str
     region: str
-    longitude: str
-    latitude: str
+    longitude: float
+    latitude: float
+
+
+def _check_choices(values, choices: tuple, name: str):
+    """Rejects values outside a coded column's fixed list with a 422 instead of matching nothing."""
+    for value in values if isinstance(values, list) else [values]:
+        if value is not None and value not in choices:
+            raise ValueError(f"Unknown {name} '{value}' (expected one of {', '.join(choices)})")
+    return values
 
 
 class DestinationCreate(DestinationBase):
-    pass
+    @field_validator("region")
+    @classmethod
+    def known_region(cls, value):
+        return _check_choices(value, REGIONS, "region")
 
 
 class DestinationRetrieve(DestinationBase):
     id: str
-    budget_level: str = None
-    culture: int = None
-    adventure: int = None
-    nature: int = None
-    beaches: int = None
-    nightlife: int = None
+    budget_level: Optional[str] = None
+    culture: Optional[int] = None
+    adventure: Optional[int] = None
+    nature: Optional[int] = None
+    beaches: Optional[int] = None
+    nightlife: Optional[int] = None
 
     class Config:
         from_attributes = True # <-- ENSURE THIS IS CORRECT FOR YOUR PYDANTIC VERSION
@@ -44,6 +62,77 @@ class DestinationsPresentFormat(BaseModel):
     possible_values: Dict[str, List[Any]]
 
 
+class DestinationBatchRequest(BaseModel):
+    ids: List[str] = Field(..., max_length=500, description="Destination ids, returned in this order")
+
+
+class DestinationBatchResponse(BaseModel):
+    destinations: List[DestinationRetrieve]
+    missing: List[str]
+
+
+class SimilarDestination(BaseModel):
+    destination: DestinationRetrieve
+    distance: float
+
+
+class SimilarDestinationsResponse(BaseModel):
+    destination_id: str
+    metric: str
+    similar: List[SimilarDestination]
+
+
+class ThemeWeights(BaseModel):
+    culture: float = Field(0.0, ge=-5, le=5)
+    adventure: float = Field(0.0, ge=-5, le=5)
+    nature: float = Field(0.0, ge=-5, le=5)
+    beaches: float = Field(0.0, ge=-5, le=5)
+    nightlife: float = Field(0.0, ge=-5, le=5)
+    cuisine: float = Field(0.0, ge=-5, le=5)
+    wellness: float = Field(0.0, ge=-5, le=5)
+    urban: float = Field(0.0, ge=-5, le=5)
+    seclusion: float = Field(0.0, ge=-5, le=5)
+
+
+class RankRequest(BaseModel):
+    weights: ThemeWeights = Field(default_factory=ThemeWeights, description="Importance of each theme (negative = avoid)")
+    budget_preference: Optional[Literal["Budget", "Mid-range", "Luxury"]] = None
+    budget_weight: float = Field(1.0, ge=0, le=5, description="Importance of matching the budget preference")
+    k: int = Field(20, ge=1, le=200)
+
+
+class RankedDestination(BaseModel):
+    destination: DestinationRetrieve
+    score: float
+    breakdown: Dict[str, float]
+
+
+class RankResponse(BaseModel):
+    candidates: int
+    results: List[RankedDestination]
+
+
+class SearchResult(BaseModel):
+    destination: DestinationRetrieve
+    relevance: float
+
+
+class SearchResponse(BaseModel):
+    query: str
+    results: List[SearchResult]
+
+
+class AutocompleteSuggestion(BaseModel):
+    text: str
+    kind: Literal["city", "country"]
+    destination_id: Optional[str] = None
+
+
+class AutocompleteResponse(BaseModel):
+    prefix: str
+    suggestions: List[AutocompleteSuggestion]
+
+
 class DestinationFilter(Filter):
     # Basic strings
     city: Optional[str] = Field(None, description="Filter by exact city name")
@@ -112,6 +201,8 @@ class DestinationFilter(Filter):
     seclusion__lte: Optional[int] = Field(None, description="Seclusion score ≤ this value")
     seclusion__in: Optional[list[int]] = Field(None, description="Filter by multiple seclusion scores (OR‑logic)")
 
+    trip_type__in: Optional[list[str]] = Field(None, description="Filter for any of these trip types (OR-logic)")
+
     # Trip‐duration booleans
     day_trip: Optional[bool] = Field(None, description="Filter for day trips")
     long_trip: Optional[bool] = Field(None, description="Filter for long trips")
@@ -122,21 +213,140 @@ class DestinationFilter(Filter):
     class Constants(Filter.Constants):
         model = Destination
 
+    @field_validator("region", "region__in")
+    @classmethod
+    def known_region(cls, value):
+        return _check_choices(value, REGIONS, "region")
+
+    @field_validator("budget_level", "budget_level__in")
+    @classmethod
+    def known_budget_level(cls, value):
+        return _check_choices(value, BUDGET_LEVELS, "budget_level")
+
+    @field_validator("trip_type__in")
+    @classmethod
+    def known_trip_types(cls, value):
+        return _check_choices(value, TRIP_TYPES, "trip type")
+
+    def filter(self, query):
+        if self.trip_type__in is None:
+            return super().filter(query)
+        # trip_type is not a column: one type is its flag (rare ones have a partial index),
+        # several are matched against the packed trip_types bitmask in a single indexed IN (...)
+        query = self.model_copy(update={"trip_type__in": None}).filter(query)
+        if len(set(self.trip_type__in)) == 1:
+            return query.filter(getattr(Destination, self.trip_type__in[0]) == True)  # noqa: E712
+        return query.filter(Destination.trip_types.in_(trip_type_masks(self.trip_type__in)))
+
+
+# Keeps each IN (...) below SQLite's bound-parameter limit
+ID_LOOKUP_BATCH = 500
+
+
+def fetch_destinations_in_order(db: Session, ids: List[str]) -> List[Destination]:
+    """Fetches destinations with IN lookups, in the order of `ids`. Unknown and repeated ids are dropped."""
+    ids = list(dict.fromkeys(ids))
+    found: Dict[str, Destination] = {}
+    for start in range(0, len(ids), ID_LOOKUP_BATCH):
+        batch = ids[start:start + ID_LOOKUP_BATCH]
+        found.update((d.id, d) for d in db.query(Destination).filter(Destination.id.in_(batch)))
+    return [found[destination_id] for destination_id in ids if destination_id in found]
+
+
+@router.post('/batch', response_model=DestinationBatchResponse, status_code=status.HTTP_200_OK,
+             summary="Retrieve many destinations by id in a single query, preserving the requested order")
+def get_destinations_batch(db: db_dependency, user: user_dependency, request: DestinationBatchRequest):
+    destinations = fetch_destinations_in_order(db, request.ids)
+    found = {d.id for d in destinations}
+    return DestinationBatchResponse(
+        destinations=[DestinationRetrieve.model_validate(d) for d in destinations],
+        missing=[destination_id for destination_id in dict.fromkeys(request.ids) if destination_id not in found]
+    )
+
+
+@router.get('/search', response_model=SearchResponse, status_code=status.HTTP_200_OK,
+            summary="Full-text search over city, country and description, most relevant first")
+def search_destinations(db: db_dependency, user: user_dependency,
+                        q: str = Query(..., min_length=1, max_length=200),
+                        limit: int = Query(20, ge=1, le=100)):
+    matches = search_destination_ids(db, q, limit)
+    relevance = dict(matches)
+    destinations = fetch_destinations_in_order(db, [destination_id for destination_id, _ in matches])
+    return SearchResponse(
+        query=q,
+        results=[SearchResult(destination=DestinationRetrieve.model_validate(d), relevance=relevance[d.id])
+                 for d in destinations]
+    )
+
+
+@router.get('/autocomplete', response_model=AutocompleteResponse, status_code=status.HTTP_200_OK,
+            summary="City and country names starting with a prefix")
+def autocomplete_destinations(db: db_dependency, user: user_dependency,
+                              prefix: str = Query(..., min_length=1, max_length=100),
+                              limit: int = Query(10, ge=1, le=50)):
+    suggestions = autocomplete.ensure_current(db).suggest(prefix, limit)
+    return AutocompleteResponse(
+        prefix=prefix,
+        suggestions=[AutocompleteSuggestion(text=name, kind=kind, destination_id=destination_id or None)
+                     for kind, name, destination_id in suggestions]
+    )
+
+
+@router.post('/rank', response_model=RankResponse, status_code=status.HTTP_200_OK,
+             summary="Rank the destinations passing the filters by weighted theme scores and budget preference")
+def rank_destinations_endpoint(db: db_dependency, user: user_dependency, request: RankRequest,
+                               filters: DestinationFilter = FilterDepends(DestinationFilter)):
+    index = similarity_index.ensure_current(db)
+    # Only the ids of the candidates are needed; the feature matrix lives in the index
+    candidate_ids = filter_result_cache.get_or_compute(
+        "candidate_ids", filters, index.version,
+        lambda: [row.id for row in filters.filter(db.query(Destination.id))]
+    )
+    ranked = rank_destinations(
+        index, candidate_ids, request.weights.model_dump(),
+        budget_preference=request.budget_preference, budget_weight=request.budget_weight, k=request.k
+    )
+
+    destinations = {d.id: d for d in fetch_destinations_in_order(db, [destination_id for destination_id, _, _ in ranked])}
+    return RankResponse(
+        candidates=len(candidate_ids),
+        results=[RankedDestination(destination=DestinationRetrieve.model_validate(destinations[destination_id]),
+                                   score=score, breakdown=breakdown)
+                 for destination_id, score, breakdown in ranked if destination_id in destinations]
+    )
+
+
+@router.get('/{destination_id}/similar', response_model=SimilarDestinationsResponse, status_code=status.HTTP_200_OK,
+            summary="Destinations with the most similar theme profile, budget and trip types")
+def get_similar_destinations(db: db_dependency, user: user_dependency, destination_id: str,
+                             k: int = Query(10, ge=1, le=100),
+                             metric: Literal["euclidean", "cosine"] = "euclidean",
+                             same_region: bool = False,
+                             max_budget: Optional[Literal["Budget", "Mid-range", "Luxury"]] = None):
+    neighbours = similarity_index.ensure_current(db).similar(
+        destination_id, k=k, metric=metric, same_region=same_region, max_budget=max_budget
+    )
+    if neighbours is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Destination not found")
+
+    distances = dict(neighbours)
+    destinations = fetch_destinations_in_order(db, [destination_id for destination_id, _ in neighbours])
+    return SimilarDestinationsResponse(
+        destination_id=destination_id,
+        metric=metric,
+        similar=[SimilarDestination(destination=DestinationRetrieve.model_validate(d), distance=distances[d.id])
+                 for d in destinations]
+    )
+
 
 @router.get('/{destination_id}', status_code=status.HTTP_200_OK, summary="Retrieve a single destination by its ID")
 def get_destination(db: db_dependency, user: user_dependency, destination_id: str):
     return db.query(Destination).filter(Destination.id == destination_id).first()
 
 
-@router.get('/', response_model=DestinationsPresentFormat, status_code=status.HTTP_200_OK,
-            summary="List destinations with optional filters and dynamic filter options")
-def get_destinations(db: db_dependency, user: user_dependency,
-                     filters: DestinationFilter = FilterDepends(DestinationFilter)):
-    # 1. Get ALL destinations first to extract unique values for filters
-    all_destinations_query = db.query(Destination)
-    all_destinations = all_destinations_query.all()
-
-    # 2. Extract unique values for each feature and store in a dictionary
+def collect_possible_values(db: Session) -> Dict[str, List[Any]]:
+    """Extracts the unique values of each feature across ALL destinations."""
+    all_destinations = db.query(Destination).all()
     possible_values_dict: Dict[str, List[Any]] = {}
 
     def collect_unique(attribute_name):
@@ -169,11 +379,28 @@ def get_destinations(db: db_dependency, user: user_dependency,
         if d.weekend: unique_trip_types.add("weekend")
     possible_values_dict["trip_type"] = sorted(list(unique_trip_types))
 
-    # 3. Apply filters to the destinations AND EXECUTE THE QUERY
-    destinations_query = db.query(Destination)
-    filtered_destinations = filters.filter(destinations_query).all() # <--- ADD .all() HERE
+    return possible_values_dict
+
+
+@router.get('/', response_model=DestinationsPresentFormat, status_code=status.HTTP_200_OK,
+            summary="List destinations with optional filters and dynamic filter options")
+def get_destinations(db: db_dependency, user: user_dependency,
+                     filters: DestinationFilter = FilterDepends(DestinationFilter)):
+    # Results are cached per catalogue version, so any create/delete/load invalidates them
+    dataset_version = get_dataset_version(db)
+
+    # 1. Unique values for each feature don't depend on the filters - one entry per version
+    possible_values_dict = filter_result_cache.get_or_compute(
+        "possible_values", None, dataset_version, lambda: collect_possible_values(db)
+    )
+
+    # 2. Apply filters to the destinations, keyed on the canonical form of the filters
+    filtered_destinations = filter_result_cache.get_or_compute(
+        "destinations", filters, dataset_version,
+        lambda: [DestinationRetrieve.model_validate(d) for d in filters.filter(db.query(Destination)).all()]
+    )
 
-    # 4. Return the filtered destinations and the possible filter values dictionary
+    # 3. Return the filtered destinations and the possible filter values dictionary
     return DestinationsPresentFormat(
         destinations=filtered_destinations,
         possible_values=possible_values_dict
@@ -184,8 +411,11 @@ def get_destinations(db: db_dependency, user: user_dependency,
 def create_destination(db: db_dependency, user: user_dependency, destination: DestinationCreate):
     db_destination = Destination(**destination.model_dump(), id=str(uuid.uuid4()))
     db.add(db_destination)
+    version = bump_dataset_version(db)
     db.commit()
     db.refresh(db_destination)
+    similarity_index.add(db_destination, version)
+    autocomplete.add(db_destination, version)
     return db_destination
 
 
@@ -194,5 +424,8 @@ def delete_destination(db: db_dependency, user: user_dependency, destination_id:
     db_destination = db.query(Destination).filter(Destination.id == destination_id).first()
     if db_destination:
         db.delete(db_destination)
+        version = bump_dataset_version(db)
         db.commit()
+        similarity_index.remove(destination_id, version)
+        autocomplete.remove(db_destination, version)
     return db_destination
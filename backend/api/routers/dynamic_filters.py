@@ -5,7 +5,12 @@ from fastapi_filter import FilterDepends
 from .destinations import DestinationFilter
 from ..models import Destination
 from ..deps import db_dependency, user_dependency
+from ..admission import admission
 from ..filters.dynamic_filter_generator import DynamicFilterGenerator
+from ..filters.filter_cache import filter_result_cache, canonical_filter_key
+from ..dataset_version import get_dataset_version
+from ..metrics import stage
+from ..snapshot import destination_snapshot
 
 router = APIRouter(
     prefix='/dynamic_filters',
@@ -21,12 +26,28 @@ class DynamicFilterRetrieve(BaseModel):
 
 
 @router.get('/', response_model=list[DynamicFilterRetrieve], status_code=status.HTTP_200_OK,
-            summary="List of dynamically generated filters")
+            summary="List of dynamically generated filters", dependencies=[admission("dynamic_filters")])
 def get_dynamic_filters_for_destinations(db: db_dependency, user: user_dependency,
                                          filters: DestinationFilter = FilterDepends(DestinationFilter)):
-    all_destinations = db.query(Destination)
-    selected_destinations = filters.filter(all_destinations)
-    dynamic_filter_generator = DynamicFilterGenerator()
-    dynamic_filters = dynamic_filter_generator.generate_dynamic_filters(selected_destinations)
+    version = get_dataset_version(db)
+
+    def generate():
+        dynamic_filter_generator = DynamicFilterGenerator()
+        snapshot = destination_snapshot.current(version)
+        if snapshot is not None:
+            # Only the matching ids come from the database; the columns are read from the shared snapshot
+            if canonical_filter_key(filters):
+                with stage("dynamic_filters", "query"):
+                    ids = [row[0] for row in filters.filter(db.query(Destination.id))]
+                rows = snapshot.rows_of(ids)
+            else:
+                rows = slice(None)
+            return dynamic_filter_generator.generate_dynamic_filters_from_snapshot(snapshot, rows)
+        all_destinations = db.query(Destination)
+        selected_destinations = filters.filter(all_destinations)
+        return dynamic_filter_generator.generate_dynamic_filters(selected_destinations)
+
+    # The conversion, entropy and LLM pipeline only re-runs for unseen filter combinations
+    dynamic_filters = filter_result_cache.get_or_compute("dynamic_filters", filters, version, generate)
 
     return dynamic_filters
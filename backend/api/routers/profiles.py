@@ -0,0 +1,72 @@
+from typing import Annotated, List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import FileResponse, PlainTextResponse
+from pydantic import BaseModel
+from ..profiling import profile_store, valid_token
+from .. import profiling
+
+
+def require_profiling_token(x_profile: Annotated[Optional[str], Header()] = None,
+                            profile: Optional[str] = Query(None, description="Profiling token")):
+    if not valid_token(x_profile or profile):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid profiling token.")
+
+
+router = APIRouter(
+    prefix='/profiles',
+    tags=['profiles'],
+    dependencies=[Depends(require_profiling_token)]
+)
+
+
+class ProfileRetrieve(BaseModel):
+    id: str
+    mode: str
+    method: str
+    path: str
+    route: Optional[str] = None
+    created_at: float
+    duration_seconds: float
+
+
+@router.get('/', response_model=List[ProfileRetrieve])
+def list_profiles():
+    """Stored request profiles, newest first."""
+    return profile_store.list()
+
+
+@router.get('/continuous', response_class=PlainTextResponse)
+def get_continuous_profile(reset: bool = False):
+    """
+    Busy stacks aggregated by the continuous sampler, as collapsed stacks (`frame;frame;frame count`),
+    ready for flamegraph.pl or speedscope. `reset` starts a new aggregation window.
+    """
+    sampler = profiling.continuous_sampler
+    if sampler is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="The continuous sampler is off; set PROFILE_CONTINUOUS_INTERVAL.")
+    folded = sampler.folded()
+    if reset:
+        sampler.reset()
+    return PlainTextResponse(folded)
+
+
+def _get_profile(profile_id: str) -> dict:
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found.")
+    return profile
+
+
+@router.get('/{profile_id}')
+def download_profile(profile_id: str):
+    """The raw artifact: a .pstats file (cprofile mode) or collapsed stacks (sample mode)."""
+    profile = _get_profile(profile_id)
+    path = profile_store.artifact_path(profile_id, profile["mode"])
+    return FileResponse(path, filename=path.rsplit("/", 1)[-1], media_type="application/octet-stream")
+
+
+@router.get('/{profile_id}/summary', response_class=PlainTextResponse)
+def profile_summary(profile_id: str, limit: int = Query(40, ge=1, le=500)):
+    """Top functions: cumulative time for cProfile profiles, samples per running function otherwise."""
+    return PlainTextResponse(profile_store.summary(_get_profile(profile_id), limit))
@@ -0,0 +1,169 @@
+"""
+Migrates the destinations table to the compact, indexed layout of `models.Destination` and shows
+how SQLite plans the common destination filters.
+
+The first layout stored coordinates as text, region and budget level as free text, and had no index
+besides the primary key, so every filter scanned the whole table. SQLite cannot change column types
+in place, so the table is rebuilt in a single transaction: renamed, copied into the new layout
+(keeping rowids, so the full-text index stays valid), dropped, and the indexes created. ANALYZE then
+gives the query planner the statistics it needs to choose between the indexes.
+
+Usage (from the repository root):
+    python -m backend.api.schema_migration           # migrate if needed, print the query plans
+    python -m backend.api.schema_migration --check   # exit 1 if a common filter scans the table
+"""
+import argparse
+import sys
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex, CreateTable
+from .database import Base, SessionLocal, engine as default_engine
+from .models import Destination, BUDGET_LEVELS, REGIONS, THEMES, TRIP_TYPES
+from .search.full_text import ensure_full_text_index
+
+# Filter combinations sent by the frontend (every facet as `<feature>__in`, dynamic filter picks as a
+# single value) and by the load benchmark; each one should be answered from an index
+COMMON_FILTERS = [
+    {"region__in": ["europe", "asia"]},
+    {"country__in": ["Italy", "Fiji"]},
+    {"city": "Milan"},
+    {"budget_level__in": ["Luxury"]},
+    {"region": "europe", "budget_level": "Luxury"},
+    {"budget_level__in": ["Budget", "Mid-range"], "beaches__gte": 4},
+    {"culture__gte": 4, "cuisine__gte": 4},
+    {"region": "oceania", "beaches__in": [4, 5]},
+    {"nightlife__lte": 2, "seclusion__gte": 4},
+    {"weekend": True, "region__in": ["europe"]},
+    {"day_trip": True},
+    {"long_trip": True, "region__in": ["asia", "oceania"]},
+    {"trip_type__in": ["day_trip"]},
+    {"trip_type__in": ["day_trip", "long_trip"], "region": "europe"},
+    *({f"{theme}__in": [5]} for theme in THEMES),
+]
+
+
+def is_current(engine: Engine) -> bool:
+    """Whether the destinations table is in the current layout (or doesn't exist yet)."""
+    inspector = inspect(engine)
+    if not inspector.has_table(Destination.__tablename__):
+        return True
+    return "trip_types" in {column["name"] for column in inspector.get_columns(Destination.__tablename__)}
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _coded(column: str, values: tuple) -> str:
+    cases = " ".join(f"WHEN {_quote(value)} THEN {code}" for code, value in enumerate(values))
+    return f"CASE {column} {cases} END"
+
+
+def _copy_expressions() -> dict[str, str]:
+    """SQL turning a row of the old layout into each column of the new one."""
+    expressions = {column.name: column.name for column in Destination.__table__.columns}
+    expressions["region"] = _coded("region", REGIONS)
+    expressions["budget_level"] = _coded("budget_level", BUDGET_LEVELS)
+    for column in ("latitude", "longitude"):
+        expressions[column] = f"CAST(NULLIF(TRIM({column}), '') AS REAL)"
+    expressions["trip_types"] = " + ".join(f"COALESCE({trip_type}, 0) * {1 << bit}"
+                                           for bit, trip_type in enumerate(TRIP_TYPES))
+    return expressions
+
+
+def migrate_destinations(engine: Engine = default_engine) -> bool:
+    """Rebuilds the destinations table in the current layout if it is in the old one; returns whether it did."""
+    if is_current(engine):
+        return False
+    if engine.dialect.name != "sqlite":
+        raise RuntimeError("Only SQLite destinations tables can be migrated in place; load the CSV into a new database.")
+
+    table = Destination.__table__
+    old_name = f"{table.name}_old"
+    expressions = _copy_expressions()
+    old_indexes = [index["name"] for index in inspect(engine).get_indexes(table.name)]
+
+    print("Migrating the destinations table to the compact layout...")
+    with engine.connect() as connection:
+        for column, values in (("region", REGIONS), ("budget_level", BUDGET_LEVELS)):
+            unknown = [row[0] for row in connection.exec_driver_sql(
+                f"SELECT DISTINCT {column} FROM {table.name} "
+                f"WHERE {column} IS NOT NULL AND {column} NOT IN ({', '.join(map(_quote, values))})")]
+            if unknown:
+                raise ValueError(f"Unknown {column} values {unknown}; add them to models.{column.upper()}S first.")
+
+        # pysqlite leaves DDL outside transactions unless one is opened explicitly
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+        for name in old_indexes:
+            connection.exec_driver_sql(f'DROP INDEX "{name}"')
+        connection.exec_driver_sql(f"ALTER TABLE {table.name} RENAME TO {old_name}")
+        connection.exec_driver_sql(str(CreateTable(table).compile(dialect=engine.dialect)))
+        connection.exec_driver_sql(
+            f"INSERT INTO {table.name} (rowid, {', '.join(expressions)}) "
+            f"SELECT rowid, {', '.join(expressions.values())} FROM {old_name}")
+        # Also drops the old full-text triggers, which are recreated on the new table below
+        connection.exec_driver_sql(f"DROP TABLE {old_name}")
+        for index in table.indexes:
+            connection.exec_driver_sql(str(CreateIndex(index).compile(dialect=engine.dialect)))
+        connection.commit()
+
+    ensure_full_text_index(engine)
+    analyze(engine)
+    print("✓ Migrated the destinations table")
+    return True
+
+
+def analyze(engine: Engine = default_engine):
+    """Refreshes the planner statistics, e.g. after a bulk load."""
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as connection:
+            connection.exec_driver_sql(f"ANALYZE {Destination.__tablename__}")
+            connection.commit()
+
+
+def query_plan(db: Session, params: dict) -> list[str]:
+    """SQLite's plan for the /destinations/ query with the given filters."""
+    from .routers.destinations import DestinationFilter
+    statement = DestinationFilter(**params).filter(db.query(Destination.id)).statement
+    sql = statement.compile(dialect=db.get_bind().dialect, compile_kwargs={"literal_binds": True})
+    return [row[-1] for row in db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+def uses_index(plan: list[str]) -> bool:
+    """False if any step reads the whole destinations table rather than an index."""
+    return not any(step.startswith(f"SCAN {Destination.__tablename__}") and " USING " not in step for step in plan)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="Exit 1 if a common filter is not served by an index")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=default_engine)
+    if not migrate_destinations(default_engine):
+        print("✓ The destinations table is already in the current layout")
+
+    scans = 0
+    db = SessionLocal()
+    try:
+        for params in COMMON_FILTERS:
+            plan = query_plan(db, params)
+            indexed = uses_index(plan)
+            scans += not indexed
+            print(f"{'✓' if indexed else '❌'} {params}")
+            for step in plan:
+                print(f"      {step}")
+    finally:
+        db.close()
+
+    if scans:
+        print(f"❌ {scans} of {len(COMMON_FILTERS)} common filters scan the destinations table")
+        if args.check:
+            sys.exit(1)
+    else:
+        print(f"✅ All {len(COMMON_FILTERS)} common filters use an index")
+
+
+if __name__ == "__main__":
+    main()
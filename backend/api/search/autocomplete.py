@@ -0,0 +1,101 @@
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Optional
+from sqlalchemy.orm import Session
+from ..models import Destination
+from ..dataset_version import get_dataset_version
+
+# Changes made by other workers or the data loader are picked up within this many seconds;
+# changes made through this worker are applied immediately
+VERSION_CHECK_SECONDS = 1.0
+
+
+def normalize(text: str) -> str:
+    """Case- and accent-insensitive form used for prefix matching ("Zürich" -> "zurich")."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).strip()
+
+
+class Autocomplete:
+    """
+    Prefix lookups over city and country names, as a sorted list of
+    (normalized name, kind, display name, destination id) entries searched with bisect.
+    Countries appear once, with no destination id.
+    """
+
+    def __init__(self):
+        self.entries: list[tuple[str, str, str, str]] = []
+        self.country_counts: dict[str, int] = {}
+        self.version: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def ensure_current(self, db: Session) -> "Autocomplete":
+        now = time.monotonic()
+        if self.version is not None and now - self._checked_at < VERSION_CHECK_SECONDS:
+            return self
+        version = get_dataset_version(db)
+        self._checked_at = now
+        if version != self.version:
+            self.build(db, version)
+        return self
+
+    def build(self, db: Session, version: int):
+        rows = db.query(Destination.id, Destination.city, Destination.country).all()
+        entries = [(normalize(row.city), "city", row.city, row.id) for row in rows]
+        country_counts: dict[str, int] = {}
+        for row in rows:
+            country_counts[row.country] = country_counts.get(row.country, 0) + 1
+        entries.extend((normalize(country), "country", country, "") for country in country_counts)
+        entries.sort()
+        with self._lock:
+            self.entries, self.country_counts, self.version = entries, country_counts, version
+
+    def add(self, destination: Destination, version: int):
+        """Applies a create made in this worker; `version` is the catalogue version it produced."""
+        with self._lock:
+            if self.version is None or version != self.version + 1:
+                return  # Not built yet, or changes from elsewhere: the next version check rebuilds
+            insort(self.entries, (normalize(destination.city), "city", destination.city, destination.id))
+            if destination.country not in self.country_counts:
+                insort(self.entries, (normalize(destination.country), "country", destination.country, ""))
+            self.country_counts[destination.country] = self.country_counts.get(destination.country, 0) + 1
+            self.version = version
+
+    def remove(self, destination: Destination, version: int):
+        """Applies a delete made in this worker."""
+        with self._lock:
+            if self.version is None or version != self.version + 1:
+                return
+            self._discard((normalize(destination.city), "city", destination.city, destination.id))
+            remaining = self.country_counts.get(destination.country, 0) - 1
+            if remaining <= 0:
+                self.country_counts.pop(destination.country, None)
+                self._discard((normalize(destination.country), "country", destination.country, ""))
+            else:
+                self.country_counts[destination.country] = remaining
+            self.version = version
+
+    def _discard(self, entry: tuple):
+        position = bisect_left(self.entries, entry)
+        if position < len(self.entries) and self.entries[position] == entry:
+            del self.entries[position]
+
+    def suggest(self, prefix: str, limit: int = 10) -> list[tuple[str, str, str]]:
+        """Returns up to `limit` (kind, name, destination id) entries whose name starts with `prefix`."""
+        key = normalize(prefix)
+        suggestions = []
+        with self._lock:
+            position = bisect_left(self.entries, (key,))
+            while position < len(self.entries) and len(suggestions) < limit:
+                name, kind, display, destination_id = self.entries[position]
+                if not name.startswith(key):
+                    break
+                suggestions.append((kind, display, destination_id))
+                position += 1
+        return suggestions
+
+
+autocomplete = Autocomplete()
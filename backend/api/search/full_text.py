@@ -0,0 +1,116 @@
+import re
+from sqlalchemy import or_, case, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from ..models import Destination
+
+FTS_TABLE = "destinations_fts"
+# bm25 weights of the indexed columns: a hit in the city name counts most
+COLUMN_WEIGHTS = (10.0, 5.0, 1.0)
+
+# External-content FTS5 table over the destinations, kept in sync by triggers,
+# so bulk loads, API creates/deletes and manual edits are all indexed
+FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        city, country, short_description,
+        content='destinations', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS destinations_fts_insert AFTER INSERT ON destinations BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, city, country, short_description)
+        VALUES (new.rowid, new.city, new.country, new.short_description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS destinations_fts_delete AFTER DELETE ON destinations BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, city, country, short_description)
+        VALUES ('delete', old.rowid, old.city, old.country, old.short_description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS destinations_fts_update AFTER UPDATE ON destinations BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, city, country, short_description)
+        VALUES ('delete', old.rowid, old.city, old.country, old.short_description);
+        INSERT INTO {FTS_TABLE}(rowid, city, country, short_description)
+        VALUES (new.rowid, new.city, new.country, new.short_description);
+    END""",
+]
+
+_fts_available = {}
+
+
+def ensure_full_text_index(engine: Engine) -> bool:
+    """
+    Creates the FTS5 table and its triggers if needed (indexing the existing rows on creation).
+    Returns False when the database is not SQLite or SQLite lacks FTS5; search then falls back to LIKE.
+    """
+    if engine.dialect.name != "sqlite":
+        _fts_available[engine.url] = False
+        return False
+    try:
+        with engine.begin() as connection:
+            exists = connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE}
+            ).first()
+            for statement in FTS_DDL:
+                connection.execute(text(statement))
+            if not exists:
+                connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        _fts_available[engine.url] = True
+    except OperationalError as e:
+        print(f"⚠️ SQLite full-text search unavailable, falling back to LIKE: {e}")
+        _fts_available[engine.url] = False
+    return _fts_available[engine.url]
+
+
+def _match_expression(query: str, any_terms: bool = False) -> str:
+    """
+    Turns free text into an FTS5 query: every word must match, the last one as a prefix (as you type).
+    With `any_terms`, any word may match and bm25 ranks the rows matching more of them first.
+    """
+    words = re.findall(r"\w+", query)
+    terms = ['"' + word.replace('"', '""') + '"' for word in words]
+    if any_terms:
+        return " OR ".join(terms)
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_destination_ids(db: Session, query: str, limit: int = 20,
+                           any_terms: bool = False) -> list[tuple[str, float]]:
+    """
+    Returns (id, relevance) pairs for `query`, most relevant first (higher relevance is better).
+    By default every word must match; `any_terms` ranks partial matches too (see _match_expression).
+    """
+    bind = db.get_bind()
+    if _fts_available.get(bind.url) is None:
+        ensure_full_text_index(bind)
+
+    if _fts_available[bind.url]:
+        match = _match_expression(query, any_terms)
+        if not match:
+            return []
+        rows = db.execute(text(f"""
+            SELECT d.id, bm25({FTS_TABLE}, {', '.join(map(str, COLUMN_WEIGHTS))}) AS rank
+            FROM {FTS_TABLE} JOIN destinations d ON d.rowid = {FTS_TABLE}.rowid
+            WHERE {FTS_TABLE} MATCH :match
+            ORDER BY rank LIMIT :limit
+        """), {"match": match, "limit": limit})
+        # bm25() is lower-is-better and negative; flip it so clients can read it as a score
+        return [(row.id, -row.rank) for row in rows]
+
+    return _search_like(db, query, limit, any_terms)
+
+
+def _search_like(db: Session, query: str, limit: int, any_terms: bool = False) -> list[tuple[str, float]]:
+    patterns = [f"%{word}%" for word in re.findall(r"\w+", query)] if any_terms else [f"%{query.strip()}%"]
+    if not patterns:
+        return []
+    relevance = case(
+        (or_(*(Destination.city.ilike(pattern) for pattern in patterns)), COLUMN_WEIGHTS[0]),
+        (or_(*(Destination.country.ilike(pattern) for pattern in patterns)), COLUMN_WEIGHTS[1]),
+        else_=COLUMN_WEIGHTS[2],
+    )
+    rows = (db.query(Destination.id, relevance.label("relevance"))
+            .filter(or_(*(column.ilike(pattern) for pattern in patterns
+                          for column in (Destination.city, Destination.country, Destination.short_description))))
+            .order_by(relevance.desc(), Destination.city)
+            .limit(limit))
+    return [(row.id, float(row.relevance)) for row in rows]
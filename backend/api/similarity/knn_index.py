@@ -0,0 +1,319 @@
+import os
+import threading
+from typing import Optional
+import numpy as np
+from sqlalchemy.orm import Session
+from ..models import Destination
+from ..dataset_version import get_dataset_version
+from ..snapshot import destination_snapshot
+
+SCORE_COLUMNS = ["culture", "adventure", "nature", "beaches", "nightlife", "cuisine", "wellness", "urban", "seclusion"]
+TRIP_COLUMNS = ["day_trip", "long_trip", "one_week", "short_trip", "weekend"]
+BUDGET_ORDER = {"Budget": 0, "Mid-range": 1, "Luxury": 2}
+METRICS = ("euclidean", "cosine")
+
+# Relative weight of the feature groups in the vector (the theme profile dominates)
+BUDGET_WEIGHT = 1.0
+TRIP_WEIGHT = 0.5
+
+# Neighbours kept per destination and metric; constrained or larger queries fall back to a scan
+NEIGHBOURS = int(os.getenv("SIMILARITY_NEIGHBOURS", "50"))
+# Memory for one block of the block × n distance matrix; the block size follows from it and n
+BLOCK_BYTES = int(os.getenv("SIMILARITY_BLOCK_BYTES", str(256 * 1024 * 1024)))
+# Per distance: the float32 distance and the int64 position argpartition returns for it
+BYTES_PER_DISTANCE = 4 + 8
+# Compact the arrays once this share of rows has been deleted
+MAX_TOMBSTONE_RATIO = 0.25
+
+
+def feature_vectors(rows) -> np.ndarray:
+    """
+    Normalized feature vectors: theme scores scaled from 1-5 to 0-1, budget level to 0-1 and
+    the trip flags as 0/1, weighted. Missing values take the middle of their range.
+    """
+    scores = np.array([[r[c] if r[c] is not None else 3 for c in SCORE_COLUMNS] for r in rows],
+                      dtype=np.float32).reshape(len(rows), len(SCORE_COLUMNS))
+    budget = np.array([BUDGET_ORDER.get(r["budget_level"], 1) for r in rows], dtype=np.float32)
+    trips = np.array([[bool(r[c]) for c in TRIP_COLUMNS] for r in rows],
+                     dtype=np.float32).reshape(len(rows), len(TRIP_COLUMNS))
+    return _weighted(scores, budget, trips)
+
+
+def _weighted(scores: np.ndarray, budget: np.ndarray, trips: np.ndarray) -> np.ndarray:
+    return np.hstack([(scores - 1) / 4, (budget / 2 * BUDGET_WEIGHT)[:, None], trips * TRIP_WEIGHT])
+
+
+def block_rows(n: int) -> int:
+    """Query rows per block so that a block's distances to `n` rows fit in BLOCK_BYTES."""
+    return max(1, BLOCK_BYTES // (max(n, 1) * BYTES_PER_DISTANCE))
+
+
+class SimilarityIndex:
+    """
+    Precomputed k-nearest-neighbour lists over destination feature vectors.
+
+    Neighbours are computed block by block with matrix products and `argpartition`, so the
+    build is vectorized and its working memory stays within BLOCK_BYTES at any n. The lists are stored as
+    int32 row numbers and float32 distances, computed per metric on first use (the feature
+    matrix alone also serves preference ranking). Creates and deletes in this worker update
+    the lists incrementally; a catalogue version we did not apply ourselves triggers a rebuild.
+    """
+
+    def __init__(self, neighbours: int = NEIGHBOURS):
+        self.neighbours = neighbours
+        self.version: Optional[int] = None
+        self._lock = threading.RLock()
+        self._reset()
+
+    @property
+    def lock(self) -> threading.RLock:
+        """Held by updates; readers outside this class take it so the arrays and row_of are consistent."""
+        return self._lock
+
+    def _reset(self):
+        self.ids: list[str] = []
+        self.row_of: dict[str, int] = {}
+        self.vectors = np.zeros((0, len(SCORE_COLUMNS) + 1 + len(TRIP_COLUMNS)), dtype=np.float32)
+        self.unit_vectors = self.vectors.copy()
+        self.regions: list[str] = []
+        self.region_codes = np.zeros(0, dtype=np.int16)
+        self.budget_codes = np.zeros(0, dtype=np.int8)
+        self.alive = np.zeros(0, dtype=bool)
+        # metric -> neighbour lists, only for the metrics queried so far
+        self.neighbour_rows: dict[str, np.ndarray] = {}
+        self.neighbour_distances: dict[str, np.ndarray] = {}
+
+    # --- Building ---
+
+    def ensure_current(self, db: Session) -> "SimilarityIndex":
+        """Rebuilds the index if the catalogue changed since it was built or last updated."""
+        version = get_dataset_version(db)
+        if self.version != version:
+            with self._lock:
+                if self.version != version:
+                    self.build(db, version)
+        return self
+
+    def build(self, db: Session, version: int):
+        snapshot = destination_snapshot.current(version)
+        if snapshot is not None:
+            with self._lock:
+                self._reset()
+                self._load_snapshot(snapshot)
+                self.version = version
+            print(f"✓ Loaded {len(self.ids)} destination feature vectors from the snapshot (version {version})")
+            return
+        columns = [Destination.id, Destination.region, Destination.budget_level] + \
+                  [getattr(Destination, c) for c in SCORE_COLUMNS + TRIP_COLUMNS]
+        rows = [row._mapping for row in db.query(*columns)]
+        with self._lock:
+            self._reset()
+            self._append(rows)
+            self.version = version
+        print(f"✓ Loaded {len(self.ids)} destination feature vectors (version {version})")
+
+    def _load_snapshot(self, snapshot):
+        """Builds the feature matrix from the snapshot's code columns, without per-row Python work."""
+        scores = snapshot.column("scores").astype(np.float32)
+        scores[scores < 0] = 3
+        # Snapshot budget code -> BUDGET_ORDER code; the extra last entry maps missing values (-1)
+        budget_map = np.array([BUDGET_ORDER.get(b, -1) for b in snapshot.dictionaries["budget_level"]] + [-1],
+                              dtype=np.int8)
+        self.budget_codes = budget_map[snapshot.column("budget_level")]
+        budget = np.where(self.budget_codes < 0, 1, self.budget_codes).astype(np.float32)
+        trips = (snapshot.column("trips") == 1).astype(np.float32)
+
+        self.vectors = _weighted(scores, budget, trips)
+        norms = np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        self.unit_vectors = self.vectors / np.where(norms > 0, norms, 1)
+        self.ids = [i.decode() for i in snapshot.ids.tolist()]
+        self.row_of = {destination_id: row for row, destination_id in enumerate(self.ids)}
+        self.regions = list(snapshot.dictionaries["region"])
+        self.region_codes = np.array(snapshot.column("region"), dtype=np.int16)
+        self.alive = np.ones(len(self.ids), dtype=bool)
+
+    def _neighbour_lists(self, metric: str) -> tuple[np.ndarray, np.ndarray]:
+        if metric not in self.neighbour_rows:
+            self.neighbour_rows[metric], self.neighbour_distances[metric] = self._knn(
+                np.arange(len(self.ids)), metric)
+            print(f"✓ Built {metric} neighbour lists for {len(self.row_of)} destinations")
+        return self.neighbour_rows[metric], self.neighbour_distances[metric]
+
+    def _append(self, rows):
+        vectors = feature_vectors(rows)
+        for row in rows:
+            self.row_of[row["id"]] = len(self.ids)
+            self.ids.append(row["id"])
+        self.vectors = np.vstack([self.vectors, vectors])
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.unit_vectors = np.vstack([self.unit_vectors, vectors / np.where(norms > 0, norms, 1)])
+
+        region_index = {region: i for i, region in enumerate(self.regions)}
+        codes = []
+        for row in rows:
+            if row["region"] not in region_index:
+                region_index[row["region"]] = len(self.regions)
+                self.regions.append(row["region"])
+            codes.append(region_index[row["region"]])
+        self.region_codes = np.concatenate([self.region_codes, np.array(codes, dtype=np.int16)])
+        self.budget_codes = np.concatenate([self.budget_codes, np.array(
+            [BUDGET_ORDER.get(row["budget_level"], -1) for row in rows], dtype=np.int8)])
+        self.alive = np.concatenate([self.alive, np.ones(len(rows), dtype=bool)])
+
+    def _distances(self, query_rows: np.ndarray, metric: str) -> np.ndarray:
+        """Distances from the given rows to every row (deleted rows at +inf)."""
+        # Computed in place, so a block needs a single len(query_rows) × n matrix
+        if metric == "cosine":
+            distances = self.unit_vectors[query_rows] @ self.unit_vectors.T
+            np.subtract(1.0, distances, out=distances)
+        else:
+            queries = self.vectors[query_rows]
+            distances = queries @ self.vectors.T
+            distances *= -2.0
+            distances += np.einsum("ij,ij->i", queries, queries)[:, None]
+            distances += np.einsum("ij,ij->i", self.vectors, self.vectors)[None, :]
+            np.maximum(distances, 0.0, out=distances)
+            np.sqrt(distances, out=distances)
+        distances[:, ~self.alive] = np.inf
+        distances[np.arange(len(query_rows)), query_rows] = np.inf
+        return distances
+
+    def _knn(self, query_rows: np.ndarray, metric: str) -> tuple[np.ndarray, np.ndarray]:
+        """Top-`neighbours` rows and distances for each query row, computed in blocks."""
+        k = self.neighbours
+        rows_out = np.full((len(query_rows), k), -1, dtype=np.int32)
+        distances_out = np.full((len(query_rows), k), np.inf, dtype=np.float32)
+        available = min(k, len(self.ids) - 1)
+        if available <= 0:
+            return rows_out, distances_out
+
+        block_size = block_rows(len(self.ids))
+        for start in range(0, len(query_rows), block_size):
+            block = query_rows[start:start + block_size]
+            distances = self._distances(block, metric)
+            top = np.argpartition(distances, available - 1, axis=1)[:, :available]
+            top_distances = np.take_along_axis(distances, top, axis=1)
+            order = np.argsort(top_distances, axis=1, kind="stable")
+            rows_out[start:start + len(block), :available] = np.take_along_axis(top, order, axis=1)
+            distances_out[start:start + len(block), :available] = np.take_along_axis(top_distances, order, axis=1)
+            # Freed before the next block is computed, so only one block's matrices are alive at a time
+            del distances, top
+        rows_out[~np.isfinite(distances_out)] = -1
+        return rows_out, distances_out
+
+    # --- Incremental updates ---
+
+    def add(self, destination: Destination, version: int):
+        """Adds a destination created in this worker; `version` is the catalogue version it produced."""
+        with self._lock:
+            if self.version is None or version != self.version + 1:
+                return  # Not built yet, or changes from elsewhere: the next request rebuilds
+            row = {c: getattr(destination, c) for c in ["id", "region", "budget_level"] + SCORE_COLUMNS + TRIP_COLUMNS}
+            self._append([row])
+            new_row = len(self.ids) - 1
+            for metric in list(self.neighbour_rows):
+                rows, distances = self._knn(np.array([new_row]), metric)
+                self.neighbour_rows[metric] = np.vstack([self.neighbour_rows[metric], rows])
+                self.neighbour_distances[metric] = np.vstack([self.neighbour_distances[metric], distances])
+                self._insert_neighbour(new_row, metric)
+            self.version = version
+
+    def _insert_neighbour(self, new_row: int, metric: str):
+        """Adds `new_row` to the lists of the rows it is now closer to than their current last neighbour."""
+        distance_to_new = self._distances(np.array([new_row]), metric)[0]
+        neighbour_rows, neighbour_distances = self.neighbour_rows[metric], self.neighbour_distances[metric]
+        affected = np.flatnonzero(distance_to_new < neighbour_distances[:, -1])
+        for row in affected:
+            position = np.searchsorted(neighbour_distances[row], distance_to_new[row], side="right")
+            neighbour_rows[row, position + 1:] = neighbour_rows[row, position:-1].copy()
+            neighbour_distances[row, position + 1:] = neighbour_distances[row, position:-1].copy()
+            neighbour_rows[row, position] = new_row
+            neighbour_distances[row, position] = distance_to_new[row]
+
+    def remove(self, destination_id: str, version: int):
+        """Removes a destination deleted in this worker; rows that listed it get their lists recomputed."""
+        with self._lock:
+            if self.version is None or version != self.version + 1:
+                return
+            row = self.row_of.pop(destination_id, None)
+            if row is not None:
+                self.alive[row] = False
+                if 1 - self.alive.mean() > MAX_TOMBSTONE_RATIO:
+                    self._compact()
+                else:
+                    for metric in list(self.neighbour_rows):
+                        affected = np.flatnonzero((self.neighbour_rows[metric] == row).any(axis=1) & self.alive)
+                        if len(affected):
+                            rows, distances = self._knn(affected, metric)
+                            self.neighbour_rows[metric][affected] = rows
+                            self.neighbour_distances[metric][affected] = distances
+                        self.neighbour_rows[metric][row] = -1
+                        self.neighbour_distances[metric][row] = np.inf
+            self.version = version
+
+    def _compact(self):
+        keep = np.flatnonzero(self.alive)
+        remap = np.full(len(self.ids), -1, dtype=np.int32)
+        remap[keep] = np.arange(len(keep), dtype=np.int32)
+        self.ids = [self.ids[i] for i in keep]
+        self.row_of = {destination_id: i for i, destination_id in enumerate(self.ids)}
+        self.vectors, self.unit_vectors = self.vectors[keep], self.unit_vectors[keep]
+        self.region_codes, self.budget_codes = self.region_codes[keep], self.budget_codes[keep]
+        self.alive = self.alive[keep]
+        for metric in list(self.neighbour_rows):
+            self.neighbour_rows[metric], self.neighbour_distances[metric] = self._knn(np.arange(len(keep)), metric)
+
+    # --- Queries ---
+
+    def similar(self, destination_id: str, k: int = 10, metric: str = "euclidean", same_region: bool = False,
+                max_budget: Optional[str] = None) -> Optional[list[tuple[str, float]]]:
+        """
+        Returns up to `k` (id, distance) pairs, nearest first, or None if the destination is unknown.
+        Constraints are applied to the precomputed list; when it runs short, the rows are scanned.
+        """
+        with self._lock:
+            row = self.row_of.get(destination_id)
+            if row is None:
+                return None
+            allowed = None
+            if same_region or max_budget is not None:
+                allowed = self.alive.copy()
+                if same_region:
+                    allowed &= self.region_codes == self.region_codes[row]
+                if max_budget is not None:
+                    allowed &= (self.budget_codes >= 0) & (self.budget_codes <= BUDGET_ORDER[max_budget])
+
+            neighbour_rows, neighbour_distances = self._neighbour_lists(metric)
+            rows, distances = neighbour_rows[row], neighbour_distances[row]
+            valid = rows >= 0
+            if allowed is not None:
+                valid[valid] = allowed[rows[valid]]
+            rows, distances = rows[valid], distances[valid]
+
+            # The list is exhaustive when it holds every other destination, otherwise it may miss matches
+            exhaustive = len(self.row_of) - 1 <= self.neighbours
+            if len(rows) < k and not exhaustive:
+                distances = self._distances(np.array([row]), metric)[0]
+                if allowed is not None:
+                    distances[~allowed] = np.inf
+                count = min(k, int(np.isfinite(distances).sum()))
+                if count == 0:
+                    return []
+                rows = np.argpartition(distances, count - 1)[:count]
+                rows = rows[np.argsort(distances[rows], kind="stable")]
+                distances = distances[rows]
+
+            return [(self.ids[r], float(d)) for r, d in zip(rows[:k], distances[:k])]
+
+    def stats(self) -> dict:
+        return {
+            "destinations": len(self.row_of),
+            "neighbours": self.neighbours,
+            "version": self.version,
+            "metrics": sorted(self.neighbour_rows),
+            "bytes": int(self.vectors.nbytes + self.unit_vectors.nbytes + sum(
+                self.neighbour_rows[m].nbytes + self.neighbour_distances[m].nbytes for m in self.neighbour_rows)),
+        }
+
+
+similarity_index = SimilarityIndex()
@@ -0,0 +1,50 @@
+from typing import Optional
+import numpy as np
+from .knn_index import SimilarityIndex, SCORE_COLUMNS, BUDGET_ORDER
+
+
+def rank_destinations(index: SimilarityIndex, candidate_ids: list[str], weights: dict[str, float],
+                      budget_preference: Optional[str] = None, budget_weight: float = 1.0,
+                      k: int = 20) -> list[tuple[str, float, dict[str, float]]]:
+    """
+    Scores the candidates as a weighted sum of their theme scores (scaled to 0-1) plus, with a
+    budget preference, `budget_weight` × closeness of their budget level (1 = same level, 0 = two
+    levels apart). Returns the top `k` as (id, score, per-feature contributions), best first.
+    """
+    # Creates and deletes replace the arrays and row_of under this lock
+    with index.lock:
+        return _rank(index, candidate_ids, weights, budget_preference, budget_weight, k)
+
+
+def _rank(index: SimilarityIndex, candidate_ids: list[str], weights: dict[str, float],
+          budget_preference: Optional[str], budget_weight: float, k: int) -> list[tuple[str, float, dict[str, float]]]:
+    rows = np.array([index.row_of[i] for i in candidate_ids if i in index.row_of], dtype=np.int64)
+    if len(rows) == 0:
+        return []
+
+    weight_vector = np.array([weights.get(c, 0.0) for c in SCORE_COLUMNS], dtype=np.float32)
+    themes = index.vectors[rows, :len(SCORE_COLUMNS)]
+    # One matrix-vector product scores every candidate
+    scores = themes @ weight_vector
+
+    budget_fit = None
+    if budget_preference is not None:
+        budget_codes = index.budget_codes[rows].astype(np.float32)
+        # Destinations without a budget level count as one step away
+        distance = np.where(budget_codes >= 0, np.abs(budget_codes - BUDGET_ORDER[budget_preference]), 1)
+        budget_fit = budget_weight * (1.0 - distance / (len(BUDGET_ORDER) - 1))
+        scores = scores + budget_fit
+
+    # Partial selection of the top k, then a sort of those k only
+    k = min(k, len(rows))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind="stable")]
+
+    results = []
+    for position in top:
+        breakdown = {c: float(themes[position, i] * weight_vector[i])
+                     for i, c in enumerate(SCORE_COLUMNS) if weight_vector[i] != 0}
+        if budget_fit is not None:
+            breakdown["budget_level"] = float(budget_fit[position])
+        results.append((index.ids[rows[position]], float(scores[position]), breakdown))
+    return results
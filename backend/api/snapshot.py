@@ -0,0 +1,236 @@
+"""
+Read-only, memory-mapped snapshot of the destination catalogue shared by all API workers.
+
+The snapshot is a directory of .npy column files plus a manifest (dataset version, row count,
+category dictionaries), written once by the data loader. Workers memory-map the columns
+read-only, so the pages live once in the OS page cache no matter how many workers run, and a
+new worker opens the snapshot without loading anything. A new snapshot is published by
+atomically replacing the CURRENT pointer; readers swap to it on their next access.
+
+A snapshot is only used while its dataset version matches the database; after a change made
+through the API, callers fall back to querying the database until the snapshot is rewritten:
+    python -m backend.api.snapshot
+"""
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from .models import Destination
+from .dataset_version import get_dataset_version
+
+SNAPSHOT_DIRECTORY = os.getenv("SNAPSHOT_DIRECTORY", os.path.join(os.path.dirname(__file__), "snapshots"))
+POINTER_FILE = "CURRENT"
+# How often a worker looks for a newly published snapshot
+SNAPSHOT_CHECK_SECONDS = float(os.getenv("SNAPSHOT_CHECK_SECONDS", "1"))
+# Rows read from the database per step while writing
+WRITE_CHUNK = 50_000
+
+SCORE_COLUMNS = ["culture", "adventure", "nature", "beaches", "nightlife", "cuisine", "wellness", "urban", "seclusion"]
+TRIP_COLUMNS = ["day_trip", "long_trip", "one_week", "short_trip", "weekend"]
+CATEGORY_COLUMNS = ["region", "country", "budget_level"]
+MONTHS = [str(month) for month in range(1, 13)]
+CLIMATE_KEYS = ["avg", "max", "min"]
+# Code of a missing value in the integer columns
+MISSING = -1
+
+
+class Snapshot:
+    """One published snapshot. Columns are read-only memory maps, sorted by destination id."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        self.version: int = self.manifest["version"]
+        self.size: int = self.manifest["rows"]
+        # Category code -> value, per column
+        self.dictionaries: dict[str, list[str]] = self.manifest["dictionaries"]
+        self._columns: dict[str, np.ndarray] = {}
+
+    def column(self, name: str) -> np.ndarray:
+        if name not in self._columns:
+            self._columns[name] = np.load(os.path.join(self.directory, f"{name}.npy"), mmap_mode="r")
+        return self._columns[name]
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self.column("id")
+
+    def rows_of(self, ids: list[str]) -> np.ndarray:
+        """Row numbers of the given destination ids (ids missing from the snapshot are skipped)."""
+        if not ids:
+            return np.zeros(0, dtype=np.int64)
+        keys = np.array([i.encode() for i in ids], dtype=self.ids.dtype)
+        rows = np.searchsorted(self.ids, keys)
+        rows = np.minimum(rows, self.size - 1)
+        return rows[self.ids[rows] == keys]
+
+    def decode(self, name: str, codes: np.ndarray) -> list[Optional[str]]:
+        dictionary = self.dictionaries[name]
+        return [dictionary[code] if code != MISSING else None for code in codes.tolist()]
+
+
+def _parse_climate(value) -> list:
+    """(12, 3) avg/max/min temperatures from the avg_temp_monthly JSON (NaN when missing)."""
+    try:
+        parsed = json.loads(value) if value else {}
+    except (TypeError, json.JSONDecodeError):
+        parsed = {}
+    months = [parsed.get(month) or {} for month in MONTHS]
+    return [[month.get(key) if month.get(key) is not None else np.nan for key in CLIMATE_KEYS] for month in months]
+
+
+def _float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def write_snapshot(db: Session, keep: int = 2) -> str:
+    """
+    Writes a snapshot of the destinations table at its current dataset version, publishes it
+    and removes all but the `keep` newest snapshots. Memory use does not depend on the table size.
+    """
+    version = get_dataset_version(db)
+    rows = db.query(func.count(Destination.id)).scalar()
+    id_width = max(db.query(func.max(func.length(Destination.id))).scalar() or 1, 1)
+
+    name = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')}-v{version}"
+    directory = os.path.join(SNAPSHOT_DIRECTORY, name)
+    os.makedirs(directory)
+
+    def create(column: str, dtype, shape: tuple) -> np.ndarray:
+        return np.lib.format.open_memmap(os.path.join(directory, f"{column}.npy"), mode="w+",
+                                         dtype=dtype, shape=(rows,) + shape)
+
+    ids = create("id", f"S{id_width}", ())
+    categories = {column: create(column, np.int16, ()) for column in CATEGORY_COLUMNS}
+    scores = create("scores", np.int8, (len(SCORE_COLUMNS),))
+    trips = create("trips", np.int8, (len(TRIP_COLUMNS),))
+    coordinates = create("coordinates", np.float32, (2,))
+    climate = create("climate", np.float32, (12, len(CLIMATE_KEYS)))
+
+    dictionaries: dict[str, dict[str, int]] = {column: {} for column in CATEGORY_COLUMNS}
+    columns = [Destination.id, Destination.latitude, Destination.longitude, Destination.avg_temp_monthly] + \
+              [getattr(Destination, c) for c in CATEGORY_COLUMNS + SCORE_COLUMNS + TRIP_COLUMNS]
+
+    try:
+        start, last_id = 0, None
+        while start < rows:
+            query = db.query(*columns).order_by(Destination.id)
+            if last_id is not None:
+                query = query.filter(Destination.id > last_id)
+            chunk = [row._mapping for row in query.limit(min(WRITE_CHUNK, rows - start))]
+            if not chunk:
+                break
+            end = start + len(chunk)
+            ids[start:end] = [row["id"].encode() for row in chunk]
+            for column, codes in dictionaries.items():
+                categories[column][start:end] = [
+                    codes.setdefault(row[column], len(codes)) if row[column] is not None else MISSING
+                    for row in chunk
+                ]
+            scores[start:end] = [[row[c] if row[c] is not None else MISSING for c in SCORE_COLUMNS] for row in chunk]
+            trips[start:end] = [[int(row[c]) if row[c] is not None else MISSING for c in TRIP_COLUMNS] for row in chunk]
+            coordinates[start:end] = [[_float(row["latitude"]), _float(row["longitude"])] for row in chunk]
+            climate[start:end] = [_parse_climate(row["avg_temp_monthly"]) for row in chunk]
+            start, last_id = end, chunk[-1]["id"]
+
+        for array in [ids, scores, trips, coordinates, climate, *categories.values()]:
+            array.flush()
+        manifest = {
+            "version": version,
+            "rows": start,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "dictionaries": {column: list(codes) for column, codes in dictionaries.items()},
+            "score_columns": SCORE_COLUMNS,
+            "trip_columns": TRIP_COLUMNS,
+        }
+        with open(os.path.join(directory, "manifest.json"), "w") as f:
+            json.dump(manifest, f)
+    except BaseException:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+
+    _publish(name, keep)
+    print(f"✓ Wrote destination snapshot of {start} rows (version {version}) to {directory}")
+    return directory
+
+
+def _publish(name: str, keep: int):
+    pointer = os.path.join(SNAPSHOT_DIRECTORY, POINTER_FILE)
+    temporary = f"{pointer}.tmp"
+    with open(temporary, "w") as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, pointer)
+
+    # Workers keep their memory maps of a removed snapshot valid until they swap (POSIX unlink semantics)
+    snapshots = sorted(entry for entry in os.listdir(SNAPSHOT_DIRECTORY) if entry != POINTER_FILE
+                       and os.path.isdir(os.path.join(SNAPSHOT_DIRECTORY, entry)))
+    for old in snapshots[:-max(keep, 1)]:
+        shutil.rmtree(os.path.join(SNAPSHOT_DIRECTORY, old), ignore_errors=True)
+
+
+class SnapshotReader:
+    """Follows the CURRENT pointer and hands out the snapshot matching the database version."""
+
+    def __init__(self):
+        self._snapshot: Optional[Snapshot] = None
+        self._name: Optional[str] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self, version: int) -> Optional[Snapshot]:
+        """The published snapshot if it was taken at `version`, otherwise None."""
+        now = time.monotonic()
+        if now - self._checked_at >= SNAPSHOT_CHECK_SECONDS:
+            with self._lock:
+                if now - self._checked_at >= SNAPSHOT_CHECK_SECONDS:
+                    self._checked_at = now
+                    self._follow_pointer()
+        snapshot = self._snapshot
+        return snapshot if snapshot is not None and snapshot.version == version else None
+
+    def _follow_pointer(self):
+        try:
+            with open(os.path.join(SNAPSHOT_DIRECTORY, POINTER_FILE)) as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return
+        if name and name != self._name:
+            try:
+                self._snapshot = Snapshot(os.path.join(SNAPSHOT_DIRECTORY, name))
+                self._name = name
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️ Could not open destination snapshot {name}: {e}")
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {"loaded": False}
+        return {"loaded": True, "version": snapshot.version, "rows": snapshot.size, "directory": snapshot.directory}
+
+
+destination_snapshot = SnapshotReader()
+
+
+if __name__ == "__main__":
+    from .database import SessionLocal
+    parser = argparse.ArgumentParser(description="Write and publish a snapshot of the destinations table.")
+    parser.add_argument("--keep", type=int, default=2, help="Snapshots kept on disk (including the new one)")
+    args = parser.parse_args()
+    session = SessionLocal()
+    try:
+        write_snapshot(session, args.keep)
+    finally:
+        session.close()
@@ -0,0 +1,132 @@
+"""
+Startup-time profile of the API: import time per component and init time per subsystem.
+
+Usage (from the repository root):
+    python -m backend.api.startup_profile [--init all|name,name] [--timeout 10] [--json]
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+APP_MODULE = f"{__package__}.main"
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile_imports(module: str = APP_MODULE) -> dict:
+    """
+    Imports `module` in a fresh interpreter with `-X importtime` and attributes the
+    cumulative import time to our own modules and to each third-party top-level package.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    own_package = module.rsplit(".", 1)[0]
+    own_modules: dict[str, float] = {}
+    packages: dict[str, float] = defaultdict(float)
+    total_us = 0
+
+    # -X importtime prints children before their parent; walking the lines backwards
+    # visits each parent first, so the enclosing import of every entry is known
+    ancestors: dict[int, str] = {}
+    for line in reversed(result.stderr.splitlines()):
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, name = int(match[1]), int(match[2]), match[4]
+        depth = (len(match[3]) - 1) // 2
+        ancestors[depth] = name
+        total_us += self_us
+
+        parent = ancestors.get(depth - 1) if depth > 0 else None
+        if name.startswith(own_package):
+            own_modules[name] = cumulative_us / 1e6
+        elif parent is None or parent.startswith(own_package):
+            # Third-party imports made directly by our modules carry the cost of everything they pulled in
+            packages[name.split(".")[0]] += cumulative_us / 1e6
+
+    return {
+        "module": module,
+        "total_seconds": total_us / 1e6,
+        "own_modules": dict(sorted(own_modules.items(), key=lambda item: -item[1])),
+        "third_party_packages": dict(sorted(packages.items(), key=lambda item: -item[1])),
+    }
+
+
+def profile_initialization(names: list[str], timeout: float) -> dict:
+    """Imports the app in-process and initializes the given subsystems one by one."""
+    started = time.perf_counter()
+    importlib.import_module(APP_MODULE)
+    import_seconds = time.perf_counter() - started
+
+    from .subsystems import subsystems
+    names = names or [subsystem.name for subsystem in subsystems]
+
+    # Sequentially, so a subsystem's time isn't inflated by the ones initializing next to it
+    for name in names:
+        asyncio.run(subsystems.warm_up([name], timeout=timeout))
+
+    return {
+        "in_process_import_seconds": import_seconds,
+        "subsystems": {name: subsystems[name].describe() for name in names},
+    }
+
+
+def print_report(report: dict, top: int):
+    imports = report["imports"]
+    print(f"Import of {imports['module']}: {imports['total_seconds']:.3f}s total")
+    print("\n  Own modules (cumulative):")
+    for name, seconds in list(imports["own_modules"].items())[:top]:
+        print(f"    {seconds:8.3f}s  {name}")
+    print("\n  Third-party packages (cumulative, first import):")
+    for name, seconds in list(imports["third_party_packages"].items())[:top]:
+        print(f"    {seconds:8.3f}s  {name}")
+
+    init = report["initialization"]
+    print(f"\nIn-process import: {init['in_process_import_seconds']:.3f}s")
+    print("\n  Subsystem initialization:")
+    for name, info in init["subsystems"].items():
+        seconds = f"{info['init_seconds']:.3f}s" if info["init_seconds"] is not None else "-"
+        error = f"  ({info['error']})" if info["error"] else ""
+        print(f"    {seconds:>9}  {name:<14} {info['status']}{error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--init", default="all",
+                        help="Subsystems to initialize: 'all', 'none' or a comma-separated list")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-subsystem init timeout in seconds")
+    parser.add_argument("--top", type=int, default=15, help="Number of import entries to show")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    if args.init == "none":
+        names = None
+    elif args.init == "all":
+        names = []
+    else:
+        names = [name.strip() for name in args.init.split(",") if name.strip()]
+
+    report = {"imports": profile_imports()}
+    if names is None:
+        report["initialization"] = {"in_process_import_seconds": 0.0, "subsystems": {}}
+    else:
+        report["initialization"] = profile_initialization(names, args.timeout)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Iterable, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class Subsystem:
+    """
+    A heavy dependency (client, engine, index) that is created on first use instead of at import.
+
+    Initialization is guarded by a lock so concurrent first requests build it only once.
+    A failed initialization is retried on the next use, so a service that was unreachable
+    at boot does not require a restart once it comes back.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self.name = name
+        self.factory = factory
+        self.status = "pending"
+        self.error: Optional[str] = None
+        self.init_seconds: Optional[float] = None
+        self._value = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+
+    def get(self) -> Any:
+        if self.status == "ready":
+            return self._value
+        with self._lock:
+            if self.status == "ready":
+                return self._value
+            self.status = "initializing"
+            started = time.perf_counter()
+            try:
+                value = self.factory()
+            except Exception as e:
+                self.status = "failed"
+                self.error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                self.init_seconds = time.perf_counter() - started
+            self._value = value
+            self.status = "ready"
+            self.error = None
+            return value
+
+    def reload(self):
+        """
+        Builds a fresh instance and swaps it in. The current instance keeps serving while the
+        new one is built, and stays in place if building it fails. Concurrent reloads are skipped.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            started = time.perf_counter()
+            value = self.factory()
+            with self._lock:
+                self._value = value
+                self.status = "ready"
+                self.error = None
+                self.init_seconds = time.perf_counter() - started
+        except Exception as e:
+            print(f"❌ Reloading {self.name} failed, keeping the current instance: {e}")
+        finally:
+            self._reload_lock.release()
+
+    def override(self, factory: Callable[[], Any]):
+        """Replaces the factory (e.g. with a local stand-in) and drops any built instance."""
+        with self._lock:
+            self.factory = factory
+            self._value = None
+            self.status = "pending"
+            self.error = None
+            self.init_seconds = None
+
+    def describe(self) -> dict:
+        return {"status": self.status, "init_seconds": self.init_seconds, "error": self.error}
+
+
+class SubsystemRegistry:
+    def __init__(self):
+        self._subsystems: dict[str, Subsystem] = {}
+
+    def register(self, name: str) -> Callable[[Callable[[], Any]], Callable[[], Any]]:
+        """Decorator registering a factory under `name`."""
+        def decorator(factory):
+            self._subsystems[name] = Subsystem(name, factory)
+            return factory
+        return decorator
+
+    def __getitem__(self, name: str) -> Subsystem:
+        return self._subsystems[name]
+
+    def __iter__(self):
+        return iter(self._subsystems.values())
+
+    def get(self, name: str) -> Any:
+        return self._subsystems[name].get()
+
+    def override(self, name: str, factory: Callable[[], Any]):
+        self._subsystems[name].override(factory)
+
+    async def warm_up(self, names: Iterable[str], timeout: float):
+        """Initializes the given subsystems concurrently, each bounded by `timeout` seconds."""
+        async def warm(subsystem: Subsystem):
+            try:
+                await asyncio.wait_for(asyncio.to_thread(subsystem.get), timeout)
+            except asyncio.TimeoutError:
+                # The worker thread keeps going; the subsystem becomes ready whenever it finishes
+                if subsystem.status == "initializing":
+                    subsystem.status = "timeout"
+                    subsystem.error = f"Initialization exceeded {timeout}s"
+                print(f"⚠️ {subsystem.name} did not initialize within {timeout}s")
+            except Exception as e:
+                print(f"❌ {subsystem.name} failed to initialize: {e}")
+
+        await asyncio.gather(*(warm(self._subsystems[name]) for name in names))
+
+    def readiness(self, required: Iterable[str] = ()) -> tuple[bool, dict]:
+        """
+        The app is ready when no subsystem is failing and every required one is initialized.
+        Lazily initialized subsystems that were never used yet don't block readiness.
+        """
+        required = set(required)
+        report = {subsystem.name: subsystem.describe() for subsystem in self}
+        ready = all(
+            info["status"] not in ("failed", "timeout") and (name not in required or info["status"] == "ready")
+            for name, info in report.items()
+        )
+        return ready, report
+
+
+subsystems = SubsystemRegistry()
+
+
+def warmup_subsystem_names() -> list[str]:
+    """Subsystems initialized in the lifespan hook (WARMUP_SUBSYSTEMS, comma separated or 'all')."""
+    configured = os.getenv("WARMUP_SUBSYSTEMS", "database")
+    if configured.strip() == "all":
+        return [subsystem.name for subsystem in subsystems]
+    return [name.strip() for name in configured.split(",") if name.strip()]
+
+
+def require_env(name: str) -> str:
+    value = os.environ.get(name)
+    if not value:
+        raise ValueError(f"{name} not set in environment.")
+    return value
+
+
+# --- Subsystem factories ---
+# Heavy third-party modules are imported inside the factories so importing the app stays cheap.
+
+CHROMA_DIRECTORY = os.getenv("CHROMA_DIRECTORY", os.path.join(os.path.dirname(__file__), "chat", "chroma"))
+# Written by backend/vector_index_builder.py: names the index under CHROMA_DIRECTORY to serve
+CHROMA_POINTER_FILE = "CURRENT"
+# Written into each built index; records the embedding model it was built with
+CHROMA_INDEX_MANIFEST = "index.json"
+# Rebuild the index in the background when it was built with another embedding model
+VECTOR_INDEX_AUTO_REBUILD = os.getenv("VECTOR_INDEX_AUTO_REBUILD", "true").lower() in ("1", "true", "yes")
+VECTOR_STORE_CHECK_SECONDS = float(os.getenv("VECTOR_STORE_CHECK_SECONDS", "5"))
+
+
+def chroma_persist_directory() -> str:
+    """The index the CURRENT pointer names, or CHROMA_DIRECTORY itself for an index built by the notebook."""
+    try:
+        with open(os.path.join(CHROMA_DIRECTORY, CHROMA_POINTER_FILE)) as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return CHROMA_DIRECTORY
+    return os.path.join(CHROMA_DIRECTORY, name) if name else CHROMA_DIRECTORY
+
+
+def index_embedding_model(directory: str) -> str:
+    """The embedding model an index was built with (the notebook's index has no manifest and used OpenAI)."""
+    from .chat.embeddings import OPENAI_EMBEDDING_MODEL
+    try:
+        with open(os.path.join(directory, CHROMA_INDEX_MANIFEST)) as f:
+            return json.load(f)["embedding_model"]
+    except FileNotFoundError:
+        return OPENAI_EMBEDDING_MODEL
+
+
+# A lock file older than this is left over from a crashed build
+REBUILD_LOCK_STALE_SECONDS = 3600
+_rebuilt_models: set[str] = set()
+
+
+def start_index_rebuild(model: str):
+    """
+    Rebuilds the index with the configured embedding model in a background thread, once per process
+    and model. A lock file makes sure only one worker builds; the others pick up the new index once
+    it is published.
+    """
+    if model in _rebuilt_models:
+        return
+    lock_path = os.path.join(CHROMA_DIRECTORY, "rebuild.lock")
+    os.makedirs(CHROMA_DIRECTORY, exist_ok=True)
+    try:
+        if time.time() - os.path.getmtime(lock_path) > REBUILD_LOCK_STALE_SECONDS:
+            os.remove(lock_path)
+    except FileNotFoundError:
+        pass
+    try:
+        os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return
+    _rebuilt_models.add(model)
+    print(f"⚠️ Rebuilding the vector index with '{model}' in the background")
+
+    def rebuild():
+        from ..vector_index_builder import build_index
+        try:
+            build_index()
+        except Exception as e:
+            print(f"❌ Rebuilding the vector index failed: {e}")
+        finally:
+            os.remove(lock_path)
+
+    threading.Thread(target=rebuild, name="vector-index-rebuild", daemon=True).start()
+
+
+_vector_store_state = {"directory": None, "checked_at": 0.0}
+
+
+def refresh_vector_store():
+    """Swaps in a rebuilt index once the CURRENT pointer changes (checked every VECTOR_STORE_CHECK_SECONDS)."""
+    subsystem = subsystems["vector_store"]
+    now = time.monotonic()
+    if subsystem.status != "ready" or now - _vector_store_state["checked_at"] < VECTOR_STORE_CHECK_SECONDS:
+        return
+    _vector_store_state["checked_at"] = now
+    if _vector_store_state["directory"] is not None and chroma_persist_directory() != _vector_store_state["directory"]:
+        subsystem.reload()
+
+
+@subsystems.register("database")
+def create_destinations_database():
+    """Creates the local destinations tables if they don't exist."""
+    from .database import Base, engine
+    from . import models  # noqa: F401 - registers the tables on Base.metadata
+    from .metrics import instrument_engine
+    from .search.full_text import ensure_full_text_index
+    from .schema_migration import is_current
+    Base.metadata.create_all(bind=engine)
+    if not is_current(engine):
+        raise RuntimeError("The destinations table is in the old layout; "
+                           "run `python -m backend.api.schema_migration` to migrate it.")
+    ensure_full_text_index(engine)
+    instrument_engine(engine, "sqlite")
+    return engine
+
+
+@subsystems.register("supabase")
+def create_supabase_client():
+    from supabase import create_client
+    return create_client(require_env("SUPABASE_URL"), require_env("SUPABASE_KEY"))
+
+
+@subsystems.register("openai")
+def create_openai_client():
+    from openai import OpenAI
+    return OpenAI(api_key=require_env("OPENAI_API_KEY"))
+
+
+@subsystems.register("embeddings")
+def create_embeddings():
+    from .chat.embeddings import create_embedding_backend
+    return create_embedding_backend()
+
+
+@subsystems.register("vector_store")
+def create_vector_store():
+    """
+    Opens the Chroma DB used for document retrieval and validates it contains documents.
+    An index built with another embedding model than the configured one is rebuilt instead.
+    """
+    from langchain_chroma import Chroma
+    from .chat.embeddings import embedding_model_name
+    directory = chroma_persist_directory()
+    embeddings = subsystems.get("embeddings")
+    model, built_with = embedding_model_name(embeddings), index_embedding_model(directory)
+    if model != built_with:
+        if VECTOR_INDEX_AUTO_REBUILD:
+            start_index_rebuild(model)
+        raise RuntimeError(f"The vector index was built with '{built_with}' but the embedding backend is "
+                           f"'{model}'; run `python -m backend.vector_index_builder` or wait for the rebuild.")
+    db = Chroma(persist_directory=directory, embedding_function=embeddings)
+    _vector_store_state["directory"] = directory
+    count = db._collection.count()
+    if count > 0:
+        print(f"✅ Chroma DB loaded successfully with {count} documents from {directory}.")
+    else:
+        print("⚠️ Chroma DB loaded, but is empty. Make sure your data is persisted.")
+    return db
+
+
+@subsystems.register("chat_store")
+def create_chat_store_engine():
+    """Creates the SQLModel engine for the 'users' and 'chats' tables, creating them if they don't exist."""
+    from sqlmodel import SQLModel, create_engine
+    from .chat import chat_utils  # noqa: F401 - registers the tables on SQLModel.metadata
+    from .metrics import instrument_engine
+    engine = create_engine(require_env("SUPABASE_CONNECTION_STRING"))
+    SQLModel.metadata.create_all(engine)
+    instrument_engine(engine, "postgres")
+    return engine
+
+
+@subsystems.register("chat_model")
+def create_chat_model():
+    from langchain_openai.chat_models import ChatOpenAI
+    return ChatOpenAI(model_name="gpt-4o-mini", temperature=0.5, api_key=require_env("OPENAI_API_KEY"))
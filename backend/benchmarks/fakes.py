@@ -0,0 +1,261 @@
+"""
+In-process stand-ins for OpenAI and Supabase, so every endpoint can run without network access.
+
+The fakes only implement the calls the app makes, with a configurable latency model:
+a fixed round-trip latency plus, for generated text, the time to stream the output tokens.
+"""
+import hashlib
+import itertools
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, List, Optional
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage
+
+
+@dataclass
+class LatencyModel:
+    """Simulated service time: `latency` seconds per call plus `tokens / tokens_per_second`."""
+    latency: float = 0.0
+    tokens_per_second: float = 0.0
+
+    def wait(self, output_tokens: int = 0):
+        delay = self.latency
+        if self.tokens_per_second > 0:
+            delay += output_tokens / self.tokens_per_second
+        if delay > 0:
+            time.sleep(delay)
+
+
+def deterministic_embedding(text: str, dim: int) -> List[float]:
+    """Unit-length pseudo-embedding derived from the text, so equal texts embed equally."""
+    values = []
+    for counter in itertools.count():
+        digest = hashlib.blake2b(f"{counter}:{text}".encode(), digest_size=64).digest()
+        values.extend(byte / 127.5 - 1.0 for byte in digest)
+        if len(values) >= dim:
+            break
+    values = values[:dim]
+    norm = sum(v * v for v in values) ** 0.5 or 1.0
+    return [v / norm for v in values]
+
+
+# --- OpenAI ---
+
+class _FakeEmbeddingsAPI:
+    def __init__(self, client: "FakeOpenAI"):
+        self._client = client
+
+    def create(self, input, model: str = "text-embedding-3-small", **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        self._client.latency.wait()
+        self._client.record("embeddings")
+        return SimpleNamespace(
+            data=[SimpleNamespace(index=i, embedding=deterministic_embedding(text, self._client.embedding_dim))
+                  for i, text in enumerate(texts)],
+            model=model,
+        )
+
+
+class _FakeChatCompletionsAPI:
+    def __init__(self, client: "FakeOpenAI"):
+        self._client = client
+
+    def create(self, messages, model: str = "gpt-4o-mini", **kwargs):
+        content = self._client.reply_text
+        self._client.latency.wait(output_tokens=len(content.split()))
+        self._client.record("chat")
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(index=0, message=SimpleNamespace(role="assistant", content=content))],
+        )
+
+
+class _FakeResponsesAPI:
+    FEATURE_PATTERN = re.compile(r"Feature name: '([^']+)'\. Feature values: \[([^\]]*)\]")
+
+    def __init__(self, client: "FakeOpenAI"):
+        self._client = client
+
+    def parse(self, input, text_format, model: str = "gpt-4o-mini", **kwargs):
+        """Builds a structured answer from the features listed in the prompt (see DynamicFilterGenerator)."""
+        prompt = "\n".join(message["content"] for message in input)
+        filters = []
+        for feature, values in self.FEATURE_PATTERN.findall(prompt):
+            values = [value.strip() for value in values.split(",") if value.strip()]
+            filters.append({
+                "question": f"How important is {feature.replace('_', ' ')} to you?",
+                "feature": feature,
+                "type": "binary" if len(values) <= 2 else "categorical",
+                "value_meanings": {value: f"{feature} level {value}" for value in values},
+            })
+        self._client.latency.wait(output_tokens=40 * len(filters))
+        self._client.record("responses")
+        return SimpleNamespace(output_parsed=text_format(filter_list=filters))
+
+
+class FakeOpenAI:
+    """OpenAI-compatible client covering `embeddings.create`, `chat.completions.create` and `responses.parse`."""
+
+    def __init__(self, latency: float = 0.0, tokens_per_second: float = 0.0, embedding_dim: int = 256,
+                 reply_text: Optional[str] = None):
+        self.latency = LatencyModel(latency, tokens_per_second)
+        self.embedding_dim = embedding_dim
+        self.reply_text = reply_text or (
+            "Based on your interests, Milan offers world-class cuisine and culture, "
+            "while the Yasawa Islands are ideal if you want secluded beaches. " * 3
+        ).strip()
+        self.calls: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.embeddings = _FakeEmbeddingsAPI(self)
+        self.chat = SimpleNamespace(completions=_FakeChatCompletionsAPI(self))
+        self.responses = _FakeResponsesAPI(self)
+
+    def record(self, endpoint: str):
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+
+class FakeEmbeddings(Embeddings):
+    """LangChain embeddings backed by the fake OpenAI client."""
+
+    def __init__(self, client: FakeOpenAI):
+        self.client = client
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [item.embedding for item in self.client.embeddings.create(input=texts).data]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.client.embeddings.create(input=text).data[0].embedding
+
+
+class FakeChatModel:
+    """Minimal stand-in for ChatOpenAI: `invoke(prompt)` returns an AIMessage."""
+
+    def __init__(self, client: FakeOpenAI):
+        self.client = client
+
+    def invoke(self, prompt: Any, **kwargs) -> AIMessage:
+        response = self.client.chat.completions.create(messages=[{"role": "user", "content": str(prompt)}])
+        return AIMessage(content=response.choices[0].message.content)
+
+
+# --- Supabase (PostgREST) ---
+
+def _column_value(row: dict, column: str):
+    """A column, or a JSON path into one such as `message->data->>id`."""
+    value = row
+    for key in re.split(r"->>?", column):
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def _column_alias(column: str) -> str:
+    """The key PostgREST returns a selected column under: `alias:path`, or the path's last key."""
+    alias, _, path = column.partition(":")
+    return alias if path else re.split(r"->>?", column)[-1]
+
+
+@dataclass
+class _FakeQuery:
+    store: "FakeSupabase"
+    table: str
+    operation: str = "select"
+    columns: Optional[List[str]] = None
+    payload: Any = None
+    filters: list = field(default_factory=list)
+    order_by: list = field(default_factory=list)
+    row_limit: Optional[int] = None
+
+    def select(self, columns: str = "*"):
+        self.operation = "select"
+        self.columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        return self
+
+    def insert(self, records):
+        self.operation = "insert"
+        self.payload = records if isinstance(records, list) else [records]
+        return self
+
+    def update(self, values: dict):
+        self.operation = "update"
+        self.payload = values
+        return self
+
+    def in_(self, column: str, values):
+        values = {str(value) for value in values}
+        self.filters.append(lambda row: str(_column_value(row, column)) in values)
+        return self
+
+    def eq(self, column: str, value):
+        self.filters.append(lambda row: str(row.get(column)) == str(value))
+        return self
+
+    def lt(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] < value)
+        return self
+
+    def gt(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] > value)
+        return self
+
+    def order(self, column: str, desc: bool = False):
+        self.order_by.append((column, desc))
+        return self
+
+    def limit(self, count: int):
+        self.row_limit = count
+        return self
+
+    def execute(self):
+        self.store.latency.wait()
+        return SimpleNamespace(data=self.store.run(self))
+
+
+class FakeSupabase:
+    """Thread-safe in-memory tables with the subset of the PostgREST query builder the app uses."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = LatencyModel(latency)
+        self.tables: dict[str, list[dict]] = {}
+        self.requests = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def table(self, name: str) -> _FakeQuery:
+        return _FakeQuery(store=self, table=name)
+
+    def run(self, query: _FakeQuery) -> list[dict]:
+        with self._lock:
+            self.requests += 1
+            rows = self.tables.setdefault(query.table, [])
+
+            if query.operation == "insert":
+                inserted = []
+                for record in query.payload:
+                    row = {"id": next(self._ids), "created_at": datetime.now(timezone.utc).isoformat(), **record}
+                    if query.table == "users" and "id" not in record:
+                        row["id"] = str(uuid.uuid4())
+                    rows.append(row)
+                    inserted.append(dict(row))
+                return inserted
+
+            selected = [row for row in rows if all(f(row) for f in query.filters)]
+            if query.operation == "update":
+                for row in selected:
+                    row.update(query.payload)
+                return [dict(row) for row in selected]
+
+            for column, desc in reversed(query.order_by):
+                selected.sort(key=lambda row: row.get(column), reverse=desc)
+            if query.row_limit is not None:
+                selected = selected[:query.row_limit]
+            if query.columns:
+                return [{_column_alias(c): _column_value(row, c.partition(":")[2] or c) for c in query.columns}
+                        for row in selected]
+            return [dict(row) for row in selected]
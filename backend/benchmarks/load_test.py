@@ -0,0 +1,316 @@
+"""
+End-to-end load benchmark of the API with local stand-ins for OpenAI and Supabase.
+
+Drives /destinations/, /dynamic_filters/, /chat/ and /auth/token in-process at a configurable
+concurrency and writes p50/p95/p99 latency and throughput per scenario as JSON, which can be
+compared against a previous run to catch regressions.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.load_test --requests 200 --concurrency 16 --output baseline.json
+    python -m backend.benchmarks.load_test --compare baseline.json --tolerance 0.15
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import uuid
+import warnings
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+DEFAULT_SCENARIOS = ("destinations", "dynamic_filters", "chat", "auth_token")
+CSV_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "structured_data.csv")
+
+# Filter combinations mixing repeated ("hot") and rarely used queries
+DESTINATION_QUERIES = [
+    {},
+    {"region__in": "europe"},
+    {"region__in": "europe,asia"},
+    {"region__in": "asia,europe"},
+    {"budget_level__in": "Budget,Mid-range", "beaches__gte": 4},
+    {"culture__gte": 4, "cuisine__gte": 4},
+    {"region": "oceania", "beaches__in": "4,5"},
+    {"nightlife__lte": 2, "seclusion__gte": 4},
+    {"weekend": True, "region__in": "europe"},
+]
+CHAT_PROMPTS = [
+    "Where should I go for a relaxing beach holiday?",
+    "Suggest a city with great food and culture.",
+    "I want an adventurous trip in South America.",
+    "Which places are good for a weekend in Europe?",
+]
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(latencies: list[float], errors: int, duration: float, concurrency: int) -> dict:
+    latencies = sorted(latencies)
+    completed = len(latencies) + errors
+    return {
+        "requests": completed,
+        "errors": errors,
+        "concurrency": concurrency,
+        "duration_seconds": duration,
+        "throughput_rps": completed / duration if duration else 0.0,
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p95": percentile(latencies, 0.95) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "mean": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+            "max": latencies[-1] * 1000 if latencies else 0.0,
+        },
+    }
+
+
+class BenchmarkEnvironment:
+    """Temporary database, fake services and seeded users wired into the app's subsystems."""
+
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="travel-bench-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(self.workdir, 'bench.db')}"
+        os.environ["SNAPSHOT_DIRECTORY"] = os.path.join(self.workdir, "snapshots")
+        os.environ["CHAT_WRITE_SPOOL_DIRECTORY"] = os.path.join(self.workdir, "spool")
+        os.environ.setdefault("AUTH_SECRET_KEY", "benchmark-secret")
+        os.environ.setdefault("AUTH_ALGORITHM", "HS256")
+
+        # Imported after the environment is set, since these modules read it at import
+        from ..api.main import app
+        from ..api.subsystems import subsystems
+        from .fakes import FakeOpenAI, FakeSupabase, FakeEmbeddings, FakeChatModel
+
+        self.app = app
+        self.openai = FakeOpenAI(latency=args.openai_latency, tokens_per_second=args.openai_tokens_per_second)
+        self.supabase = FakeSupabase(latency=args.supabase_latency)
+
+        subsystems.override("openai", lambda: self.openai)
+        subsystems.override("embeddings", lambda: FakeEmbeddings(self.openai))
+        subsystems.override("chat_model", lambda: FakeChatModel(self.openai))
+        subsystems.override("supabase", lambda: self.supabase)
+        subsystems.override("chat_store", self._create_chat_store)
+        subsystems.override("vector_store", self._create_vector_store)
+        self.subsystems = subsystems
+
+        self._load_destinations()
+        self.users = [self._create_user(f"bench-user-{i}") for i in range(args.users)]
+
+    def _load_destinations(self):
+        from ..data_loader import DataLoader
+        from ..api.database import SessionLocal
+        from ..api.snapshot import write_snapshot
+        self.subsystems.get("database")
+        db = SessionLocal()
+        try:
+            for chunk in DataLoader.iter_csv(self.args.csv or CSV_PATH):
+                DataLoader.populate_db(db, chunk)
+            write_snapshot(db)
+        finally:
+            db.close()
+
+    def _create_chat_store(self):
+        from sqlmodel import SQLModel, create_engine
+        from sqlalchemy.pool import StaticPool
+        from ..api.chat import chat_utils  # noqa: F401 - registers the tables on SQLModel.metadata
+        from ..api.metrics import instrument_engine
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        SQLModel.metadata.create_all(engine)
+        instrument_engine(engine, "postgres")
+        return engine
+
+    def _create_vector_store(self):
+        """In-memory Chroma collection with the same documents the notebook builds."""
+        from langchain_chroma import Chroma
+        from ..data_loader import DataLoader
+        df = DataLoader.load_csv(CSV_PATH)
+        texts, metadatas = [], []
+        for i, row in enumerate(df.to_dict(orient="records")):
+            texts.append("\n".join(f"{key.replace('_', ' ')}: {value}" for key, value in row.items()))
+            metadatas.append({"source_file": os.path.basename(CSV_PATH), "row_number": i + 2,
+                              "city_name": row["city"], "document_type": "city_data", "id": row["id"]})
+        store = Chroma(collection_name=f"bench-{uuid.uuid4().hex}",
+                       embedding_function=self.subsystems.get("embeddings"))
+        store.add_texts(texts, metadatas=metadatas)
+        return store
+
+    def _create_user(self, username: str) -> dict:
+        from sqlmodel import Session
+        from ..api.chat.chat_utils import User
+        from ..api.deps import bcrypt_context
+        from ..api.routers.auth import create_access_token
+        from datetime import timedelta
+
+        user_id = uuid.uuid4()
+        password = "benchmark-password"
+        self.supabase.table("users").insert({
+            "id": str(user_id), "username": username, "hashed_password": bcrypt_context.hash(password)
+        }).execute()
+        with Session(self.subsystems.get("chat_store")) as session:
+            session.add(User(id=user_id, username=username, email=f"{username}@example.com"))
+            session.commit()
+        token = create_access_token(username, str(user_id), timedelta(hours=2))
+        return {"id": str(user_id), "username": username, "password": password, "token": token}
+
+
+def build_scenarios(env: BenchmarkEnvironment) -> dict[str, Callable]:
+    """Each scenario issues one request with the given client and returns the response."""
+    rng = random.Random(env.args.seed)
+    chat_ids: dict[str, Optional[str]] = {user["id"]: None for user in env.users}
+
+    def auth_headers(user):
+        return {"Authorization": f"Bearer {user['token']}", "Accept-Encoding": "gzip, zstd"}
+
+    async def destinations(client):
+        user = rng.choice(env.users)
+        return await client.get("/destinations/", params=rng.choice(DESTINATION_QUERIES), headers=auth_headers(user))
+
+    async def dynamic_filters(client):
+        user = rng.choice(env.users)
+        return await client.get("/dynamic_filters/", params=rng.choice(DESTINATION_QUERIES),
+                                headers=auth_headers(user))
+
+    async def chat(client):
+        user = rng.choice(env.users)
+        body = {"prompt": rng.choice(CHAT_PROMPTS), "user_id": user["id"], "chat_id": chat_ids[user["id"]]}
+        response = await client.post("/chat/", json=body, headers=auth_headers(user))
+        if response.status_code == 200:
+            chat_ids[user["id"]] = response.json()["chat_id"]
+        return response
+
+    async def auth_token(client):
+        user = rng.choice(env.users)
+        return await client.post("/auth/token", data={
+            "grant_type": "password", "username": user["username"], "password": user["password"]
+        })
+
+    return {"destinations": destinations, "dynamic_filters": dynamic_filters, "chat": chat, "auth_token": auth_token}
+
+
+async def run_scenario(app, scenario: Callable, requests: int, concurrency: int) -> dict:
+    import httpx
+
+    latencies: list[float] = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark",
+                                 timeout=None) as client:
+        async def worker():
+            nonlocal errors
+            for _ in remaining:
+                started = time.perf_counter()
+                try:
+                    response = await scenario(client)
+                    failed = response.status_code >= 400
+                except Exception:
+                    failed = True
+                elapsed = time.perf_counter() - started
+                if failed:
+                    errors += 1
+                else:
+                    latencies.append(elapsed)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        duration = time.perf_counter() - started
+
+    return summarize(latencies, errors, duration, concurrency)
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Returns a line per scenario whose p95 latency or throughput regressed beyond `tolerance`."""
+    regressions = []
+    for name, result in current["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            continue
+        p95, previous_p95 = result["latency_ms"]["p95"], previous["latency_ms"]["p95"]
+        if previous_p95 and p95 > previous_p95 * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous_p95:.1f}ms -> {p95:.1f}ms")
+        rps, previous_rps = result["throughput_rps"], previous["throughput_rps"]
+        if previous_rps and rps < previous_rps * (1 - tolerance):
+            regressions.append(f"{name}: throughput {previous_rps:.1f} -> {rps:.1f} req/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(DEFAULT_SCENARIOS),
+                        help="Comma-separated subset of: " + ", ".join(DEFAULT_SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients per scenario")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests per scenario")
+    parser.add_argument("--users", type=int, default=8, help="Number of seeded users")
+    parser.add_argument("--openai-latency", type=float, default=0.3, help="Fake OpenAI round-trip seconds")
+    parser.add_argument("--openai-tokens-per-second", type=float, default=200.0,
+                        help="Fake OpenAI output token rate (0 = instant)")
+    parser.add_argument("--supabase-latency", type=float, default=0.02, help="Fake Supabase round-trip seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--csv", help="Destinations CSV to load, e.g. from backend.synthetic_data_generator "
+                                      "(the vector store always uses structured_data.csv)")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    # Pseudo-embeddings give near-zero relevance scores, which LangChain warns about on every query
+    warnings.filterwarnings("ignore", message="Relevance scores must be between 0 and 1")
+
+    env = BenchmarkEnvironment(args)
+    scenarios = build_scenarios(env)
+    selected = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        },
+        "results": {},
+    }
+
+    for name in selected:
+        if args.warmup:
+            asyncio.run(run_scenario(env.app, scenarios[name], args.warmup, 1))
+        result = asyncio.run(run_scenario(env.app, scenarios[name], args.requests, args.concurrency))
+        report["results"][name] = result
+        latency = result["latency_ms"]
+        print(f"{name:<16} {result['throughput_rps']:8.1f} req/s  p50 {latency['p50']:8.1f}ms  "
+              f"p95 {latency['p95']:8.1f}ms  p99 {latency['p99']:8.1f}ms  errors {result['errors']}",
+              file=sys.stderr)
+
+    # Chat writes still queued count as Supabase requests too
+    from ..api.chat.chat_utils import message_writer
+    message_writer.flush()
+    report["meta"]["fake_calls"] = {"openai": dict(env.openai.calls), "supabase_requests": env.supabase.requests}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+Offline evaluation of retrieval quality against latency, memory and prompt size.
+
+Generates a labelled query set from the destinations themselves, e.g. "beaches in Fiji" -> the
+Fiji destinations rated best for beaches, or "Tell me about Milan" -> Milan, runs every selected
+retriever over it and reports per retriever:
+
+- recall@k for each --k, and MRR (the first relevant destination's reciprocal rank),
+- query latency p50/p99,
+- the memory the retriever takes to build and query (process RSS growth, so compare runs of a single
+  retriever when memory matters),
+- the prompt tokens the chat would add for the retrieved context at --prompt-k documents, and the
+  recall and empty rate of the sources it would cite at --cutoff.
+
+Retrievers:
+    fts             SQLite full-text search (bm25), the lexical baseline
+    chroma:fake     Chroma with hash pseudo-embeddings; no network, a floor for the embedding retrievers
+    chroma:openai   Chroma with OpenAI embeddings (needs OPENAI_API_KEY)
+    chroma:onnx     Chroma with the local ONNX model (needs ONNX_EMBEDDING_MODEL_DIR)
+    current         The index the API serves now (CHROMA_DIRECTORY), with its configured embeddings
+
+Usage (from the repository root):
+    python -m backend.benchmarks.retrieval_eval --retrievers fts,chroma:onnx --output baseline.json
+    python -m backend.benchmarks.retrieval_eval --retrievers fts,chroma:onnx --compare baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import sys
+import tempfile
+import time
+import uuid
+import warnings
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Callable
+import psutil
+from .load_test import CSV_PATH, percentile
+
+DEFAULT_RETRIEVERS = ("fts", "chroma:fake")
+THEME_PHRASES = {
+    "culture": "culture and history",
+    "adventure": "adventure",
+    "nature": "nature",
+    "beaches": "beaches",
+    "nightlife": "nightlife",
+    "cuisine": "great food",
+    "wellness": "wellness and spas",
+    "urban": "city life",
+    "seclusion": "secluded places",
+}
+# A country/theme query is kept only when this few destinations share the best score
+MAX_RELEVANT = 3
+STOPWORDS = {"and", "the", "with", "for", "into", "from", "that", "this", "its", "their", "create", "creates",
+             "perfect", "offer", "offers", "atmosphere", "while", "among", "amidst", "where", "your"}
+# Words of the query templates above, which the indexed fields never contain
+TEMPLATE_WORDS = {"tell", "me", "about", "in", "somewhere", "with"}
+
+
+# --- Query set ---
+
+def build_queries(destinations: list[dict], per_kind: int, seed: int) -> list[dict]:
+    """Labelled queries of three kinds: a city by name, a theme within a country, a description paraphrase."""
+    rng = random.Random(seed)
+    cities, themes, descriptions = [], [], []
+
+    for d in destinations:
+        cities.append({"kind": "city", "query": f"Tell me about {d['city']}", "relevant": [d["id"]]})
+        words = [w for w in re.findall(r"[a-z]+", d["short_description"].lower())
+                 if len(w) > 3 and w not in STOPWORDS]
+        if len(words) >= 4:
+            picked = sorted(rng.sample(range(len(words)), 4))
+            descriptions.append({"kind": "description", "query": "somewhere with " + " ".join(words[i] for i in picked),
+                                 "relevant": [d["id"]]})
+
+    by_country = defaultdict(list)
+    for d in destinations:
+        by_country[d["country"]].append(d)
+    for country, members in sorted(by_country.items()):
+        for theme, phrase in THEME_PHRASES.items():
+            best = max(d[theme] or 0 for d in members)
+            relevant = [d["id"] for d in members if d[theme] == best]
+            if best >= 4 and len(relevant) <= MAX_RELEVANT:
+                themes.append({"kind": "theme", "query": f"{phrase} in {country}", "relevant": relevant})
+
+    queries = []
+    for kind in (cities, themes, descriptions):
+        queries.extend(rng.sample(kind, min(per_kind, len(kind))))
+    return queries
+
+
+# --- Retrievers ---
+# Each factory returns search(query, k) -> [(destination id, relevance score, document text)], best first
+
+def content_words(query: str) -> str:
+    """The query without template words and stopwords, which would otherwise have to match as well."""
+    return " ".join(word for word in re.findall(r"\w+", query.lower())
+                    if word not in TEMPLATE_WORDS and word not in STOPWORDS)
+
+
+def fts_retriever(db, documents: dict[str, str]) -> Callable:
+    from ..api.search.full_text import ensure_full_text_index, search_destination_ids
+    ensure_full_text_index(db.get_bind())
+
+    def search(query: str, k: int):
+        # Any content word may match, so bm25 ranks partial matches like an embedding retriever would
+        return [(id, score, documents[id])
+                for id, score in search_destination_ids(db, content_words(query), k, any_terms=True)]
+    return search
+
+
+def _similarity_search(store) -> Callable:
+    def search(query: str, k: int):
+        return [(doc.metadata.get("id"), score, doc.page_content)
+                for doc, score in store.similarity_search_with_relevance_scores(query, k=k)]
+    return search
+
+
+def chroma_retriever(backend: str, documents: list[tuple[str, dict]], batch_size: int) -> Callable:
+    """An in-memory Chroma collection over the same documents the index builder writes."""
+    from langchain_chroma import Chroma
+    if backend == "fake":
+        from .fakes import FakeEmbeddings, FakeOpenAI
+        embeddings = FakeEmbeddings(FakeOpenAI())
+    else:
+        from ..api.chat.embeddings import create_embedding_backend
+        embeddings = create_embedding_backend(backend)
+
+    store = Chroma(collection_name=f"eval-{uuid.uuid4().hex}", embedding_function=embeddings)
+    for start in range(0, len(documents), batch_size):
+        batch = documents[start:start + batch_size]
+        store.add_texts([content for content, _ in batch], metadatas=[metadata for _, metadata in batch],
+                        ids=[metadata["id"] for _, metadata in batch])
+    return _similarity_search(store)
+
+
+def current_retriever() -> Callable:
+    from ..api.subsystems import subsystems
+    return _similarity_search(subsystems.get("vector_store"))
+
+
+# --- Metrics ---
+
+def token_counter() -> tuple[str, Callable[[str], int]]:
+    """tiktoken's cl100k_base when it is available offline, otherwise ~4 characters per token."""
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return "cl100k_base", lambda text: len(encoding.encode(text))
+    except Exception:
+        return "chars/4", lambda text: (len(text) + 3) // 4
+
+
+def rss_bytes() -> int:
+    return psutil.Process().memory_info().rss
+
+
+def evaluate(search: Callable, queries: list[dict], ks: list[int], prompt_k: int, cutoff: float,
+             count_tokens: Callable[[str], int]) -> dict:
+    depth = max(ks + [prompt_k])
+    latencies, reciprocal_ranks, prompt_tokens = [], [], []
+    recall = {k: [] for k in ks}
+    cited_recall, empty = [], 0
+
+    for q in queries:
+        started = time.perf_counter()
+        results = search(q["query"], depth)
+        latencies.append(time.perf_counter() - started)
+
+        relevant = set(q["relevant"])
+        ids = [id for id, _, _ in results]
+        for k in ks:
+            recall[k].append(len(relevant.intersection(ids[:k])) / min(len(relevant), k))
+        rank = next((i for i, id in enumerate(ids, 1) if id in relevant), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+
+        # What the chat does with it: every retrieved document goes into the prompt, those above the cutoff are cited
+        context = results[:prompt_k]
+        prompt_tokens.append(count_tokens("\n---\n".join(content for _, _, content in context)))
+        cited = {id for id, score, _ in context if score > cutoff}
+        if not cited:
+            empty += 1
+        cited_recall.append(len(relevant & cited) / min(len(relevant), prompt_k))
+
+    latencies.sort()
+    prompt_tokens.sort()
+    return {
+        "queries": len(queries),
+        "recall": {str(k): sum(values) / len(values) for k, values in recall.items()},
+        "mrr": sum(reciprocal_ranks) / len(reciprocal_ranks),
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "mean": sum(latencies) / len(latencies) * 1000,
+        },
+        "prompt_tokens": {
+            "k": prompt_k,
+            "mean": sum(prompt_tokens) / len(prompt_tokens),
+            "p99": percentile(prompt_tokens, 0.99),
+        },
+        "cited": {"cutoff": cutoff, "recall": sum(cited_recall) / len(cited_recall), "empty_rate": empty / len(queries)},
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Returns a line per retriever whose recall or MRR dropped, or whose p99 latency grew, beyond `tolerance`."""
+    regressions = []
+    for name, result in current["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            continue
+        for k, value in result["recall"].items():
+            before = previous["recall"].get(k)
+            if before and value < before - tolerance:
+                regressions.append(f"{name}: recall@{k} {before:.3f} -> {value:.3f}")
+        if previous["mrr"] and result["mrr"] < previous["mrr"] - tolerance:
+            regressions.append(f"{name}: MRR {previous['mrr']:.3f} -> {result['mrr']:.3f}")
+        p99, previous_p99 = result["latency_ms"]["p99"], previous["latency_ms"]["p99"]
+        if previous_p99 and p99 > previous_p99 * (1 + tolerance):
+            regressions.append(f"{name}: p99 {previous_p99:.1f}ms -> {p99:.1f}ms")
+    return regressions
+
+
+def use_temporary_database():
+    """Points the app at an empty database; call before importing anything from `api`, which reads it at import."""
+    workdir = tempfile.mkdtemp(prefix="travel-eval-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'eval.db')}"
+    os.environ["SNAPSHOT_DIRECTORY"] = os.path.join(workdir, "snapshots")
+
+
+def load_destinations(csv: str):
+    """Loads the CSV into the database; returns the session and the destinations as records and documents."""
+    from ..api.database import Base, SessionLocal, engine
+    from ..api.models import Destination
+    from ..data_loader import DataLoader
+    from ..vector_index_builder import destination_document
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    for chunk in DataLoader.iter_csv(csv):
+        DataLoader.populate_db(db, chunk)
+    rows = db.query(Destination).order_by(Destination.id).all()
+    records = [{column: getattr(row, column) for column in ("id", "city", "country", "short_description",
+                                                            *THEME_PHRASES)} for row in rows]
+    return db, records, [destination_document(row) for row in rows]
+
+
+def main():
+    use_temporary_database()
+    from ..api.chat.chat_utils import RELEVANCE_CUTOFF, RETRIEVAL_K
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--retrievers", default=",".join(DEFAULT_RETRIEVERS),
+                        help="Comma-separated: fts, chroma:fake, chroma:openai, chroma:onnx, current")
+    parser.add_argument("--k", default="1,3,5,10", help="Comma-separated cutoffs for recall@k")
+    parser.add_argument("--prompt-k", type=int, default=RETRIEVAL_K,
+                        help="Documents the chat puts in the prompt (CHAT_RETRIEVAL_K)")
+    parser.add_argument("--cutoff", type=float, default=RELEVANCE_CUTOFF,
+                        help="Relevance a document must exceed to be cited (CHAT_RELEVANCE_CUTOFF)")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per kind (city, theme, description)")
+    parser.add_argument("--batch-size", type=int, default=100, help="Documents embedded per batch")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--csv", default=CSV_PATH, help="Destinations CSV to evaluate on")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.02,
+                        help="Allowed absolute drop in recall/MRR (and relative growth in p99 latency)")
+    args = parser.parse_args()
+
+    # Pseudo-embeddings give near-zero relevance scores, which LangChain warns about on every query
+    warnings.filterwarnings("ignore", message="Relevance scores must be between 0 and 1")
+
+    db, records, documents = load_destinations(args.csv)
+    queries = build_queries(records, args.queries, args.seed)
+    ks = sorted({int(k) for k in args.k.split(",") if k.strip()})
+    tokenizer, count_tokens = token_counter()
+    factories = {
+        "fts": lambda: fts_retriever(db, {metadata["id"]: content for content, metadata in documents}),
+        "current": current_retriever,
+    }
+    for backend in ("fake", "openai", "onnx"):
+        factories[f"chroma:{backend}"] = lambda backend=backend: chroma_retriever(backend, documents, args.batch_size)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+            "destinations": len(records),
+            "queries": {kind: sum(q["kind"] == kind for q in queries) for kind in ("city", "theme", "description")},
+            "tokenizer": tokenizer,
+        },
+        "results": {},
+    }
+
+    selected = [name.strip() for name in args.retrievers.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in factories]
+    if unknown:
+        print(f"❌ Unknown retriever(s) {', '.join(unknown)} (expected: {', '.join(factories)})", file=sys.stderr)
+        sys.exit(2)
+
+    for name in selected:
+        rss_before, started = rss_bytes(), time.perf_counter()
+        search = factories[name]()
+        build_seconds = time.perf_counter() - started
+        result = evaluate(search, queries, ks, args.prompt_k, args.cutoff, count_tokens)
+        result["build_seconds"] = build_seconds
+        result["rss_growth_mb"] = (rss_bytes() - rss_before) / 2**20
+        report["results"][name] = result
+
+        recall = "  ".join(f"R@{k} {value:.3f}" for k, value in result["recall"].items())
+        print(f"{name:<14} {recall}  MRR {result['mrr']:.3f}  p50 {result['latency_ms']['p50']:7.2f}ms  "
+              f"p99 {result['latency_ms']['p99']:7.2f}ms  +{result['rss_growth_mb']:.0f}MB  "
+              f"prompt {result['prompt_tokens']['mean']:.0f} tok", file=sys.stderr)
+    db.close()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,20 @@
+import argparse
 import pandas as pd
 import os
+from typing import Iterator
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from .api.models import Destination
+from .api.models import Destination, TRIP_TYPES
 from .api.database import SessionLocal, Base, engine
+from .api.dataset_version import bump_dataset_version
+from .api.search.full_text import ensure_full_text_index
+from .api.schema_migration import analyze, migrate_destinations
+from .api.snapshot import write_snapshot
+
+# Keeps the id IN (...) lookups below SQLite's bound-parameter limit
+ID_LOOKUP_BATCH = 500
+# Only empty fields are missing; pandas would otherwise read a city called "None" or "Nan" as NaN
+CSV_OPTIONS = {"keep_default_na": False, "na_values": [""]}
 
 
 class DataLoader:
@@ -20,7 +32,16 @@ class DataLoader:
         Returns:
             pd.DataFrame: The processed DataFrame.
         """
-        df = pd.read_csv(path, index_col=0)
+        return DataLoader._prepare(pd.read_csv(path, index_col=0, **CSV_OPTIONS))
+
+    @staticmethod
+    def iter_csv(path: str, chunksize: int = 50_000) -> Iterator[pd.DataFrame]:
+        """Like `load_csv`, but yields the file in chunks so large CSVs load in constant memory."""
+        for chunk in pd.read_csv(path, index_col=0, chunksize=chunksize, **CSV_OPTIONS):
+            yield DataLoader._prepare(chunk)
+
+    @staticmethod
+    def _prepare(df: pd.DataFrame) -> pd.DataFrame:
         # Cast trip-flag columns to boolean types
         bool_cols = ['Day trip', 'Long trip', 'One week', 'Short trip', 'Weekend']
         for col in bool_cols:
@@ -32,33 +53,70 @@ class DataLoader:
             'One week': 'one_week', 'Short trip': 'short_trip',
             'Weekend': 'weekend'
         })
-        return df
+        # The flags are also stored packed into one bitmask column (see models.trip_mask)
+        if all(trip_type in df.columns for trip_type in TRIP_TYPES):
+            df['trip_types'] = sum(df[trip_type].astype(int) * (1 << bit) for bit, trip_type in enumerate(TRIP_TYPES))
+        # Missing values become NULL instead of NaN
+        return df.astype(object).where(df.notna(), None)
 
-    def populate_db(self, db: Session, df: pd.DataFrame) -> None:
+    @staticmethod
+    def populate_db(db: Session, df: pd.DataFrame, commit: bool = True) -> int:
         """
-        Insert rows from DataFrame into the database using ORM.
+        Bulk-insert rows from DataFrame into the database.
         Skips rows already present to ensure idempotency.
+
+        Returns:
+            int: The number of inserted rows.
         """
-        for record in df.to_dict(orient='records'):
-            if not db.query(Destination).filter_by(id=record['id']).first():
-                dest = Destination(**record)
-                db.add(dest)
-        db.commit()
-        print(f"✓ Populated {len(df)} records")
+        records = df.to_dict(orient='records')
+        ids = [record['id'] for record in records]
+        existing = set()
+        for start in range(0, len(ids), ID_LOOKUP_BATCH):
+            batch = ids[start:start + ID_LOOKUP_BATCH]
+            existing.update(row[0] for row in db.query(Destination.id).filter(Destination.id.in_(batch)))
 
+        new_records, seen = [], set()
+        for record in records:
+            if record['id'] not in existing and record['id'] not in seen:
+                seen.add(record['id'])
+                new_records.append(record)
+        if new_records:
+            db.execute(insert(Destination), new_records)
 
-def populate_the_database():
+        if commit:
+            # Invalidate cached filter results in every running worker
+            bump_dataset_version(db)
+            db.commit()
+            print(f"✓ Populated {len(new_records)} of {len(df)} records")
+        return len(new_records)
+
+
+def populate_the_database(csv_path: str = None, chunksize: int = 50_000):
     """Main entrypoint: create tables and populate DB."""
-    # Ensure the table exists
+    # Ensure the tables exist in the current layout; the full-text index is then filled by its triggers
     Base.metadata.create_all(bind=engine)
-    # CSV path (adjust if needed)
-    csv_path = os.path.join(os.path.dirname(__file__), 'structured_data.csv')
+    migrate_destinations(engine)
+    ensure_full_text_index(engine)
+    csv_path = csv_path or os.path.join(os.path.dirname(__file__), 'structured_data.csv')
     print(f"Loading CSV data from: {csv_path}")
-    df = DataLoader.load_csv(csv_path)
 
     db = SessionLocal()
     try:
-        DataLoader.populate_db(db, df)
+        inserted = total = 0
+        for chunk in DataLoader.iter_csv(csv_path, chunksize):
+            inserted += DataLoader.populate_db(db, chunk, commit=False)
+            total += len(chunk)
+            # One transaction per chunk keeps memory flat for multi-million row files
+            db.commit()
+            print(f"  {total} rows read, {inserted} inserted", end="\r")
+        # Invalidate cached filter results in every running worker
+        bump_dataset_version(db)
+        db.commit()
+        print(f"\n✓ Populated {inserted} of {total} records")
+        # Fresh planner statistics, so filters pick the right index as the table grows
+        analyze(engine)
+        # Memory-mapped by the API workers in place of per-worker copies of the catalogue
+        write_snapshot(db)
     except Exception as e:
         print(f"Error populating database: {e}")
     finally:
@@ -66,4 +124,8 @@ def populate_the_database():
 
 
 if __name__ == "__main__":
-    populate_the_database()
+    parser = argparse.ArgumentParser(description="Create the destinations table and load a CSV into it.")
+    parser.add_argument("--csv", help="CSV to load (defaults to structured_data.csv)")
+    parser.add_argument("--chunksize", type=int, default=50_000, help="Rows read and inserted per transaction")
+    args = parser.parse_args()
+    populate_the_database(args.csv, args.chunksize)
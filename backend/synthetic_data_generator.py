@@ -0,0 +1,232 @@
+"""
+Generates synthetic destination CSVs of arbitrary size for scale testing.
+
+The generator learns the distributions of the real catalogue (structured_data.csv):
+- region frequencies and the country distribution within each region,
+- the joint distribution of budget level, the nine theme scores and the trip flags per region
+  (sampled from real rows and perturbed, so correlations between columns are kept),
+- per-country coordinate spread and monthly climate profiles.
+
+Output is schema-compatible with structured_data.csv (and DataLoader), deterministic for a given
+seed and chunk size, and written in chunks so memory use does not depend on the row count.
+
+Usage (from the repository root):
+    python -m backend.synthetic_data_generator --rows 1000000 --seed 42 --output synthetic_1m.csv
+    python -m backend.data_loader --csv synthetic_1m.csv
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import time
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+
+SOURCE_CSV = os.path.join(os.path.dirname(__file__), "structured_data.csv")
+
+SCORE_COLUMNS = ["culture", "adventure", "nature", "beaches", "nightlife", "cuisine", "wellness", "urban", "seclusion"]
+FLAG_COLUMNS = ["Day trip", "Long trip", "One week", "Short trip", "Weekend"]
+OUTPUT_COLUMNS = ["id", "city", "country", "region", "short_description", "latitude", "longitude",
+                  "avg_temp_monthly", "budget_level"] + SCORE_COLUMNS + FLAG_COLUMNS
+
+MONTHS = [str(month) for month in range(1, 13)]
+CLIMATE_KEYS = ["avg", "max", "min"]
+
+
+class DestinationDistribution:
+    """Distributions learned from the real catalogue, stored as compact NumPy arrays."""
+
+    # Probability that a sampled score moves one step away from the donor row's value
+    score_jitter = 0.25
+    # Probability that a sampled trip flag is flipped
+    flag_flip = 0.05
+    # Standard deviation (°C) of the per-row climate shift
+    climate_shift_std = 1.0
+
+    def __init__(self, df: pd.DataFrame):
+        df = df.reset_index(drop=True)
+        self.regions = sorted(df["region"].unique())
+        region_counts = df["region"].value_counts()
+        self.region_probabilities = np.array([region_counts[r] for r in self.regions], dtype=float)
+        self.region_probabilities /= self.region_probabilities.sum()
+
+        self.budget_levels = sorted(df["budget_level"].dropna().unique())
+        self.countries = sorted(df["country"].unique())
+        country_index = {country: i for i, country in enumerate(self.countries)}
+
+        self.scores = df[SCORE_COLUMNS].to_numpy(dtype=np.int8)
+        self.flags = df[FLAG_COLUMNS].to_numpy(dtype=bool)
+        self.budget_codes = df["budget_level"].map({b: i for i, b in enumerate(self.budget_levels)}).to_numpy()
+        self.country_codes = df["country"].map(country_index).to_numpy()
+        self.descriptions = df["short_description"].fillna("").tolist()
+        self.climate = np.stack([self._parse_climate(value) for value in df["avg_temp_monthly"]])
+
+        # Rows of each region (donors for the joint score/flag/budget distribution)
+        self.region_rows = [np.flatnonzero(df["region"].to_numpy() == region) for region in self.regions]
+
+        # Coordinate spread per country; single-row countries get a fixed spread
+        latitudes = pd.to_numeric(df["latitude"], errors="coerce")
+        longitudes = pd.to_numeric(df["longitude"], errors="coerce")
+        self.coordinate_mean = np.zeros((len(self.countries), 2))
+        self.coordinate_std = np.full((len(self.countries), 2), 2.0)
+        self.country_rows = defaultdict(list)
+        for row, code in enumerate(self.country_codes):
+            self.country_rows[code].append(row)
+        for code, rows in self.country_rows.items():
+            self.coordinate_mean[code] = [latitudes[rows].mean(), longitudes[rows].mean()]
+            if len(rows) > 1:
+                self.coordinate_std[code] = np.maximum([latitudes[rows].std(), longitudes[rows].std()], 0.5)
+
+        self.name_syllables = self._learn_syllables(df["city"])
+
+    @classmethod
+    def fit(cls, csv_path: str = SOURCE_CSV) -> "DestinationDistribution":
+        return cls(pd.read_csv(csv_path, index_col=0))
+
+    @staticmethod
+    def _parse_climate(value) -> np.ndarray:
+        """Parses the avg_temp_monthly JSON into a (12, 3) array of avg/max/min temperatures."""
+        climate = np.full((12, 3), np.nan)
+        try:
+            parsed = json.loads(value)
+        except (TypeError, json.JSONDecodeError):
+            return climate
+        for m, month in enumerate(MONTHS):
+            for k, key in enumerate(CLIMATE_KEYS):
+                climate[m, k] = parsed.get(month, {}).get(key, np.nan)
+        return climate
+
+    @staticmethod
+    def _learn_syllables(cities: pd.Series) -> list[str]:
+        syllables = set()
+        for city in cities:
+            for word in str(city).split():
+                syllables.update(re.findall(r"[^aeiouy\W]*[aeiouy]+", word.lower()))
+        return sorted(s for s in syllables if 1 < len(s) <= 4)
+
+    def sample(self, rng: np.random.Generator, size: int) -> dict:
+        """Samples `size` synthetic rows as column arrays."""
+        regions = rng.choice(len(self.regions), size=size, p=self.region_probabilities)
+
+        # Donor rows from the same region carry the joint budget/score/flag/country distribution
+        donors = np.empty(size, dtype=np.int64)
+        for code, rows in enumerate(self.region_rows):
+            mask = regions == code
+            donors[mask] = rng.choice(rows, size=int(mask.sum()))
+
+        steps = rng.choice(np.array([-1, 1], dtype=np.int8), size=(size, len(SCORE_COLUMNS)))
+        jitter = rng.random((size, len(SCORE_COLUMNS))) < self.score_jitter
+        scores = np.clip(self.scores[donors] + steps * jitter, 1, 5)
+
+        flags = self.flags[donors] ^ (rng.random((size, len(FLAG_COLUMNS))) < self.flag_flip)
+
+        countries = self.country_codes[donors]
+        coordinates = self.coordinate_mean[countries] + rng.standard_normal((size, 2)) * self.coordinate_std[countries]
+        coordinates[:, 0] = np.clip(coordinates[:, 0], -90, 90)
+        coordinates[:, 1] = (coordinates[:, 1] + 180) % 360 - 180
+
+        # Climate of the donor plus a per-row shift (same for avg/max/min) and small monthly noise
+        climate = self.climate[donors] + rng.normal(0, self.climate_shift_std, (size, 1, 1))
+        climate += rng.normal(0, 0.3, (size, 12, 1))
+
+        return {
+            "ids": self._uuids(rng, size),
+            "names": self._names(rng, size),
+            "regions": regions,
+            "countries": countries,
+            "budgets": self.budget_codes[donors],
+            "scores": scores,
+            "flags": flags,
+            "coordinates": coordinates,
+            "climate": np.round(climate, 1),
+            "descriptions": donors,
+        }
+
+    @staticmethod
+    def _uuids(rng: np.random.Generator, size: int) -> list[str]:
+        raw = np.frombuffer(rng.bytes(16 * size), dtype=np.uint8).reshape(size, 16).copy()
+        raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40  # version 4
+        raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80  # RFC 4122 variant
+        ids = []
+        for row in raw:
+            h = row.tobytes().hex()
+            ids.append(f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}")
+        return ids
+
+    def _names(self, rng: np.random.Generator, size: int) -> list[str]:
+        lengths = rng.integers(2, 4, size=size)
+        picks = rng.integers(0, len(self.name_syllables), size=(size, 3))
+        return ["".join(self.name_syllables[p] for p in row[:n]).capitalize() for row, n in zip(picks, lengths)]
+
+    @staticmethod
+    def format_climate(climate: list) -> str:
+        """Formats a (12, 3) nested list like the source column (integers without a trailing .0)."""
+        if all(value != value for month in climate for value in month):
+            return ""
+        return "{" + ",".join(
+            f'"{month}":{{' + ",".join(f'"{key}":{_number(value)}' for key, value in zip(CLIMATE_KEYS, values)) + "}"
+            for month, values in zip(MONTHS, climate)
+        ) + "}"
+
+
+def _number(value: float) -> str:
+    if value != value:
+        return "null"
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+def generate_csv(output_path: str, rows: int, seed: int = 0, chunk_size: int = 50_000,
+                 source_csv: str = SOURCE_CSV) -> None:
+    """Streams `rows` synthetic destinations to `output_path`, `chunk_size` rows at a time."""
+    distribution = DestinationDistribution.fit(source_csv)
+    rng = np.random.default_rng(seed)
+    started = time.perf_counter()
+
+    with open(output_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow([""] + OUTPUT_COLUMNS)
+        written = 0
+        while written < rows:
+            size = min(chunk_size, rows - written)
+            sample = distribution.sample(rng, size)
+            # Plain Python values are much cheaper to format row by row than NumPy scalars
+            climate = sample["climate"].tolist()
+            coordinates = sample["coordinates"].round(7).tolist()
+            scores = sample["scores"].tolist()
+            flags = sample["flags"].astype(int).tolist()
+            for i in range(size):
+                writer.writerow([
+                    written + i,
+                    sample["ids"][i],
+                    sample["names"][i],
+                    distribution.countries[sample["countries"][i]],
+                    distribution.regions[sample["regions"][i]],
+                    distribution.descriptions[sample["descriptions"][i]],
+                    *coordinates[i],
+                    distribution.format_climate(climate[i]),
+                    distribution.budget_levels[sample["budgets"][i]],
+                    *scores[i],
+                    *flags[i],
+                ])
+            written += size
+            print(f"  {written}/{rows} rows ({time.perf_counter() - started:.1f}s)", end="\r")
+
+    print(f"\n✓ Wrote {rows} synthetic destinations to {output_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, required=True, help="Number of destinations to generate")
+    parser.add_argument("--output", required=True, help="Output CSV path")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=50_000,
+                        help="Rows generated per chunk (output is deterministic for a given seed and chunk size)")
+    parser.add_argument("--source", default=SOURCE_CSV, help="CSV to learn the distributions from")
+    args = parser.parse_args()
+    generate_csv(args.output, args.rows, seed=args.seed, chunk_size=args.chunk_size, source_csv=args.source)
+
+
+if __name__ == "__main__":
+    main()
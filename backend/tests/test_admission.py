@@ -0,0 +1,126 @@
+import asyncio
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from backend.api import admission as admission_module
+from backend.api.admission import DEADLINE_HEADER, AdmissionLimiter, admission
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def limiter(max_concurrent: int = 1, max_queue: int = 10, max_queued_per_user: int = 4,
+            max_wait: float = 10.0, service_time: float = 1.0) -> AdmissionLimiter:
+    return AdmissionLimiter("test", max_concurrent=max_concurrent, max_queue=max_queue, max_wait=max_wait,
+                            max_queued_per_user=max_queued_per_user, initial_service_time=service_time)
+
+
+async def queue(limiter: AdmissionLimiter, identity: str, admitted: list, timeout: float = 10.0) -> asyncio.Task:
+    async def wait():
+        admitted_at = await limiter.acquire(identity, timeout)
+        admitted.append(identity)
+        return admitted_at
+    task = asyncio.create_task(wait())
+    await asyncio.sleep(0)  # let it join the queue
+    return task
+
+
+@pytest.mark.anyio
+async def test_a_burst_does_not_delay_another_identity():
+    slots = limiter()
+    holder = await slots.acquire("alice", 10.0)
+    admitted = []
+    burst = [await queue(slots, "alice", admitted) for _ in range(3)]
+    bob = await queue(slots, "bob", admitted)
+    assert slots.queued == 4
+
+    admitted_at = holder
+    for _ in range(4):
+        # Each admitted request finishes before the next one is let in
+        slots.release(admitted_at)
+        await asyncio.sleep(0.01)
+        admitted_at = None
+
+    # Bob queued after alice's whole burst but is served on the next turn
+    assert admitted == ["alice", "bob", "alice", "alice"]
+    await asyncio.gather(*burst, bob)
+    assert slots.queued == 0 and slots.active == 1
+
+
+@pytest.mark.anyio
+async def test_user_over_the_per_user_limit_gets_429():
+    slots = limiter(max_queued_per_user=2)
+    await slots.acquire("alice", 10.0)
+    waiting = [await queue(slots, "alice", []) for _ in range(2)]
+
+    with pytest.raises(HTTPException) as error:
+        await slots.acquire("alice", 10.0)
+    assert error.value.status_code == 429
+    assert int(error.value.headers["Retry-After"]) >= 1
+    # Another user still gets in line
+    waiting.append(await queue(slots, "bob", []))
+    assert slots.queued == 3
+    for task in waiting:
+        task.cancel()
+    await asyncio.gather(*waiting, return_exceptions=True)
+    assert slots.queued == 0
+
+
+@pytest.mark.anyio
+async def test_full_queue_gets_503_with_retry_after():
+    slots = limiter(max_queue=2, service_time=3.0)
+    await slots.acquire("alice", 10.0)
+    waiting = [await queue(slots, identity, []) for identity in ("bob", "carol")]
+
+    with pytest.raises(HTTPException) as error:
+        await slots.acquire("dave", 60.0)
+    assert error.value.status_code == 503
+    assert error.value.headers["Retry-After"] == str(int(slots.estimated_wait(2)))
+    for task in waiting:
+        task.cancel()
+    await asyncio.gather(*waiting, return_exceptions=True)
+
+
+@pytest.mark.anyio
+async def test_deadline_shorter_than_the_estimated_wait_gets_503_at_once():
+    slots = limiter(service_time=5.0)
+    await slots.acquire("alice", 10.0)
+
+    with pytest.raises(HTTPException) as error:
+        await slots.acquire("bob", 1.0)
+    assert error.value.status_code == 503
+    assert error.value.headers["Retry-After"] == "5"
+    assert slots.queued == 0
+
+
+@pytest.mark.anyio
+async def test_deadline_passing_in_the_queue_gets_503_and_leaves_it():
+    slots = limiter(service_time=0.01)
+    await slots.acquire("alice", 10.0)
+
+    with pytest.raises(HTTPException) as error:
+        await slots.acquire("bob", 0.05)
+    assert error.value.status_code == 503
+    assert slots.queued == 0 and not slots._queues
+
+
+def test_request_timeout_header_sets_the_deadline(monkeypatch):
+    slots = limiter(service_time=2.0)
+    slots.active = slots.max_concurrent
+    monkeypatch.setitem(admission_module.limiters, "test", slots)
+    app = FastAPI()
+
+    @app.get("/limited", dependencies=[admission("test")])
+    def limited():
+        return {}
+
+    client = TestClient(app)
+    response = client.get("/limited", headers={DEADLINE_HEADER: "0.5"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "2"
+
+    slots.active = 0
+    assert client.get("/limited", headers={DEADLINE_HEADER: "0.5"}).status_code == 200
+    assert slots.active == 0
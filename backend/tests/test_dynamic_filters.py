@@ -0,0 +1,58 @@
+import os
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+from backend.api import snapshot as snapshot_module
+from backend.api.database import Base
+from backend.api.filters.dynamic_filter_generator import DynamicFilterGenerator
+from backend.api.models import Destination
+from backend.data_loader import DataLoader
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), "..", "structured_data.csv")
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        for chunk in DataLoader.iter_csv(CSV_PATH):
+            DataLoader.populate_db(session, chunk)
+        # Created through the API without a budget level
+        session.add(Destination(id="no-budget", city="Nowhere", country="Italy", region="europe",
+                                culture=3, day_trip=True, weekend=False))
+        session.commit()
+        yield session
+
+
+@pytest.fixture
+def generator(monkeypatch):
+    generator = DynamicFilterGenerator()
+    generator.top_n_features = 100
+    # The features the LLM would be asked to build filters for
+    monkeypatch.setattr(generator, "generate_filters_via_openai", generator.format_features_as_string)
+    return generator
+
+
+def test_sql_path_offers_only_filterable_features(db, generator):
+    features = generator.generate_dynamic_filters(db.query(Destination))
+    names = [feature.split("'")[1] for feature in features]
+    assert "trip_types" not in names
+    assert {"day_trip", "weekend", "region", "budget_level", "culture"} <= set(names)
+
+
+def test_sql_and_snapshot_paths_agree(db, generator, monkeypatch, tmp_path):
+    monkeypatch.setattr(snapshot_module, "SNAPSHOT_DIRECTORY", str(tmp_path))
+    snapshot = snapshot_module.Snapshot(snapshot_module.write_snapshot(db))
+    destinations = db.query(Destination).filter(Destination.country == "Italy")
+
+    from_sql = generator.calculate_column_entropies(
+        generator.convert_data_into_dataframe(destinations))
+    from_snapshot = generator.calculate_snapshot_entropies(
+        snapshot, snapshot.rows_of([d.id for d in destinations]))
+
+    assert list(from_sql.index) == list(from_snapshot.index)
+    np.testing.assert_allclose(from_sql["entropy"], from_snapshot["entropy"])
+    assert from_sql["unique_values"].tolist() == from_snapshot["unique_values"].tolist()
@@ -0,0 +1,109 @@
+import os
+import random
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+from backend.api.database import Base
+from backend.api.filters.filter_cache import FilterResultCache, canonical_filter_key
+from backend.api.models import Destination
+from backend.api.routers.destinations import DestinationFilter
+from backend.data_loader import DataLoader
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), "..", "structured_data.csv")
+
+
+@pytest.fixture(scope="module")
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        for chunk in DataLoader.iter_csv(CSV_PATH):
+            DataLoader.populate_db(session, chunk)
+        yield session
+
+
+def key(**params) -> tuple:
+    return canonical_filter_key(DestinationFilter(**params))
+
+
+def selected(db: Session, params: dict) -> frozenset:
+    return frozenset(row.id for row in DestinationFilter(**params).filter(db.query(Destination.id)))
+
+
+@pytest.mark.parametrize("params, equivalent", [
+    # Comma lists are de-duplicated and sorted
+    ({"culture__in": "5,4,4", "region__in": "europe,asia"}, {"culture__in": [4, 5], "region__in": ["asia", "europe"]}),
+    ({"trip_type__in": "weekend,day_trip"}, {"trip_type__in": ["day_trip", "weekend", "day_trip"]}),
+    # A one-value list or a range with equal bounds is an exact match
+    ({"country__in": ["Italy"]}, {"country": "Italy"}),
+    ({"culture__gte": 3, "culture__lte": 3}, {"culture": 3}),
+    # Bounds fold into a list: only the values in range are kept
+    ({"culture__in": [1, 2, 3, 4], "culture__gte": 3}, {"culture__in": [3, 4]}),
+    ({"beaches__in": [1, 2, 5], "beaches__gte": 2, "beaches__lte": 4}, {"beaches": 2}),
+    # A range that an exact match satisfies adds nothing
+    ({"nightlife": 4, "nightlife__gte": 2, "nightlife__lte": 5}, {"nightlife": 4}),
+    ({"urban": 2, "urban__in": [2, 3]}, {"urban": 2}),
+    # None values are ignored
+    ({"city": None, "region": "europe"}, {"region": "europe"}),
+])
+def test_equivalent_filters_share_a_key(db, params, equivalent):
+    assert key(**params) == key(**equivalent)
+    assert selected(db, params) == selected(db, equivalent)
+
+
+@pytest.mark.parametrize("params, different", [
+    ({"culture": 2, "culture__gte": 3}, {"culture": 2}),
+    ({"culture": 5, "culture__in": [3, 4]}, {"culture": 5}),
+    ({"culture__in": [1, 2], "culture__gte": 3}, {}),
+    ({"culture__gte": 3}, {"culture__lte": 3}),
+    ({"culture__gte": 4, "culture__lte": 3}, {"culture__gte": 4}),
+    ({"culture": 3}, {"adventure": 3}),
+    ({"day_trip": True}, {"day_trip": False}),
+])
+def test_contradictions_and_other_attributes_keep_their_own_key(params, different):
+    assert key(**params) != key(**different)
+
+
+def random_filter(rng: random.Random) -> dict:
+    params = {}
+    for theme in ("culture", "beaches"):
+        if rng.random() < 0.5:
+            params[theme] = rng.randint(1, 5)
+        if rng.random() < 0.5:
+            params[f"{theme}__in"] = rng.sample(range(1, 6), rng.randint(1, 4))
+        if rng.random() < 0.5:
+            params[f"{theme}__gte"] = rng.randint(1, 5)
+        if rng.random() < 0.5:
+            params[f"{theme}__lte"] = rng.randint(1, 5)
+    if rng.random() < 0.5:
+        params["region__in"] = rng.sample(["europe", "asia", "oceania", "africa"], rng.randint(1, 3))
+    return params
+
+
+def test_filters_with_different_results_never_share_a_key(db):
+    rng = random.Random(0)
+    results_by_key, distinct = {}, set()
+    for _ in range(2000):
+        params = random_filter(rng)
+        distinct.add(repr(sorted(params.items())))
+        result = selected(db, params)
+        previous = results_by_key.setdefault(key(**params), (params, result))
+        assert previous[1] == result, f"{previous[0]} and {params} share a key"
+    # Many of the distinct filters were collapsed onto a shared key
+    assert len(results_by_key) < 0.9 * len(distinct)
+
+
+def test_cache_serves_equivalent_filters_from_one_entry():
+    cache = FilterResultCache(maxsize=4)
+    computed = []
+
+    def compute():
+        computed.append(1)
+        return len(computed)
+
+    assert cache.get_or_compute("destinations", DestinationFilter(culture__gte=3, culture__lte=3), 1, compute) == 1
+    assert cache.get_or_compute("destinations", DestinationFilter(culture__in=[3]), 1, compute) == 1
+    # A new dataset version never serves the old entry
+    assert cache.get_or_compute("destinations", DestinationFilter(culture=3), 2, compute) == 2
+    assert cache.stats()["hits"] == 1
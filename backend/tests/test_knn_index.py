@@ -0,0 +1,53 @@
+import tracemalloc
+import numpy as np
+import pytest
+from backend.api.similarity import knn_index
+from backend.api.similarity.knn_index import SimilarityIndex, block_rows
+
+
+def random_index(n: int, neighbours: int = 10) -> SimilarityIndex:
+    index = SimilarityIndex(neighbours=neighbours)
+    vectors = np.random.default_rng(0).random((n, 15), dtype=np.float32)
+    index.vectors = vectors
+    index.unit_vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    index.ids = [str(i) for i in range(n)]
+    index.alive = np.ones(n, dtype=bool)
+    return index
+
+
+def test_block_rows_follows_the_budget(monkeypatch):
+    monkeypatch.setattr(knn_index, "BLOCK_BYTES", 256 * 1024 * 1024)
+    assert block_rows(1_000) > 1_000
+    # At the synthetic dataset sizes, a block's distance matrix stays within the budget
+    for n in (1_000_000, 5_000_000):
+        assert block_rows(n) * n * knn_index.BYTES_PER_DISTANCE <= knn_index.BLOCK_BYTES
+    assert block_rows(10 ** 12) == 1
+
+
+@pytest.mark.parametrize("metric", ["euclidean", "cosine"])
+def test_knn_memory_stays_within_the_block_budget(monkeypatch, metric):
+    budget, n = 2 * 1024 * 1024, 20_000
+    monkeypatch.setattr(knn_index, "BLOCK_BYTES", budget)
+    index = random_index(n)
+
+    tracemalloc.start()
+    try:
+        rows, distances = index._knn(np.arange(n), metric)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    # Besides the output, only one block plus a few n-sized vectors may be alive at a time
+    assert peak - rows.nbytes - distances.nbytes <= budget + 64 * n
+
+
+@pytest.mark.parametrize("metric", ["euclidean", "cosine"])
+def test_knn_does_not_depend_on_the_block_size(monkeypatch, metric):
+    index = random_index(2_000)
+    monkeypatch.setattr(knn_index, "BLOCK_BYTES", 1)
+    small_rows, small_distances = index._knn(np.arange(2_000), metric)
+    monkeypatch.setattr(knn_index, "BLOCK_BYTES", 1 << 30)
+    rows, distances = index._knn(np.arange(2_000), metric)
+    # Matrix products of other shapes round float32 differently, which may swap near-ties
+    assert (small_rows != rows).mean() < 0.001
+    np.testing.assert_allclose(small_distances, distances, atol=1e-5)
@@ -0,0 +1,45 @@
+import os
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+from backend.api.database import Base
+from backend.api.models import Destination
+from backend.benchmarks.retrieval_eval import THEME_PHRASES, build_queries, content_words, evaluate, fts_retriever
+from backend.data_loader import DataLoader
+from backend.vector_index_builder import destination_document
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), "..", "structured_data.csv")
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        for chunk in DataLoader.iter_csv(CSV_PATH):
+            DataLoader.populate_db(session, chunk)
+        yield session
+
+
+def test_content_words_drop_the_query_templates():
+    assert content_words("Tell me about Milan") == "milan"
+    assert content_words("culture and history in Italy") == "culture history italy"
+    assert content_words("somewhere with quiet canals") == "quiet canals"
+
+
+def test_fts_baseline_finds_the_queried_destinations(db):
+    rows = db.query(Destination).order_by(Destination.id).all()
+    records = [{column: getattr(row, column) for column in ("id", "city", "country", "short_description",
+                                                            *THEME_PHRASES)} for row in rows]
+    search = fts_retriever(db, {metadata["id"]: content for content, metadata in map(destination_document, rows)})
+    queries = build_queries(records, 100, seed=0)
+
+    def result(kind: str) -> dict:
+        return evaluate(search, [q for q in queries if q["kind"] == kind], [1, 10], 3, 0.0, len)
+
+    # A city query names the destination, so it should come first nearly always
+    city = result("city")
+    assert city["recall"]["1"] >= 0.9
+    assert city["cited"]["empty_rate"] == 0.0
+    assert result("description")["recall"]["10"] >= 0.9
@@ -0,0 +1,52 @@
+import os
+import pytest
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+from backend.api.models import Destination
+from backend.api.schema_migration import COMMON_FILTERS, is_current, migrate_destinations, query_plan, uses_index
+from backend.data_loader import DataLoader
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), "..", "structured_data.csv")
+
+# The destinations table before the compact layout: free-text region, budget level and coordinates,
+# and no index besides the primary key's
+OLD_LAYOUT = """
+CREATE TABLE destinations (
+    id VARCHAR NOT NULL PRIMARY KEY, city VARCHAR NOT NULL, country VARCHAR NOT NULL, region VARCHAR NOT NULL,
+    short_description VARCHAR, latitude VARCHAR, longitude VARCHAR, avg_temp_monthly VARCHAR, budget_level VARCHAR,
+    culture INTEGER, adventure INTEGER, nature INTEGER, beaches INTEGER, nightlife INTEGER, cuisine INTEGER,
+    wellness INTEGER, urban INTEGER, seclusion INTEGER,
+    day_trip BOOLEAN, long_trip BOOLEAN, one_week BOOLEAN, short_trip BOOLEAN, weekend BOOLEAN
+)"""
+
+
+@pytest.fixture(scope="module")
+def migrated():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    with engine.begin() as connection:
+        connection.exec_driver_sql(OLD_LAYOUT)
+        connection.exec_driver_sql("CREATE INDEX ix_destinations_id ON destinations (id)")
+    df = DataLoader.load_csv(CSV_PATH).drop(columns=["trip_types"])
+    for column in ("latitude", "longitude"):
+        df[column] = df[column].map(lambda value: "" if value is None else str(value))
+    df.to_sql("destinations", engine, if_exists="append", index=False)
+
+    assert not is_current(engine)
+    assert migrate_destinations(engine)
+    assert is_current(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def test_migration_keeps_the_rows(migrated):
+    assert migrated.query(func.count(Destination.id)).scalar() == len(DataLoader.load_csv(CSV_PATH))
+    milan = migrated.query(Destination).filter(Destination.city == "Milan").one()
+    assert milan.region == "europe"
+    assert isinstance(milan.latitude, float)
+
+
+@pytest.mark.parametrize("params", COMMON_FILTERS, ids=str)
+def test_common_filters_use_an_index(migrated, params):
+    plan = query_plan(migrated, params)
+    assert uses_index(plan), plan
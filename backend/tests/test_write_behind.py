@@ -0,0 +1,79 @@
+import json
+import os
+import uuid
+import pytest
+from postgrest.exceptions import APIError
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import IntegrityError
+from backend.api.chat.chat_utils import _classify_write_error
+from backend.api.chat.write_behind import DEAD_LETTER_FILE, WriteBehindQueue, message_key
+
+DELETED_CHAT = "deleted-chat"
+
+
+class FlakyMessages:
+    """A messages table that rejects NUL characters and deleted chats, and is down for the first calls."""
+
+    def __init__(self, outages: int = 0):
+        self.stored = []
+        self.outages = outages
+
+    def insert(self, records: list[dict]):
+        if self.outages:
+            self.outages -= 1
+            raise ConnectionError("connection reset")
+        for record in records:
+            if "\x00" in record["message"]["data"]["content"]:
+                raise APIError({"code": "22P05", "message": "unsupported Unicode escape sequence"})
+            if record["session_id"] == DELETED_CHAT:
+                raise APIError({"code": "23503", "message": "violates foreign key constraint"})
+        self.stored.extend(records)
+
+    def written_keys(self, keys: list[str]) -> set:
+        return {message_key(record) for record in self.stored} & set(keys)
+
+
+def record(content: str, chat_id: str = "chat") -> dict:
+    return {"session_id": chat_id, "message": {"type": "human", "data": {"id": str(uuid.uuid4()), "content": content}}}
+
+
+def test_rejected_messages_are_dead_lettered_and_the_rest_is_written(tmp_path):
+    table = FlakyMessages(outages=1)
+    touched = {}
+    queue = WriteBehindQueue(table.insert, table.written_keys, touched.update, _classify_write_error,
+                             directory=str(tmp_path))
+    records = [record(f"message {i}") for i in range(40)]
+    rejected = {3: record("nul \x00"), 17: record("nul \x00"), 25: record("late", DELETED_CHAT)}
+    for i, bad in rejected.items():
+        records[i] = bad
+    queue.save(records)
+    queue.touch("chat", "2026-01-01T00:00:00+00:00")
+    try:
+        assert not queue.flush()  # the outage is retried, not dead-lettered
+        assert queue.flush()
+        assert queue.stats()["queued_messages"] == 0
+        assert table.stored == [r for i, r in enumerate(records) if i not in rejected]
+        assert touched == {"chat": "2026-01-01T00:00:00+00:00"}
+
+        with open(tmp_path / DEAD_LETTER_FILE, encoding="utf-8") as f:
+            dead = [json.loads(line) for line in f]
+        assert [entry["write"] for entry in dead] == list(rejected.values())
+        assert queue.stats()["dead_letters"] == len(rejected)
+    finally:
+        queue.close()
+    assert os.listdir(tmp_path) == [DEAD_LETTER_FILE]
+
+
+def test_classify_write_error():
+    assert _classify_write_error(APIError({"code": "23505", "message": "duplicate key"})) == "duplicate"
+    assert _classify_write_error(APIError({"code": "23503", "message": "foreign key"})) == "permanent"
+    assert _classify_write_error(APIError({"code": "PGRST301", "message": "JWT expired"})) == "transient"
+    assert _classify_write_error(ConnectionError("connection reset")) == "transient"
+
+    engine = create_engine("sqlite://")
+    with engine.connect() as connection:
+        connection.execute(text("CREATE TABLE chats (id TEXT PRIMARY KEY)"))
+        connection.execute(text("INSERT INTO chats VALUES ('a')"))
+        with pytest.raises(IntegrityError) as error:
+            connection.execute(text("INSERT INTO chats VALUES ('a')"))
+    assert _classify_write_error(error.value) == "permanent"
@@ -0,0 +1,224 @@
+"""
+Builds the Chroma retrieval index used by the chat from the destinations table.
+
+- Documents are embedded in batches by a bounded pool of workers, with retries and exponential backoff.
+- Every embedding is stored in a cache keyed by the hash of the embedding model and document text,
+  committed batch by batch: an interrupted run resumes where it stopped, and unchanged destinations
+  are never embedded again.
+- The index is written to a new directory under CHROMA_DIRECTORY and published by atomically replacing
+  the CURRENT pointer; running API workers pick it up on their next retrieval without a restart.
+
+Usage (from the repository root):
+    python -m backend.vector_index_builder
+    python -m backend.vector_index_builder --batch-size 200 --concurrency 8
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Iterator
+import numpy as np
+from .api.database import SessionLocal
+from .api.models import Destination
+from .api.chat.embeddings import embedding_model_name
+from .api.subsystems import CHROMA_DIRECTORY, CHROMA_INDEX_MANIFEST, CHROMA_POINTER_FILE, subsystems
+
+INDEXES_DIRECTORY = "indexes"
+CACHE_FILE = "embedding_cache.sqlite3"
+# Destinations read from the database (and written to the index) per step
+READ_CHUNK = 5_000
+# Chroma rejects upserts above its maximum batch size
+UPSERT_BATCH = 5_000
+
+DOCUMENT_FIELDS = ["id", "city", "country", "region", "short_description", "latitude", "longitude",
+                   "avg_temp_monthly", "budget_level", "culture", "adventure", "nature", "beaches",
+                   "nightlife", "cuisine", "wellness", "urban", "seclusion"]
+TRIP_FIELDS = {"day_trip": "Day trip", "long_trip": "Long trip", "one_week": "One week",
+               "short_trip": "Short trip", "weekend": "Weekend"}
+
+
+def destination_document(destination: Destination) -> tuple[str, dict]:
+    """The page content and metadata of a destination, in the format the notebook used."""
+    lines = [f"{field.replace('_', ' ')}: {getattr(destination, field)}" for field in DOCUMENT_FIELDS]
+    durations = [label for field, label in TRIP_FIELDS.items() if getattr(destination, field)]
+    lines.append(f"ideal durations: {durations}")
+    metadata = {
+        "source_file": Destination.__tablename__,
+        "city_name": destination.city,
+        "document_type": "city_data",
+        "id": destination.id,
+    }
+    return "\n".join(lines), metadata
+
+
+def content_hash(model: str, content: str) -> str:
+    return hashlib.sha256(f"{model}\n{content}".encode()).hexdigest()
+
+
+class EmbeddingCache:
+    """Embeddings by content hash, in a SQLite file next to the indexes."""
+
+    def __init__(self, path: str):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "hash TEXT PRIMARY KEY, model TEXT NOT NULL, dim INTEGER NOT NULL, vector BLOB NOT NULL)"
+        )
+        self.connection.commit()
+
+    def get_many(self, hashes: list[str]) -> dict[str, list[float]]:
+        found = {}
+        # Stays below SQLite's bound-parameter limit
+        for start in range(0, len(hashes), 500):
+            batch = hashes[start:start + 500]
+            rows = self.connection.execute(
+                f"SELECT hash, vector FROM embeddings WHERE hash IN ({','.join('?' * len(batch))})", batch
+            )
+            for key, vector in rows:
+                found[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, model: str, items: list[tuple[str, list[float]]]):
+        """Stores one embedded batch; committing it is the checkpoint a resumed run starts from."""
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO embeddings (hash, model, dim, vector) VALUES (?, ?, ?, ?)",
+            [(key, model, len(vector), np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items],
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+def embed_with_retries(embeddings, texts: list[str], max_retries: int, base_delay: float = 1.0) -> list[list[float]]:
+    """Embeds one batch, backing off exponentially (with jitter) on errors such as rate limits."""
+    for attempt in range(max_retries + 1):
+        try:
+            return embeddings.embed_documents(texts)
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = base_delay * 2 ** attempt * (0.5 + random.random())
+            print(f"⚠️ Embedding batch failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def iter_destinations(chunk: int = READ_CHUNK) -> Iterator[list[Destination]]:
+    """Pages through the destinations table by id, so memory use does not depend on its size."""
+    db = SessionLocal()
+    try:
+        last_id = None
+        while True:
+            query = db.query(Destination).order_by(Destination.id)
+            if last_id is not None:
+                query = query.filter(Destination.id > last_id)
+            rows = query.limit(chunk).all()
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1].id
+            db.expunge_all()
+    finally:
+        db.close()
+
+
+def publish_index(name: str, keep: int):
+    """Points CURRENT at the new index (atomic rename) and removes all but the `keep` newest indexes."""
+    pointer = os.path.join(CHROMA_DIRECTORY, CHROMA_POINTER_FILE)
+    temporary = f"{pointer}.tmp"
+    with open(temporary, "w") as f:
+        f.write(os.path.join(INDEXES_DIRECTORY, name))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, pointer)
+
+    indexes_root = os.path.join(CHROMA_DIRECTORY, INDEXES_DIRECTORY)
+    for old in sorted(os.listdir(indexes_root), reverse=True)[max(keep, 1):]:
+        # Workers that still hold an old index swap within VECTOR_STORE_CHECK_SECONDS of publishing
+        shutil.rmtree(os.path.join(indexes_root, old), ignore_errors=True)
+
+
+def build_index(batch_size: int = 100, concurrency: int = 4, max_retries: int = 5, keep: int = 2) -> str:
+    """Builds a new index from the destinations table, publishes it and returns its directory."""
+    from langchain_chroma import Chroma
+
+    embeddings = subsystems.get("embeddings")
+    model = embedding_model_name(embeddings)
+    os.makedirs(os.path.join(CHROMA_DIRECTORY, INDEXES_DIRECTORY), exist_ok=True)
+    cache = EmbeddingCache(os.path.join(CHROMA_DIRECTORY, CACHE_FILE))
+
+    name = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    directory = os.path.join(CHROMA_DIRECTORY, INDEXES_DIRECTORY, name)
+    store = Chroma(persist_directory=directory, embedding_function=embeddings)
+    started = time.perf_counter()
+    total = embedded = 0
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for destinations in iter_destinations():
+                documents = [destination_document(d) for d in destinations]
+                hashes = [content_hash(model, content) for content, _ in documents]
+                vectors = cache.get_many(hashes)
+
+                missing = list(dict.fromkeys(h for h in hashes if h not in vectors))
+                texts = {h: content for h, (content, _) in zip(hashes, documents)}
+                futures = {
+                    pool.submit(embed_with_retries, embeddings, [texts[h] for h in batch], max_retries): batch
+                    for batch in (missing[i:i + batch_size] for i in range(0, len(missing), batch_size))
+                }
+                for future in as_completed(futures):
+                    batch = futures[future]
+                    result = future.result()
+                    cache.put_many(model, list(zip(batch, result)))
+                    vectors.update(zip(batch, result))
+                    embedded += len(batch)
+
+                for start in range(0, len(documents), UPSERT_BATCH):
+                    part = slice(start, start + UPSERT_BATCH)
+                    store._collection.upsert(
+                        ids=[d.id for d in destinations[part]],
+                        embeddings=[vectors[h] for h in hashes[part]],
+                        documents=[content for content, _ in documents[part]],
+                        metadatas=[metadata for _, metadata in documents[part]],
+                    )
+                total += len(documents)
+                print(f"  {total} documents indexed, {embedded} embedded "
+                      f"({time.perf_counter() - started:.1f}s)", end="\r")
+    except BaseException:
+        # Embedded batches are already cached; the partial index is discarded and never published
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    finally:
+        cache.close()
+
+    if total == 0:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise RuntimeError("The destinations table is empty; load it with backend.data_loader first.")
+
+    # Lets workers detect an index built with another embedding model than the one they use
+    with open(os.path.join(directory, CHROMA_INDEX_MANIFEST), "w") as f:
+        json.dump({"embedding_model": model, "documents": total,
+                   "created_at": datetime.now(timezone.utc).isoformat()}, f)
+    publish_index(name, keep)
+    print(f"\n✓ Indexed {total} destinations ({embedded} embedded, {total - embedded} from cache) into {directory}")
+    return directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=100, help="Documents per embedding request")
+    parser.add_argument("--concurrency", type=int, default=4, help="Embedding requests in flight")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries per failed embedding request")
+    parser.add_argument("--keep", type=int, default=2, help="Published indexes kept on disk (including the new one)")
+    args = parser.parse_args()
+    build_index(args.batch_size, args.concurrency, args.max_retries, args.keep)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,17 @@ import { useRouter, useSearchParams } from 'next/navigation';
 import ReactMarkdown from 'react-markdown';
 import remarkGfm from 'remark-gfm';
 
+const HISTORY_PAGE_SIZE = 50;
+const CHATS_PAGE_SIZE = 50;
+
+// Appends the messages that arrived from the server. Optimistic entries and messages still queued on
+// the server (no id yet) stay at the end until a message with the same key arrives, since the request
+// may have been answered by a worker that doesn't see them yet.
+const mergeArrived = (prev, arrived) => {
+    const arrivedKeys = new Set(arrived.map(m => m.key).filter(Boolean));
+    const kept = prev.filter(m => !(m.key && arrivedKeys.has(m.key)));
+    return [...kept.filter(m => m.id != null), ...arrived, ...kept.filter(m => m.id == null && m.key)];
+};
 
 export default function ChatPage() {
     const { user, loading: authLoading } = useContext(AuthContext);
@@ -21,6 +32,10 @@ export default function ChatPage() {
     const [isSending, setIsSending] = useState(false);
     const [isLoadingChats, setIsLoadingChats] = useState(true);
     const [isLoadingHistory, setIsLoadingHistory] = useState(false);
+    // Cursors for paging chat history (older messages) and fetching only new ones
+    const [historyCursor, setHistoryCursor] = useState(null);
+    const [latestCursor, setLatestCursor] = useState(null);
+    const [chatsCursor, setChatsCursor] = useState(null);
 
     // Get the chat ID from the URL on initial load
     useEffect(() => {
@@ -44,8 +59,11 @@ export default function ChatPage() {
                 setIsLoadingChats(true);
                 try {
                     const backendApiUrl = process.env.NEXT_PUBLIC_BACKEND_API_URL;
-                    const response = await axios.get(`${backendApiUrl}/chat/users/${user.id}/chats/`);
+                    const response = await axios.get(`${backendApiUrl}/chat/users/${user.id}/chats/`, {
+                        params: { limit: CHATS_PAGE_SIZE },
+                    });
                     setUserChats(response.data);
+                    setChatsCursor(response.headers['x-next-cursor'] || null);
                 } catch (error) {
                     console.error('Failed to fetch user chats:', error);
                 } finally {
@@ -63,21 +81,55 @@ export default function ChatPage() {
                 setIsLoadingHistory(true);
                 try {
                     const backendApiUrl = process.env.NEXT_PUBLIC_BACKEND_API_URL;
-                    const response = await axios.get(`${backendApiUrl}/chat/${chatId}`);
+                    const response = await axios.get(`${backendApiUrl}/chat/${chatId}`, {
+                        params: { limit: HISTORY_PAGE_SIZE },
+                    });
                     setMessages(response.data.history);
+                    setHistoryCursor(response.data.next_cursor);
+                    setLatestCursor(response.data.latest_cursor);
                 } catch (error) {
                     console.error('Failed to fetch chat history:', error);
                     setMessages([]);
+                    setHistoryCursor(null);
+                    setLatestCursor(null);
                 } finally {
                     setIsLoadingHistory(false);
                 }
             } else {
                 setMessages([]);
+                setHistoryCursor(null);
+                setLatestCursor(null);
             }
         };
         fetchHistory();
     }, [chatId]);
 
+    const handleLoadOlderMessages = async () => {
+        try {
+            const backendApiUrl = process.env.NEXT_PUBLIC_BACKEND_API_URL;
+            const response = await axios.get(`${backendApiUrl}/chat/${chatId}`, {
+                params: { before: historyCursor, limit: HISTORY_PAGE_SIZE },
+            });
+            setMessages(prev => [...response.data.history, ...prev]);
+            setHistoryCursor(response.data.next_cursor);
+        } catch (error) {
+            console.error('Failed to fetch older messages:', error);
+        }
+    };
+
+    const handleLoadMoreChats = async () => {
+        try {
+            const backendApiUrl = process.env.NEXT_PUBLIC_BACKEND_API_URL;
+            const response = await axios.get(`${backendApiUrl}/chat/users/${user.id}/chats/`, {
+                params: { limit: CHATS_PAGE_SIZE, cursor: chatsCursor },
+            });
+            setUserChats(prev => [...prev, ...response.data]);
+            setChatsCursor(response.headers['x-next-cursor'] || null);
+        } catch (error) {
+            console.error('Failed to fetch more chats:', error);
+        }
+    };
+
     const handleNewChat = async () => {
         try {
             const backendApiUrl = process.env.NEXT_PUBLIC_BACKEND_API_URL;
@@ -108,13 +160,24 @@ export default function ChatPage() {
                 user_id: user.id,
             });
 
-            // Update state with the full conversation from the API response
-            const newAiMessage = { role: 'ai', content: response.data.message, sources: response.data.sources };
-            setMessages(prev => [...prev, newAiMessage]);
+            // Update state with the full conversation from the API response; the keys tell which
+            // history entries replace the optimistic ones
+            const sentMessage = { ...newMessage, key: response.data.user_message_key };
+            const newAiMessage = { role: 'ai', content: response.data.message, sources: response.data.sources, key: response.data.message_key };
+            setMessages(prev => [...prev.map(m => (m === newMessage ? sentMessage : m)), newAiMessage]);
             
-            // Re-fetch history to ensure state is synchronized with the backend
-            const historyResponse = await axios.get(`${backendApiUrl}/chat/${response.data.chat_id}`);
-            setMessages(historyResponse.data.history);
+            // Fetch only the messages saved since the last sync and replace the optimistic entries with them
+            const sameChat = response.data.chat_id === chatId && latestCursor !== null;
+            const historyResponse = await axios.get(`${backendApiUrl}/chat/${response.data.chat_id}`, {
+                params: sameChat ? { since: latestCursor } : { limit: HISTORY_PAGE_SIZE },
+            });
+            if (sameChat) {
+                setMessages(prev => mergeArrived(prev, historyResponse.data.history));
+            } else {
+                setMessages(mergeArrived([sentMessage, newAiMessage], historyResponse.data.history));
+                setHistoryCursor(historyResponse.data.next_cursor);
+            }
+            setLatestCursor(historyResponse.data.latest_cursor);
 
             setChatId(response.data.chat_id);
             router.push(`/chat?id=${response.data.chat_id}`);
@@ -161,6 +224,11 @@ export default function ChatPage() {
                                         Chat - {new Date(chat.updated_at).toLocaleDateString()}
                                     </ListGroup.Item>
                                 ))}
+                                {chatsCursor && (
+                                    <ListGroup.Item action onClick={handleLoadMoreChats} className="text-center text-muted py-2">
+                                        Load more chats
+                                    </ListGroup.Item>
+                                )}
                             </ListGroup>
                         )}
                     </div>
@@ -177,6 +245,11 @@ export default function ChatPage() {
                                 <div className="text-center mt-5"><Spinner animation="border" /></div>
                             ) : (
                                 <div className="d-flex flex-column">
+                                    {historyCursor && (
+                                        <Button variant="link" size="sm" className="align-self-center" onClick={handleLoadOlderMessages}>
+                                            Load older messages
+                                        </Button>
+                                    )}
                                     {messages.length === 0 && !isLoadingHistory && (
                                         <p className="text-center text-muted mt-5">No messages in this chat. Start a conversation!</p>
                                     )}